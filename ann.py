@@ -0,0 +1,158 @@
+# ann.py
+# ค้นหาเวกเตอร์ใกล้ที่สุดแบบประมาณ (ANN) ด้วย random-projection LSH (NumPy ล้วน)
+#
+# ใช้กับเวกเตอร์ที่ normalize แล้ว (cosine similarity) ปัจจุบันมีแค่ scorer lsa ที่ใช้
+# vector_matcher (ค่าเริ่มต้น) ไม่ได้ใช้ เพราะคะแนน partial/keyword ไม่ใช่ cosine ของเวกเตอร์
+# shortlist จาก LSH จึงไม่รับประกันว่ามีแถวที่ได้คะแนนสูงสุดของ vector_matcher
+# แต่ละตาราง hash ใช้ระนาบสุ่ม n_bits ระนาบ แถวที่อยู่ฝั่งเดียวกันของทุกระนาบ
+# จะอยู่ bucket เดียวกัน ตอนค้นหาดึงแถวจาก bucket ของคำถาม (และ bucket ข้างเคียง
+# ตามจำนวน probes) มาเป็น shortlist แล้วคำนวณ cosine จริงเฉพาะ shortlist
+#
+# ปรับ recall/latency ได้ด้วย n_tables (ตอนสร้าง) และ probes (ตอนค้นหา)
+#
+# วิธีใช้ (วัด recall และเวลากับข้อมูลสุ่ม):
+#   python ann.py --rows 200000 --dim 128 --probes 1,4,16
+import argparse
+import time
+
+import numpy as np
+
+# จำนวนตาราง hash (มาก = recall สูงขึ้น แต่ใช้หน่วยความจำมากขึ้น)
+DEFAULT_TABLES = 8
+
+# จำนวน bucket ที่เปิดดูต่อตาราง (1 = bucket ของคำถามเท่านั้น)
+DEFAULT_PROBES = 4
+
+# จำนวนแถวเฉลี่ยที่อยากได้ต่อ bucket (ใช้เลือก n_bits อัตโนมัติ)
+TARGET_BUCKET_SIZE = 32
+
+
+class LSHIndex:
+    """random-projection LSH หลายตาราง พร้อม exact re-rank ของ shortlist"""
+
+    def __init__(self, vectors, n_tables=DEFAULT_TABLES, n_bits=None, seed=0):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        rows, dim = self.vectors.shape
+        if n_bits is None:
+            n_bits = int(np.clip(np.log2(max(rows, 1) / TARGET_BUCKET_SIZE), 4, 24))
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((n_tables, n_bits, dim)).astype(np.float32)
+        self.powers = (1 << np.arange(n_bits, dtype=np.int64))
+
+        # แต่ละตาราง: เรียงแถวตามรหัส bucket แล้วเก็บรหัสที่ไม่ซ้ำกับตำแหน่งเริ่มต้น
+        self.tables = []
+        for planes in self.planes:
+            codes = ((self.vectors @ planes.T) > 0) @ self.powers
+            order = np.argsort(codes, kind="stable").astype(np.int32)
+            keys, starts = np.unique(codes[order], return_index=True)
+            ends = np.append(starts[1:], rows)
+            self.tables.append((keys, starts, ends, order))
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def probe_codes(self, projections, probes):
+        """รหัส bucket ที่จะเปิดดู: bucket ของคำถาม แล้วตามด้วย bucket ที่ต่างกัน 1 บิต
+        เรียงจากบิตที่คำถามอยู่ใกล้ระนาบที่สุด (มีโอกาสตกอีกฝั่งมากที่สุด)"""
+        code = int((projections > 0) @ self.powers)
+        codes = [code]
+        for bit in np.argsort(np.abs(projections))[:max(0, probes - 1)]:
+            codes.append(code ^ int(self.powers[bit]))
+        return codes
+
+    def candidates(self, query, probes=DEFAULT_PROBES):
+        """แถวใน shortlist (ไม่ซ้ำ)"""
+        query = np.asarray(query, dtype=np.float32)
+        parts = []
+        for planes, (keys, starts, ends, order) in zip(self.planes, self.tables):
+            for code in self.probe_codes(planes @ query, probes):
+                position = np.searchsorted(keys, code)
+                if position < len(keys) and keys[position] == code:
+                    parts.append(order[starts[position]:ends[position]])
+        if not parts:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(parts))
+
+    def search(self, query, k=1, probes=DEFAULT_PROBES):
+        """k แถวที่ cosine สูงสุดใน shortlist คืนค่า (แถว, คะแนน) เรียงจากมากไปน้อย
+
+        ถ้า shortlist ว่าง (คำถามไม่ตก bucket ไหนเลย) จะคำนวณทุกแถวแบบ exact แทน
+        """
+        query = np.asarray(query, dtype=np.float32)
+        rows = self.candidates(query, probes)
+        if not len(rows):
+            rows = np.arange(len(self), dtype=np.int32)
+        scores = self.vectors[rows] @ query
+        return top_k(rows, scores, k)
+
+
+def top_k(rows, scores, k):
+    """k อันดับแรก เรียงคะแนนมากไปน้อย คะแนนเท่ากันให้แถวที่อยู่ก่อนชนะ"""
+    if len(rows) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        # เก็บแถวที่คะแนนเท่ากับอันดับสุดท้ายไว้ด้วย ให้ลำดับแถวตัดสินได้ถูกต้อง
+        keep = np.flatnonzero(scores >= scores[keep].min())
+        rows, scores = rows[keep], scores[keep]
+    order = np.lexsort((rows, -scores))[:k]
+    return rows[order], scores[order]
+
+
+def exact_search(vectors, query, k=1):
+    """ค้นหาแบบเทียบทุกแถว (ใช้เทียบ recall)"""
+    scores = vectors @ np.asarray(query, dtype=np.float32)
+    return top_k(np.arange(len(vectors), dtype=np.int32), scores, k)
+
+
+def synthetic_vectors(rows, dim, clusters, seed):
+    """เวกเตอร์สุ่มแบบกลุ่ม (คล้ายคำถามที่จับกลุ่มตามหัวข้อ) normalize แล้ว"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, rows)] + 0.6 * rng.standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="วัด recall และเวลาของ LSH เทียบกับการค้นหาทุกแถว")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--tables", type=int, default=DEFAULT_TABLES)
+    parser.add_argument("--bits", type=int, help="จำนวนบิตต่อตาราง (ค่าเริ่มต้นเลือกตามจำนวนแถว)")
+    parser.add_argument("--probes", default="1,2,4,8,16", help="จำนวน probes ที่จะทดสอบ")
+    parser.add_argument("--noise", type=float, default=0.5, help="ระยะของคำถามจากแถวต้นทาง (เทียบกับความยาวเวกเตอร์)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.rows, args.dim, args.clusters, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.integers(0, args.rows, args.queries)
+    noise = args.noise / np.sqrt(args.dim)
+    queries = vectors[picks] + noise * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    start = time.perf_counter()
+    index = LSHIndex(vectors, args.tables, args.bits, args.seed)
+    print(f"🏗️ สร้าง index {args.rows} แถว ({index.n_tables} ตาราง × {index.n_bits} บิต) "
+          f"ใน {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    truth = [exact_search(vectors, q)[0][0] for q in queries]
+    exact_ms = (time.perf_counter() - start) / len(queries) * 1000
+    print(f"• exact                 {exact_ms:8.2f} ms/query")
+
+    for probes in [int(p) for p in args.probes.split(",")]:
+        start = time.perf_counter()
+        found = [index.search(q, 1, probes)[0][0] for q in queries]
+        ann_ms = (time.perf_counter() - start) / len(queries) * 1000
+        recall = np.mean([a == b for a, b in zip(found, truth)])
+        shortlist = np.mean([len(index.candidates(q, probes)) for q in queries[:50]])
+        print(f"• probes={probes:<3}  recall@1={recall:.3f}  {ann_ms:8.2f} ms/query  "
+              f"shortlist ~{shortlist:.0f} แถว")
+
+
+if __name__ == "__main__":
+    main()
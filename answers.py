@@ -0,0 +1,136 @@
+# answers.py
+# ข้อความคำตอบที่ render แล้วต่อแถวของ dataset (ใช้ร่วมกันทุก session)
+#
+# สร้างข้อความของแต่ละแถวครั้งเดียวต่อเวอร์ชัน dataset แล้วเก็บไว้ในตาราง
+# ประวัติสนทนาเก็บแค่ reference {"version", "row_id"} แทนข้อความเต็ม
+# อยู่นอก app.py เพราะ Streamlit รัน app.py ใหม่ทุกครั้งที่ rerun
+#
+# เมื่อเวอร์ชันเก่าถูกลบ (เกิน MAX_VERSIONS) ข้อความของแถวที่ประวัติสนทนาอ้างถึง
+# จะถูก render เก็บไว้ก่อนปล่อย dataset ประวัติเก่าจึงยังแสดงได้หลังโหลดข้อมูลใหม่หลายครั้ง
+import threading
+from collections import OrderedDict
+
+# row_id พิเศษสำหรับคำตอบ "ไม่พบในระบบ" (ข้อความขึ้นกับหมวดหมู่ของเวอร์ชันนั้น)
+NO_MATCH = -1
+
+# จำนวนเวอร์ชัน dataset ที่เก็บไว้ (ข้อความเก่าที่อ้างถึงยังแสดงได้หลังโหลดข้อมูลใหม่)
+MAX_VERSIONS = 4
+
+# จำนวนข้อความของเวอร์ชันที่ถูกลบแล้วที่เก็บไว้ (เกินแล้วลบข้อความที่เก็บไว้นานที่สุดก่อน)
+MAX_ARCHIVED = 10000
+
+MISSING_TEXT = "⚠️ คำตอบนี้มาจากข้อมูลชุดเก่าที่ไม่ได้โหลดไว้แล้ว ลองถามใหม่อีกครั้งครับ"
+
+_datasets = {}   # version -> CompactDataset
+_payloads = {}   # (version, row_id) -> {"content", "image_url"}
+_referenced = {}  # version -> row_id ที่ถูกอ้างถึงในประวัติสนทนา
+_archived = OrderedDict()  # (version, row_id) -> ข้อความของเวอร์ชันที่ถูกลบแล้ว
+_lock = threading.Lock()
+
+
+def register_dataset(dataset):
+    """บันทึก dataset ตามเวอร์ชัน (เก็บไว้ไม่เกิน MAX_VERSIONS เวอร์ชันล่าสุด)"""
+    with _lock:
+        if dataset.version in _datasets:
+            return
+        _datasets[dataset.version] = dataset
+        while len(_datasets) > MAX_VERSIONS:
+            old_version = next(iter(_datasets))
+            archive_version(old_version, _datasets.pop(old_version))
+            for key in [k for k in _payloads if k[0] == old_version]:
+                del _payloads[key]
+
+
+def archive_version(version, dataset):
+    """เก็บข้อความของแถวที่ถูกอ้างถึงของเวอร์ชันที่กำลังถูกลบ (เรียกขณะถือ _lock)"""
+    for row_id in sorted(_referenced.pop(version, ())):
+        key = (version, row_id)
+        payload = _payloads.get(key)
+        if payload is None:
+            payload = render_no_match(dataset) if row_id == NO_MATCH else render_answer(dataset, row_id)
+        _archived[key] = payload
+    while len(_archived) > MAX_ARCHIVED:
+        _archived.popitem(last=False)
+
+
+def has_image(image_url):
+    return bool(image_url) and image_url != 'nan'
+
+
+def render_answer(dataset, row_id):
+    """สร้างข้อความคำตอบของแถว row_id"""
+    record = dataset.records[row_id]
+    image_url = record.image_url if has_image(record.image_url) else None
+
+    parts = [
+        f"📖 **หมวดหมู่:** {dataset.category_of(record)}\n",
+        f"📂 **หัวข้อย่อย:** {dataset.subcategory_of(record)}\n\n",
+        f"❓ **คำถาม:** {record.question}\n\n",
+        f"💡 **คำตอบ:**\n{record.answer}\n\n",
+    ]
+    # เพิ่มรูปภาพถ้ามี
+    if image_url:
+        parts.append("🖼️ **มีรูปภาพประกอบ** (แสดงด้านล่าง)\n\n")
+    parts.append("💬 **มีคำถามเพิ่มเติมหรือไม่ครับ?**")
+
+    return {"content": "".join(parts), "image_url": image_url}
+
+
+def render_no_match(dataset):
+    """สร้างข้อความเมื่อไม่พบคำตอบใน dataset"""
+    parts = [
+        "❌ **ขออภัยครับ**\n\n",
+        "คำถามนี้อยู่นอกเหนือขอบเขตวิชา Embedded System ที่มีในระบบ\n\n",
+        "📚 **คำถามที่ระบบสามารถตอบได้ครอบคลุม:**\n",
+    ]
+    # แสดงหมวดหมู่ที่มี
+    parts.extend(f"• {cat}\n" for cat in dataset.categories[:5])
+    parts.append("\n💡 **ลองถามคำถามอื่นที่เกี่ยวข้องกับหัวข้อเหล่านี้ดูครับ**")
+
+    return {"content": "".join(parts), "image_url": None}
+
+
+def get_payload(version, row_id):
+    """ข้อความที่ render แล้วของ (version, row_id) สร้างครั้งแรกที่เรียก
+
+    คืนค่า None ถ้าเวอร์ชันนั้นถูกลบไปแล้วและข้อความไม่ได้ถูกเก็บไว้
+    """
+    key = (version, row_id)
+    payload = _payloads.get(key) or _archived.get(key)
+    if payload is not None:
+        return payload
+
+    dataset = _datasets.get(version)
+    if dataset is None:
+        return None
+
+    payload = render_no_match(dataset) if row_id == NO_MATCH else render_answer(dataset, row_id)
+    with _lock:
+        # ถ้าเวอร์ชันถูกลบระหว่าง render ก็ไม่ต้องเก็บ
+        if version in _datasets:
+            payload = _payloads.setdefault(key, payload)
+    return payload
+
+
+def answer_message(dataset, row_id):
+    """ข้อความของบอทแบบ reference (row_id=None หมายถึงไม่พบคำตอบ)"""
+    register_dataset(dataset)
+    row_id = NO_MATCH if row_id is None else row_id
+    with _lock:
+        _referenced.setdefault(dataset.version, set()).add(row_id)
+    return {
+        "role": "model",
+        "version": dataset.version,
+        "row_id": row_id,
+    }
+
+
+def message_payload(msg):
+    """ข้อความและรูปภาพสำหรับแสดงผล (รองรับทั้งข้อความเต็มและ reference)"""
+    if "row_id" not in msg:
+        return {"content": msg["content"], "image_url": msg.get("image_url")}
+
+    payload = get_payload(msg["version"], msg["row_id"])
+    if payload is None:
+        return {"content": MISSING_TEXT, "image_url": None}
+    return payload
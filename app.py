@@ -1,22 +1,34 @@
 import os
 import re
+import time
 import streamlit as st
-import google.generativeai as genai
 import pandas as pd
-import requests
-from PIL import Image
 from io import BytesIO
 from datetime import datetime
-from difflib import SequenceMatcher
+from ingest import get_dataset_sources, load_sources, sources_fingerprint
+from qa_store import build_compact_dataset
+import fts_store
+from scorers import get_primary_name, search, prepare_scorers
+from query_log import log_query
+from images import ImageUnavailable, fetch_image, image_check_status, start_image_check
+from warmup import start_warmup
+from sheets_source import get_sheet_sync
+from rag_prompt import generate_answer, llm_enabled
+from shared_store import attach_or_publish, get_shared_dir
+from answers import answer_message, message_payload
+from lazy_modules import module_available, get_genai, get_ngrok, get_pil_image
+from session_store import (
+    get_budget_bytes, get_spill_max_seconds, touch_session, restore_session, discard_session, enforce_budget,
+    session_memory, session_question_count, session_state_of, total_memory,
+    STATE_COMPRESSED, STATE_SPILLED
+)
 
 # ======================
 # 🌐 ตั้งค่า ngrok สำหรับแชร์ผ่านอินเทอร์เน็ต
 # ======================
-try:
-    from pyngrok import ngrok, conf
-    NGROK_AVAILABLE = True
-except ImportError:
-    NGROK_AVAILABLE = False
+# ตรวจเฉพาะว่าติดตั้งไว้หรือไม่ จะ import จริงเมื่อกดปุ่มใน sidebar
+NGROK_AVAILABLE = module_available("pyngrok")
+if not NGROK_AVAILABLE:
     print("⚠️ ไม่พบ pyngrok - ติดตั้งด้วย: pip install pyngrok")
 
 def setup_ngrok(port=8501):
@@ -25,6 +37,8 @@ def setup_ngrok(port=8501):
         return None
     
     try:
+        ngrok = get_ngrok()
+
         # ปิด tunnel เก่า (ถ้ามี)
         tunnels = ngrok.get_tunnels()
         for tunnel in tunnels:
@@ -44,12 +58,34 @@ def setup_ngrok(port=8501):
 # ตั้งค่า API Keys (ไม่บังคับใช้แล้ว)
 try:
     GEMINI_API_KEY_INSURVERSE = st.secrets["GEMINI_API_KEY_INSURVERSE"]
-    genai.configure(api_key=GEMINI_API_KEY_INSURVERSE)
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    GEMINI_AVAILABLE = True
+    GEMINI_AVAILABLE = bool(GEMINI_API_KEY_INSURVERSE) and module_available("google.generativeai")
 except:
+    GEMINI_API_KEY_INSURVERSE = None
     GEMINI_AVAILABLE = False
 
+@st.cache_resource(show_spinner=False)
+def get_gemini_model():
+    """สร้าง Gemini model เมื่อเรียกใช้ครั้งแรก (ไม่ import ตอนเริ่มแอป)"""
+    if not GEMINI_AVAILABLE:
+        return None
+    genai = get_genai()
+    genai.configure(api_key=GEMINI_API_KEY_INSURVERSE)
+    return genai.GenerativeModel('gemini-1.5-flash')
+
+def ask_gemini(user_input, dataset, context):
+    """ให้ Gemini ตอบจากแถวที่ค้นเจอ (คืนค่า None ถ้าไม่ได้เปิด EMBEDBOT_LLM_FALLBACK ไม่ได้ตั้งค่า
+    เรียกไม่สำเร็จ หรือเกินเวลา)"""
+    if not llm_enabled():
+        return None
+    try:
+        model = get_gemini_model()
+        if model is None:
+            return None
+        return generate_answer(model, user_input, dataset, context)
+    except Exception as e:
+        print(f"❌ Gemini: {str(e)}")
+        return None
+
 # System prompt
 PROMPT_WORKAW = """คุณเป็นผู้ช่วยผู้เชี่ยวชาญด้าน Embedded System ชื่อ "EmbedBot"
 หน้าที่:
@@ -70,6 +106,8 @@ def clear_current_chat():
 
 def clear_all_history():
     """ล้างประวัติการสนทนาทั้งหมด"""
+    for session in st.session_state.get("conversation_sessions", []):
+        discard_session(session)
     st.session_state["conversation_sessions"] = []
     st.session_state["current_session_id"] = None
     st.session_state["current_messages"] = [
@@ -77,151 +115,93 @@ def clear_all_history():
     ]
     st.session_state["conversation_context"] = {}
 
-def load_excel_data(file_path="dataset.xlsx"):
-    """โหลดข้อมูลจากไฟล์ Excel แบบง่ายและตรงไปตรงมา"""
+def load_excel_data(sources=None):
+    """โหลดข้อมูลจากไฟล์ Excel (หลายไฟล์/หลายชีต อ่านแบบขนาน)
+
+    sources เป็นชื่อไฟล์เดียว หรือ list ของ {"path": ..., "sheets": ...}
+    ถ้าไม่ระบุจะใช้ค่าจาก ingest.get_dataset_sources()
+
+    คืนค่า (df, messages) โดย messages เป็น list ของ (ระดับ, ข้อความ) สำหรับแสดงผล
+    """
+    if sources is None:
+        sources = get_dataset_sources()
+    elif isinstance(sources, str):
+        sources = [{"path": sources, "sheets": None}]
+
+    messages = []
     try:
-        # ลองหาไฟล์จากหลายตำแหน่ง
-        possible_paths = [
-            file_path,
-            f"./{file_path}",
-            f"data/{file_path}",
-            os.path.join(os.getcwd(), file_path)
-        ]
-        
-        excel_file = None
-        for path in possible_paths:
-            if os.path.exists(path):
-                excel_file = path
-                st.success(f"✅ พบไฟล์ที่: {path}")
-                break
-        
-        if not excel_file:
-            st.error(f"❌ ไม่พบไฟล์ {file_path}")
-            return pd.DataFrame()
-        
-        # อ่านไฟล์ Excel
-        df = pd.read_excel(excel_file)
-        
-        # ตรวจสอบคอลัมน์ที่จำเป็น
-        required_columns = ['หมวดหมู่', 'หัวข้อย่อย', 'คำถาม', 'คำตอบ', 'รูปภาพ']
-        missing_cols = [col for col in required_columns if col not in df.columns]
-        
-        if missing_cols:
-            st.error(f"❌ ขาดคอลัมน์: {missing_cols}")
-            st.info(f"คอลัมน์ที่มี: {list(df.columns)}")
-            return pd.DataFrame()
-        
-        # ทำความสะอาดข้อมูล
-        df = df[required_columns].copy()
-        df = df.fillna('')
-        df = df[df['คำถาม'].str.strip() != '']
-        df = df[df['คำตอบ'].str.strip() != '']
-        
-        # แปลงเป็น string ทั้งหมด
-        for col in df.columns:
-            df[col] = df[col].astype(str).str.strip()
-        
-        st.success(f"✅ โหลดข้อมูลสำเร็จ: {len(df)} คำถาม")
-        return df
-        
+        df, report = load_sources(sources)
+
+        # ผลการอ่านรายชีต
+        for item in report:
+            label = f"{item['path']} [{item['sheet']}]" if item["sheet"] is not None else item["path"]
+            if item["error"]:
+                messages.append(("error", f"❌ {label}: {item['error']}"))
+            else:
+                messages.append(("success", f"✅ พบไฟล์ที่: {label} ({item['rows']} คำถาม)"))
+
+        if df.empty:
+            return pd.DataFrame(), messages
+
+        messages.append(("success", f"✅ โหลดข้อมูลสำเร็จ: {len(df)} คำถาม"))
+        total = sum(item["rows"] for item in report)
+        if total > len(df):
+            messages.append(("success", f"🔗 รวมคำถามที่ซ้ำกัน: {total} -> {len(df)} แถว"))
+        return df, messages
+
     except Exception as e:
-        st.error(f"❌ เกิดข้อผิดพลาด: {str(e)}")
-        return pd.DataFrame()
+        messages.append(("error", f"❌ เกิดข้อผิดพลาด: {str(e)}"))
+        return pd.DataFrame(), messages
+
+def show_load_messages(messages):
+    """แสดงผลการโหลดไฟล์"""
+    for level, text in messages:
+        if level == "error":
+            st.error(text)
+        elif level == "warning":
+            st.warning(text)
+        else:
+            st.success(text)
 
-def similarity_score(str1, str2):
-    """คำนวณความคล้ายคลึงระหว่างสองสตริง"""
-    return SequenceMatcher(None, str1.lower(), str2.lower()).ratio()
+@st.cache_resource(show_spinner="🔄 กำลังโหลดข้อมูลจาก Excel...", max_entries=2)
+def load_dataset(fingerprint):
+    """โหลดและเตรียม dataset ครั้งเดียวต่อเวอร์ชันไฟล์ (แชร์ทุก session)
 
-def find_best_match(user_input, df, context, threshold=0.3):
+    fingerprint ใช้เป็น key ของ cache เท่านั้น เมื่อไฟล์ถูกแก้ไขจะโหลดใหม่
     """
-    ค้นหาคำถามที่ตรงที่สุดจาก dataset
-    
-    วิธีการค้นหา:
-    1. ตรวจสอบคำถามที่ตรงทุกตัวอักษร (exact match)
-    2. ตรวจสอบคำที่มีอยู่บางส่วน (partial match) - เหมาะกับคำสั้น
-    3. ตรวจสอบคำถามที่มีคำสำคัญตรงกัน (keyword match)
-    4. ตรวจสอบความคล้ายคลึง (similarity)
-    5. พิจารณาบริบท (หมวดหมู่และหัวข้อย่อยเดิม)
-    """
-    if df.empty:
-        return None
-    
-    user_lower = user_input.lower().strip()
-    user_words = user_lower.split()
-    
-    # ปรับ threshold สำหรับคำถามสั้น
-    if len(user_words) <= 3:
-        threshold = 0.2
-    
-    best_match_idx = None
-    best_score = 0
-    
-    for idx, row in df.iterrows():
-        question = str(row['คำถาม']).lower().strip()
-        question_words = question.split()
-        
-        # 1. Exact match (คะแนนเต็ม)
-        if user_lower == question:
-            return idx
-        
-        # 2. Partial match - ตรวจสอบว่าคำในคำถามผู้ใช้มีอยู่ในคำถาม dataset
-        partial_match_score = 0
-        for user_word in user_words:
-            # ข้ามคำทั่วไป
-            if user_word in ['คือ', 'อะไร', 'คือ?', 'อะไร?', 'ใช่', 'ไหม', 'หรือไม่']:
-                continue
-            
-            # ตรวจสอบว่าคำนี้มีในคำถาม dataset หรือไม่
-            for q_word in question_words:
-                # Exact word match
-                if user_word == q_word:
-                    partial_match_score += 1.0
-                # Partial word match (เช่น "embed" ใน "embedded")
-                elif user_word in q_word or q_word in user_word:
-                    if len(user_word) >= 3:  # คำต้องยาวพอสมควร
-                        partial_match_score += 0.8
-        
-        # ปรับคะแนนตามจำนวนคำ
-        if len(user_words) > 0:
-            partial_match_score = partial_match_score / len(user_words)
-        
-        # 3. Keyword matching
-        user_word_set = set(user_words)
-        question_word_set = set(question_words)
-        common_words = user_word_set.intersection(question_word_set)
-        keyword_score = len(common_words) / max(len(user_word_set), len(question_word_set)) if len(user_word_set) > 0 else 0
-        
-        # 4. Similarity score
-        sim_score = similarity_score(user_lower, question)
-        
-        # 5. Context bonus
-        context_bonus = 0
-        if context:
-            if context.get('last_category') == row['หมวดหมู่']:
-                context_bonus += 0.1
-            if context.get('last_subcategory') == row['หัวข้อย่อย']:
-                context_bonus += 0.1
-        
-        # คำนวณคะแนนรวม
-        # ให้น้ำหนัก partial match มากสำหรับคำสั้น
-        if len(user_words) <= 3:
-            total_score = (partial_match_score * 0.5) + (keyword_score * 0.2) + (sim_score * 0.2) + context_bonus
-        else:
-            total_score = (partial_match_score * 0.3) + (keyword_score * 0.3) + (sim_score * 0.3) + context_bonus
-        
-        # โบนัสพิเศษสำหรับคำถามสั้นที่มี partial match สูง
-        if len(user_words) <= 3 and partial_match_score > 0.6:
-            total_score += 0.3
-        
-        if total_score > best_score:
-            best_score = total_score
-            best_match_idx = idx
-    
-    # คืนค่าถ้าคะแนนเกิน threshold
-    if best_score >= threshold:
-        return best_match_idx
-    
-    return None
+    def build():
+        df, messages = load_excel_data()
+        return build_compact_dataset(df), messages
+
+    # โหมด fts: แถวทั้งหมดอยู่ในไฟล์ SQLite อ่านคำตอบทีละแถวตอนตอบ (ไม่ถือ dataset ทั้งชุด)
+    # โหมดหลาย worker: แนบ dataset ที่ process อื่นเผยแพร่ไว้แล้ว (mmap ไม่ต้อง parse ใหม่)
+    # worker ที่เริ่มพร้อมกันรอ process แรก parse เสร็จแล้วแนบผล
+    if get_primary_name() == "fts":
+        dataset, messages = fts_store.load_or_build(fingerprint, build)
+    elif get_shared_dir() is not None:
+        dataset, messages = attach_or_publish(fingerprint, build)
+    else:
+        dataset, messages = build()
+
+    # สร้าง index ของ scorer ที่เลือกไว้ตอนโหลด ไม่ให้คำถามแรกต้องรอ
+    prepare_scorers(dataset)
+
+    # อุ่นแคชและตรวจ URL รูปใน thread เบื้องหลัง (ไม่รอ)
+    start_background_jobs(dataset)
+    return dataset, messages
+
+def start_background_jobs(dataset):
+    """งานเบื้องหลังเมื่อได้ dataset เวอร์ชันใหม่: อุ่นแคชจาก query log และตรวจ URL รูป"""
+    start_warmup(dataset)
+    start_image_check(dataset)
+
+def get_dataset():
+    """dataset ปัจจุบัน (CompactDataset) พร้อมข้อความผลการโหลด"""
+    # ใช้ Google Sheets ถ้าตั้งค่าไว้ (sync เบื้องหลัง ได้ snapshot ล่าสุดเสมอ)
+    sheet_sync = get_sheet_sync(on_update=start_background_jobs)
+    if sheet_sync is not None:
+        return sheet_sync.snapshot()
+    return load_dataset(sources_fingerprint(get_dataset_sources()))
 
 def display_image_from_url(url, caption="รูปภาพประกอบ"):
     """แสดงรูปภาพจาก URL"""
@@ -234,19 +214,24 @@ def display_image_from_url(url, caption="รูปภาพประกอบ"):
             st.warning(f"⚠️ URL ไม่ถูกต้อง: {url}")
             return False
         
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        
-        image = Image.open(BytesIO(response.content))
+        # ดาวน์โหลดครั้งแรกครั้งเดียว ครั้งต่อไปใช้ไฟล์ที่จำไว้
+        content = fetch_image(url)
+
+        image = get_pil_image().open(BytesIO(content))
         st.image(image, caption=caption, use_container_width=True)
         return True
+    except ImageUnavailable as e:
+        # เพิ่งโหลดไม่สำเร็จ ไม่ส่งคำขอใหม่ แสดงข้อความสั้น ๆ แทน
+        st.caption(f"🖼️ รูปภาพไม่พร้อมใช้งาน: {e}")
+        return False
     except Exception as e:
         st.error(f"❌ ไม่สามารถโหลดรูปภาพ: {str(e)}\nURL: {url}")
         return False
 
 def create_new_session():
     """สร้าง session การสนทนาใหม่"""
-    session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # ใส่ microsecond ด้วย กัน key ซ้ำเมื่อสร้างหลาย session ในวินาทีเดียวกัน
+    session_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
     session_data = {
         "id": session_id,
         "title": f"การสนทนา {len(st.session_state.conversation_sessions) + 1}",
@@ -257,6 +242,7 @@ def create_new_session():
         "preview": "การสนทนาใหม่",
         "context": {}
     }
+    touch_session(session_data)
     
     if "conversation_sessions" not in st.session_state:
         st.session_state.conversation_sessions = []
@@ -272,9 +258,19 @@ def switch_session(session_id):
     """เปลี่ยนไปยัง session ที่เลือก"""
     for session in st.session_state.conversation_sessions:
         if session["id"] == session_id:
+            # โหลดกลับจากสถานะบีบอัด/ไฟล์ (ถ้าถูกย้ายออกไป)
+            messages = restore_session(session)
+            if session.pop("expired", False):
+                # ไฟล์ประวัติถูกลบเพราะไม่ได้ใช้งานนาน แจ้งผู้ใช้แทนการแสดงหน้าว่าง
+                hours = get_spill_max_seconds() / 3600
+                messages.append({
+                    "role": "model",
+                    "content": f"⌛ ประวัติของการสนทนานี้หมดอายุแล้ว (ไม่ได้ใช้งานเกิน {hours:g} ชั่วโมง) ถามต่อได้เลยครับ",
+                })
             st.session_state.current_session_id = session_id
-            st.session_state.current_messages = session["messages"].copy()
+            st.session_state.current_messages = messages.copy()
             st.session_state.conversation_context = session.get("context", {})
+            enforce_budget(st.session_state.conversation_sessions, session_id)
             break
 
 def update_session_preview(session_id, user_input):
@@ -287,13 +283,12 @@ def update_session_preview(session_id, user_input):
                 session["title"] = preview
             break
 
-def generate_response(user_input, df):
-    """สร้างการตอบกลับจากข้อมูลใน dataset"""
+def generate_response(user_input, dataset):
+    """สร้างการตอบกลับจากข้อมูลใน dataset (CompactDataset)"""
     
     # คำสั่งพิเศษ
     if user_input.lower() in ["clear", "ล้าง", "reset", "เริ่มใหม่"]:
         clear_current_chat()
-        st.rerun()
         return
 
     # สร้าง session ใหม่ถ้ายังไม่มี
@@ -305,7 +300,7 @@ def generate_response(user_input, df):
         st.session_state.conversation_context = {}
 
     # ตรวจสอบว่ามีข้อมูลใน dataset หรือไม่
-    if df.empty:
+    if dataset.empty:
         response_text = "❌ ยังไม่มีข้อมูลในระบบ โปรดตรวจสอบไฟล์ dataset.xlsx"
         st.session_state.current_messages.append({"role": "user", "content": user_input})
         st.session_state.current_messages.append({"role": "model", "content": response_text})
@@ -313,20 +308,24 @@ def generate_response(user_input, df):
 
     # ค้นหาคำตอบที่ตรงที่สุด
     context = st.session_state.conversation_context
-    match_idx = find_best_match(user_input, df, context)
+    start = time.perf_counter()
+    result = search(user_input, dataset, context)
+    match_idx = result["row"]
+
+    # บันทึกคำถามลงคิวของ query log (thread เบื้องหลังเขียนไฟล์เอง)
+    log_query(st.session_state.current_session_id, user_input, result,
+              time.perf_counter() - start, dataset.version, context)
     
     # เพิ่มคำถามของผู้ใช้
     st.session_state.current_messages.append({"role": "user", "content": user_input})
     
     if match_idx is not None:
         # พบคำตอบใน dataset
-        row = df.iloc[match_idx]
+        record = dataset.records[match_idx]
         
-        category = row['หมวดหมู่']
-        subcategory = row['หัวข้อย่อย']
-        question = row['คำถาม']
-        answer = row['คำตอบ']
-        image_url = row['รูปภาพ']
+        category = dataset.category_of(record)
+        subcategory = dataset.subcategory_of(record)
+        question = record.question
         
         # อัพเดทบริบท
         st.session_state.conversation_context = {
@@ -335,45 +334,16 @@ def generate_response(user_input, df):
             "last_question": question
         }
         
-        # สร้างคำตอบ
-        response_text = f"📖 **หมวดหมู่:** {category}\n"
-        response_text += f"📂 **หัวข้อย่อย:** {subcategory}\n\n"
-        response_text += f"❓ **คำถาม:** {question}\n\n"
-        response_text += f"💡 **คำตอบ:**\n{answer}\n\n"
-        
-        # เพิ่มรูปภาพถ้ามี
-        has_image = False
-        if image_url and image_url != '' and image_url != 'nan':
-            response_text += f"🖼️ **มีรูปภาพประกอบ** (แสดงด้านล่าง)\n\n"
-            has_image = True
-        
-        response_text += "💬 **มีคำถามเพิ่มเติมหรือไม่ครับ?**"
-        
-        # เพิ่มคำตอบ
-        st.session_state.current_messages.append({
-            "role": "model", 
-            "content": response_text,
-            "image_url": image_url if has_image else None
-        })
+        # เพิ่มคำตอบ (เก็บเป็น reference ข้อความ render ครั้งเดียวต่อแถวใน answers)
+        st.session_state.current_messages.append(answer_message(dataset, match_idx))
         
     else:
-        # ไม่พบคำตอบใน dataset
-        response_text = "❌ **ขออภัยครับ**\n\n"
-        response_text += "คำถามนี้อยู่นอกเหนือขอบเขตวิชา Embedded System ที่มีในระบบ\n\n"
-        response_text += "📚 **คำถามที่ระบบสามารถตอบได้ครอบคลุม:**\n"
-        
-        # แสดงหมวดหมู่ที่มี
-        categories = df['หมวดหมู่'].unique()
-        for cat in categories[:5]:
-            response_text += f"• {cat}\n"
-        
-        response_text += "\n💡 **ลองถามคำถามอื่นที่เกี่ยวข้องกับหัวข้อเหล่านี้ดูครับ**"
-        
-        st.session_state.current_messages.append({
-            "role": "model", 
-            "content": response_text,
-            "image_url": None
-        })
+        # ไม่พบคำตอบใน dataset: ถ้าเปิดและตั้งค่า Gemini ไว้ให้ตอบจากแถวที่ใกล้เคียง (prompt ตามงบ token)
+        generated = ask_gemini(user_input, dataset, context)
+        if generated:
+            st.session_state.current_messages.append({"role": "model", "content": generated})
+        else:
+            st.session_state.current_messages.append(answer_message(dataset, None))
     
     # อัพเดต session
     update_session_preview(st.session_state.current_session_id, user_input)
@@ -382,36 +352,144 @@ def generate_response(user_input, df):
         if session["id"] == st.session_state.current_session_id:
             session["messages"] = st.session_state.current_messages.copy()
             session["context"] = st.session_state.conversation_context.copy()
+            touch_session(session)
             break
 
-def setup_quick_questions(df):
-    """สร้างปุ่มคำถามแนะนำจาก dataset"""
-    if df.empty:
-        return {}
-    
-    categories = {}
+    # ถ้าเกินงบหน่วยความจำ บีบอัด/ย้าย session ที่ไม่ได้ใช้ออก
+    enforce_budget(st.session_state.conversation_sessions, st.session_state.current_session_id)
+
+def handle_quick_question(question):
+    """จัดการเมื่อกดปุ่มคำถามแนะนำ (on_click ทำงานก่อน rerun จึงไม่ต้อง st.rerun ซ้ำ)"""
+    dataset, _ = get_dataset()
+    generate_response(question, dataset)
+
+def delete_session(session_id):
+    """ลบ session ที่เลือก"""
+    for session in st.session_state.conversation_sessions:
+        if session["id"] == session_id:
+            discard_session(session)
+    st.session_state.conversation_sessions = [
+        s for s in st.session_state.conversation_sessions
+        if s["id"] != session_id
+    ]
+    if session_id == st.session_state.current_session_id:
+        if st.session_state.conversation_sessions:
+            switch_session(st.session_state.conversation_sessions[0]["id"])
+        else:
+            create_new_session()
+
+def sidebar_signature(dataset):
+    """ทุกค่าที่ sidebar แสดง: บริบท, รายการ session และหน่วยความจำ, สถิติ dataset และผลตรวจรูป
+
+    ใช้ตรวจว่าต้อง rerun ทั้งหน้าหรือไม่ (fragment rerun ไม่วาด sidebar ใหม่)
+    """
+    context = st.session_state.conversation_context
+    sessions = st.session_state.conversation_sessions
+    image_check = image_check_status(dataset)
+    return (
+        dataset.version,
+        tuple(context.get(key) for key in ("last_category", "last_subcategory", "last_question")),
+        image_check and (image_check["done"], len(image_check["broken"])),
+        round(total_memory(sessions) / 1024, 1),
+        tuple(
+            (s["id"], s["title"], session_question_count(s), session_state_of(s), round(session_memory(s) / 1024, 1))
+            for s in sessions
+        ),
+    )
+
+def render_message(msg):
+    """แสดงข้อความหนึ่งข้อความ พร้อมรูปภาพถ้ามี"""
+    avatar = "🤖" if msg["role"] == "model" else "👤"
+    payload = message_payload(msg)
     
-    for idx, row in df.iterrows():
-        category = row['หมวดหมู่']
-        subcategory = row['หัวข้อย่อย']
-        question = row['คำถาม']
+    with st.chat_message(msg["role"], avatar=avatar):
+        st.write(payload["content"])
         
-        if category not in categories:
-            categories[category] = {}
+        # แสดงรูปภาพถ้ามี
+        if msg["role"] == "model" and payload["image_url"]:
+            st.write("---")
+            st.write("🖼️ **รูปภาพประกอบ:**")
+            display_image_from_url(payload["image_url"])
+
+@st.fragment
+def ngrok_panel():
+    """แผงควบคุม ngrok (fragment: กดปุ่มแล้ว rerun เฉพาะส่วนนี้)"""
+    if "ngrok_url" not in st.session_state:
+        st.session_state.ngrok_url = None
+    
+    col_ngrok1, col_ngrok2 = st.columns([3, 1])
+    
+    with col_ngrok1:
+        if st.session_state.ngrok_url:
+            st.success("✅ เชื่อมต่อแล้ว")
+        else:
+            st.info("📡 ยังไม่ได้เชื่อมต่อ")
+    
+    with col_ngrok2:
+        # เปลี่ยนสถานะ tunnel แล้ว rerun ทั้งหน้าเพื่ออัพเดตแบนเนอร์ URL ด้านบน
+        if st.session_state.ngrok_url:
+            if st.button("🔴", key="stop_ngrok", help="หยุด ngrok"):
+                try:
+                    get_ngrok().disconnect(st.session_state.ngrok_url)
+                    st.session_state.ngrok_url = None
+                    st.rerun()
+                except:
+                    st.session_state.ngrok_url = None
+                    st.rerun()
+        else:
+            if st.button("🟢", key="start_ngrok", help="เริ่ม ngrok"):
+                with st.spinner("🔄 กำลังสร้าง tunnel..."):
+                    tunnel = setup_ngrok()
+                    if tunnel:
+                        st.session_state.ngrok_url = tunnel.public_url
+                        st.rerun()
+    
+    if st.session_state.ngrok_url:
+        st.text_input(
+            "🔗 Public URL (คัดลอกส่งให้เพื่อน)",
+            value=st.session_state.ngrok_url,
+            key="public_url_display",
+            help="คัดลอก URL นี้ส่งให้เพื่อนเพื่อเข้าใช้งาน"
+        )
+        st.caption("⚠️ ใช้ได้จนกว่าจะปิดโปรแกรม")
+    else:
+        st.caption("💡 กด 🟢 เพื่อสร้าง Public URL")
+
+@st.fragment
+def chat_panel():
+    """ส่วนสนทนา (fragment: ส่งคำถามแล้ว rerun เฉพาะส่วนนี้ ไม่สร้างทั้งหน้าใหม่)"""
+    st.subheader("💬 การสนทนาปัจจุบัน")
+    
+    # สร้าง container ของบทสนทนาก่อนช่องพิมพ์ แล้วค่อยเติมข้อความหลังประมวลผลคำถาม
+    transcript = st.container()
+    
+    st.divider()
+    
+    st.info(
+        "💡 **วิธีใช้งาน:**\n"
+        "• พิมพ์คำถามที่ต้องการทราบ\n"
+        "• ระบบจะค้นหาคำตอบจาก dataset อัตโนมัติ\n"
+        "• ถ้าคำถามนอกเหนือจาก dataset ระบบจะแจ้งให้ทราบ\n"
+        "• รูปภาพจะแสดงอัตโนมัติถ้ามีในคำตอบ"
+    )
+    
+    user_input = st.chat_input("พิมพ์คำถามที่นี่...")
+    
+    if user_input:
+        dataset, _ = get_dataset()
+        sidebar_before = sidebar_signature(dataset)
         
-        if subcategory not in categories[category]:
-            categories[category][subcategory] = []
+        with st.spinner("🔍 กำลังค้นหาข้อมูล..."):
+            generate_response(user_input, dataset)
         
-        if len(categories[category][subcategory]) < 4:
-            categories[category][subcategory].append(question)
+        # rerun ทั้งหน้าเมื่อสิ่งที่ sidebar แสดงเปลี่ยน (บริบท, session, หน่วยความจำ, สถิติ)
+        # ไม่อย่างนั้น sidebar จะค้างค่าก่อนคำถามนี้
+        if sidebar_signature(get_dataset()[0]) != sidebar_before:
+            st.rerun(scope="app")
     
-    return categories
-
-def handle_quick_question(question):
-    """จัดการเมื่อกดปุ่มคำถามแนะนำ"""
-    df = st.session_state.get("qa_df", pd.DataFrame())
-    generate_response(question, df)
-    st.rerun()
+    with transcript:
+        for msg in st.session_state.current_messages:
+            render_message(msg)
 
 # ======================
 # 🖥️ ส่วนติดต่อผู้ใช้
@@ -471,20 +549,22 @@ if "current_messages" not in st.session_state:
 if "conversation_context" not in st.session_state:
     st.session_state.conversation_context = {}
 
-if "qa_df" not in st.session_state:
-    with st.spinner("🔄 กำลังโหลดข้อมูลจาก Excel..."):
-        st.session_state.qa_df = load_excel_data("dataset.xlsx")
+# โหลดข้อมูล (cache ร่วมกันทุก session)
+dataset, load_messages = get_dataset()
+stats = dataset.stats
 
-# โหลดข้อมูล
-df = st.session_state.get("qa_df", pd.DataFrame())
+# แสดงผลการโหลดครั้งแรกของ session หรือเมื่อ dataset เปลี่ยนเวอร์ชัน
+if st.session_state.get("qa_version") != dataset.version:
+    show_load_messages(load_messages)
+    st.session_state.qa_version = dataset.version
 
 # ======================
 # 🎯 ส่วนปุ่มคำถามแนะนำ
 # ======================
 
-quick_categories = setup_quick_questions(df)
+quick_categories = dataset.quick_questions
 
-if quick_categories and not df.empty:
+if quick_categories and not dataset.empty:
     st.markdown('<div class="quick-questions-section">', unsafe_allow_html=True)
     st.markdown('<h3 style="text-align: center; color: white;">🚀 คำถามแนะนำจาก Dataset</h3>', unsafe_allow_html=True)
     
@@ -500,13 +580,14 @@ if quick_categories and not df.empty:
             for i, question in enumerate(questions[:4]):
                 col_idx = i % 2
                 with cols[col_idx]:
-                    if st.button(
+                    st.button(
                         question[:60] + "..." if len(question) > 60 else question,
                         key=f"quick_{category}_{subcategory}_{i}",
                         use_container_width=True,
-                        type="secondary"
-                    ):
-                        handle_quick_question(question)
+                        type="secondary",
+                        on_click=handle_quick_question,
+                        args=(question,)
+                    )
             
             st.markdown('</div>', unsafe_allow_html=True)
         
@@ -515,11 +596,11 @@ if quick_categories and not df.empty:
     st.markdown('</div>', unsafe_allow_html=True)
 
 # แสดงสถานะ
-if not df.empty:
+if not dataset.empty:
     st.markdown(
-        f'<div class="status-info">✅ โหลดข้อมูลสำเร็จ: {len(df)} คำถาม | '
-        f'{len(df["หมวดหมู่"].unique())} หมวดหมู่ | '
-        f'{len(df[df["รูปภาพ"] != ""]["รูปภาพ"])} รูปภาพ</div>',
+        f'<div class="status-info">✅ โหลดข้อมูลสำเร็จ: {stats["questions"]} คำถาม | '
+        f'{stats["categories"]} หมวดหมู่ | '
+        f'{stats["images"]} รูปภาพ</div>',
         unsafe_allow_html=True
     )
 else:
@@ -535,46 +616,7 @@ with st.sidebar:
     if NGROK_AVAILABLE:
         st.divider()
         st.subheader("🌐 แชร์แอปผ่านอินเทอร์เน็ต")
-        
-        if "ngrok_url" not in st.session_state:
-            st.session_state.ngrok_url = None
-        
-        col_ngrok1, col_ngrok2 = st.columns([3, 1])
-        
-        with col_ngrok1:
-            if st.session_state.ngrok_url:
-                st.success("✅ เชื่อมต่อแล้ว")
-            else:
-                st.info("📡 ยังไม่ได้เชื่อมต่อ")
-        
-        with col_ngrok2:
-            if st.session_state.ngrok_url:
-                if st.button("🔴", key="stop_ngrok", help="หยุด ngrok"):
-                    try:
-                        ngrok.disconnect(st.session_state.ngrok_url)
-                        st.session_state.ngrok_url = None
-                        st.rerun()
-                    except:
-                        st.session_state.ngrok_url = None
-                        st.rerun()
-            else:
-                if st.button("🟢", key="start_ngrok", help="เริ่ม ngrok"):
-                    with st.spinner("🔄 กำลังสร้าง tunnel..."):
-                        tunnel = setup_ngrok()
-                        if tunnel:
-                            st.session_state.ngrok_url = tunnel.public_url
-                            st.rerun()
-        
-        if st.session_state.ngrok_url:
-            st.text_input(
-                "🔗 Public URL (คัดลอกส่งให้เพื่อน)",
-                value=st.session_state.ngrok_url,
-                key="public_url_display",
-                help="คัดลอก URL นี้ส่งให้เพื่อนเพื่อเข้าใช้งาน"
-            )
-            st.caption("⚠️ ใช้ได้จนกว่าจะปิดโปรแกรม")
-        else:
-            st.caption("💡 กด 🟢 เพื่อสร้าง Public URL")
+        ngrok_panel()
     else:
         st.divider()
         st.warning("⚠️ ต้องการแชร์แอป?\nติดตั้ง: `pip install pyngrok`")
@@ -582,13 +624,9 @@ with st.sidebar:
     st.divider()
     # ======================
     
-    if st.button("🆕 สร้างการสนทนาใหม่", key="new_chat", use_container_width=True):
-        create_new_session()
-        st.rerun()
+    st.button("🆕 สร้างการสนทนาใหม่", key="new_chat", use_container_width=True, on_click=create_new_session)
     
-    if st.button("🗑️ ล้างประวัติทั้งหมด", key="clear_all", use_container_width=True):
-        clear_all_history()
-        st.rerun()
+    st.button("🗑️ ล้างประวัติทั้งหมด", key="clear_all", use_container_width=True, on_click=clear_all_history)
     
     st.divider()
     
@@ -608,17 +646,33 @@ with st.sidebar:
     st.divider()
     
     # แสดงสถิติ
-    if not df.empty:
+    if not dataset.empty:
         st.subheader("📊 สถิติ Dataset")
-        st.metric("คำถามทั้งหมด", len(df))
-        st.metric("หมวดหมู่", len(df['หมวดหมู่'].unique()))
-        st.metric("รูปภาพ", len(df[df['รูปภาพ'] != '']))
+        st.metric("คำถามทั้งหมด", stats["questions"])
+        st.metric("หมวดหมู่", stats["categories"])
+        st.metric("รูปภาพ", stats["images"])
+
+        image_check = image_check_status(dataset)
+        if image_check is not None:
+            if not image_check["done"]:
+                st.caption(f"🖼️ กำลังตรวจ URL รูป {image_check['urls']} รายการ...")
+            else:
+                broken = image_check["broken"]
+                st.metric("รูปภาพเสีย", len(broken))
+                if broken:
+                    with st.expander("แถวที่รูปภาพใช้ไม่ได้", expanded=False):
+                        for row, error in sorted(broken.items()):
+                            st.caption(f"**แถว {row}:** {dataset.records[row].question[:50]} — {error[:80]}")
     
     st.divider()
     
     # แสดงรายการการสนทนา
     if st.session_state.conversation_sessions:
         st.subheader("📝 รายการการสนทนา")
+
+        used_kb = total_memory(st.session_state.conversation_sessions) / 1024
+        budget_kb = get_budget_bytes() / 1024
+        st.caption(f"🧮 หน่วยความจำประวัติ: {used_kb:.1f} / {budget_kb:.0f} KB")
         
         for session in st.session_state.conversation_sessions:
             is_active = session["id"] == st.session_state.current_session_id
@@ -628,31 +682,29 @@ with st.sidebar:
             with col1:
                 button_label = f"{'📍' if is_active else '📝'} {session['title'][:30]}..."
                 
-                if st.button(
+                st.button(
                     button_label,
                     key=f"session_{session['id']}",
                     use_container_width=True,
-                    type="primary" if is_active else "secondary"
-                ):
-                    switch_session(session["id"])
-                    st.rerun()
+                    type="primary" if is_active else "secondary",
+                    on_click=switch_session,
+                    args=(session["id"],)
+                )
             
             with col2:
-                if st.button("🗑️", key=f"delete_{session['id']}", help="ลบ"):
-                    st.session_state.conversation_sessions = [
-                        s for s in st.session_state.conversation_sessions
-                        if s["id"] != session["id"]
-                    ]
-                    if session["id"] == st.session_state.current_session_id:
-                        if st.session_state.conversation_sessions:
-                            switch_session(st.session_state.conversation_sessions[0]["id"])
-                        else:
-                            create_new_session()
-                    st.rerun()
+                st.button("🗑️", key=f"delete_{session['id']}", help="ลบ", on_click=delete_session, args=(session["id"],))
             
             time_str = session["timestamp"].strftime("%d/%m %H:%M")
-            message_count = len([m for m in session["messages"] if m["role"] == "user"])
-            st.caption(f"⏰ {time_str} | 💬 {message_count} คำถาม")
+            message_count = session_question_count(session)
+            memory_kb = session_memory(session) / 1024
+            storage = session_state_of(session)
+            if storage == STATE_SPILLED:
+                memory_label = "📁 ย้ายไปไฟล์"
+            elif storage == STATE_COMPRESSED:
+                memory_label = f"🗜️ {memory_kb:.1f} KB (บีบอัด)"
+            else:
+                memory_label = f"💾 {memory_kb:.1f} KB"
+            st.caption(f"⏰ {time_str} | 💬 {message_count} คำถาม | {memory_label}")
             st.divider()
 
 # Layout หลัก
@@ -665,44 +717,8 @@ if NGROK_AVAILABLE and st.session_state.get("ngrok_url"):
 
 st.divider()
 
-# แสดงการสนทนา
-chat_container = st.container()
-
-with chat_container:
-    st.subheader("💬 การสนทนาปัจจุบัน")
-    
-    for msg in st.session_state.current_messages:
-        avatar = "🤖" if msg["role"] == "model" else "👤"
-        
-        with st.chat_message(msg["role"], avatar=avatar):
-            st.write(msg["content"])
-            
-            # แสดงรูปภาพถ้ามี
-            if msg["role"] == "model" and msg.get("image_url"):
-                st.write("---")
-                st.write("🖼️ **รูปภาพประกอบ:**")
-                display_image_from_url(msg["image_url"])
-
-# Input
-st.divider()
-
-st.info(
-    "💡 **วิธีใช้งาน:**\n"
-    "• พิมพ์คำถามที่ต้องการทราบ\n"
-    "• ระบบจะค้นหาคำตอบจาก dataset อัตโนมัติ\n"
-    "• ถ้าคำถามนอกเหนือจาก dataset ระบบจะแจ้งให้ทราบ\n"
-    "• รูปภาพจะแสดงอัตโนมัติถ้ามีในคำตอบ"
-)
-
-user_input = st.chat_input("พิมพ์คำถามที่นี่...")
-
-if user_input:
-    with st.chat_message("user", avatar="👤"):
-        st.write(user_input)
-    
-    with st.spinner("🔍 กำลังค้นหาข้อมูล..."):
-        generate_response(user_input, df)
-        st.rerun()
+# แสดงการสนทนาและช่องพิมพ์คำถาม
+chat_panel()
 
 # Footer
 st.divider()
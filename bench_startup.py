@@ -0,0 +1,139 @@
+# bench_startup.py
+# วัดเวลาเริ่มแอป: เวลา import โมดูล และเวลาจนถึงการ render หน้าแรก
+#
+# วิธีใช้:
+#   python bench_startup.py            # รัน 3 รอบ
+#   python bench_startup.py --runs 5 --output bench_output.txt
+#
+# ทุกการวัดรันใน process ใหม่ เพื่อให้เป็นค่า cold start จริง
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# โมดูลที่ app.py เคย import ตอนเริ่ม (ใช้เทียบกับของที่ import จริงตอนนี้)
+HEAVY_MODULES = [
+    "streamlit",
+    "pandas",
+    "google.generativeai",
+    "pyngrok.ngrok",
+    "PIL.Image",
+    "requests",
+    "difflib",
+]
+
+IMPORT_SNIPPET = """
+import json, sys, time
+name = sys.argv[1]
+start = time.perf_counter()
+try:
+    __import__(name)
+    ok = True
+except Exception:
+    ok = False
+print(json.dumps({"seconds": time.perf_counter() - start, "ok": ok}))
+"""
+
+RENDER_SNIPPET = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.run()
+first = time.perf_counter()
+at.run()
+second = time.perf_counter()
+loaded = sorted(m for m in ("google.generativeai", "pyngrok.ngrok", "PIL.Image", "requests") if m in sys.modules)
+print(json.dumps({
+    "streamlit_import": imported - start,
+    "first_render": first - imported,
+    "rerun": second - first,
+    "exceptions": len(at.exception),
+    "heavy_loaded": loaded,
+}))
+"""
+
+
+def run_snippet(snippet, *args):
+    """รันโค้ดใน python process ใหม่ แล้วอ่านผล JSON บรรทัดสุดท้าย"""
+    result = subprocess.run(
+        [sys.executable, "-c", snippet, *args],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+    )
+    lines = [line for line in result.stdout.splitlines() if line.startswith("{")]
+    if not lines:
+        raise RuntimeError(result.stderr.strip() or "ไม่มีผลลัพธ์")
+    return json.loads(lines[-1])
+
+
+def summarize(values):
+    """ค่ากลางและค่าต่ำสุด (มิลลิวินาที)"""
+    return {
+        "median_ms": round(statistics.median(values) * 1000, 1),
+        "min_ms": round(min(values) * 1000, 1),
+    }
+
+
+def bench_imports(runs):
+    """เวลา import ของแต่ละโมดูลแบบ cold"""
+    results = {}
+    for name in HEAVY_MODULES:
+        samples = []
+        ok = True
+        for _ in range(runs):
+            data = run_snippet(IMPORT_SNIPPET, name)
+            ok = ok and data["ok"]
+            samples.append(data["seconds"])
+        results[name] = dict(summarize(samples), installed=ok)
+    return results
+
+
+def bench_render(runs):
+    """เวลาจนถึง render หน้าแรกของ app.py (cold process) และเวลา rerun"""
+    first, rerun = [], []
+    last = {}
+    for _ in range(runs):
+        last = run_snippet(RENDER_SNIPPET, os.path.join(APP_DIR, "app.py"))
+        first.append(last["first_render"])
+        rerun.append(last["rerun"])
+    return {
+        "first_render": summarize(first),
+        "rerun": summarize(rerun),
+        "exceptions": last.get("exceptions"),
+        "heavy_modules_loaded_at_startup": last.get("heavy_loaded"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="วัดเวลาเริ่มแอป EmbedBot")
+    parser.add_argument("--runs", type=int, default=3, help="จำนวนรอบต่อการวัด")
+    parser.add_argument("--output", help="บันทึกผลเป็น JSON ลงไฟล์")
+    args = parser.parse_args()
+
+    print("⏱️ วัดเวลา import ...")
+    imports = bench_imports(args.runs)
+    for name, data in imports.items():
+        status = "" if data["installed"] else " (ไม่ได้ติดตั้ง)"
+        print(f"• {name:<22} {data['median_ms']:>8} ms{status}")
+
+    print("⏱️ วัดเวลา render หน้าแรก ...")
+    render = bench_render(args.runs)
+    print(f"• first render (cold)    {render['first_render']['median_ms']:>8} ms")
+    print(f"• rerun                  {render['rerun']['median_ms']:>8} ms")
+    print(f"• โมดูลหนักที่ถูก import ตอนเริ่ม: {render['heavy_modules_loaded_at_startup']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"imports": imports, "render": render}, f, ensure_ascii=False, indent=2)
+        print(f"✅ บันทึกผลที่ {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# bm25.py
+# ค้นหาคำตอบด้วย BM25F (ให้น้ำหนักแยกตามฟิลด์ คำถาม / คำพ้อง / คำตอบ)
+#
+# คำที่พบบ่อยทั้ง dataset (เช่น "arduino", "คือ") ได้ IDF ต่ำโดยอัตโนมัติ
+# ไม่ต้องพึ่งรายการคำที่ข้ามแบบตายตัว IDF และน้ำหนักของทุกคำคำนวณไว้ตอนสร้าง
+# index แล้วเก็บเป็น inverted index (postings list) ทำให้เวลาค้นหาขึ้นกับ
+# ความยาว postings ของคำในคำถาม ไม่ใช่จำนวนแถวทั้งหมด
+import math
+import re
+import weakref
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+from lazy_modules import load_module, module_available
+from normalize import normalize_query, normalize_text, question_texts
+
+K1 = 1.2
+
+# (ฟิลด์, น้ำหนัก, b) คำถามสำคัญที่สุด คำตอบมีน้ำหนักน้อยและใส่หรือไม่ก็ได้
+FIELDS = (
+    ("question", 3.0, 0.75),
+    ("synonyms", 1.5, 0.5),
+    ("answer", 0.3, 0.75),
+)
+
+# คะแนน (เทียบกับคะแนนสูงสุดที่เป็นไปได้ของคำถาม) ขั้นต่ำที่ถือว่าตอบได้
+MIN_SCORE = 0.2
+
+# โบนัสบริบทต่อแถวที่ตรงกับหมวดหมู่/หัวข้อย่อยเดิม (ใช้กับแถวที่มีคะแนนแล้วเท่านั้น)
+CONTEXT_BONUS = 0.05
+
+LATIN_RE = re.compile(r"[a-z0-9_]+")
+THAI_RE = re.compile(r"[฀-๿]+")
+
+
+@lru_cache(maxsize=1)
+def thai_word_tokenize():
+    """ตัวตัดคำภาษาไทยของ pythainlp (None ถ้าไม่ได้ติดตั้ง)"""
+    if not module_available("pythainlp"):
+        return None
+    return load_module("pythainlp.tokenize").word_tokenize
+
+
+def tokenize(text):
+    """แยกคำ: คำภาษาอังกฤษ/ตัวเลขตามตัวอักษร ภาษาไทยใช้ pythainlp
+
+    ถ้าไม่มี pythainlp ภาษาไทยจะถูกแบ่งเป็น character trigram แทน
+    """
+    text = normalize_text(text)
+    tokens = LATIN_RE.findall(text)
+
+    word_tokenize = thai_word_tokenize()
+    for run in THAI_RE.findall(text):
+        if word_tokenize is not None:
+            tokens.extend(w for w in word_tokenize(run, engine="newmm") if w.strip())
+        elif len(run) <= 3:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 3] for i in range(len(run) - 2))
+    return tokens
+
+
+class BM25Index:
+    """inverted index ของ dataset: คำ -> (แถว, คะแนน BM25F ที่คำนวณไว้แล้ว)"""
+
+    def __init__(self, dataset, include_answers=True, k1=K1, field_counts=None):
+        self.k1 = k1
+        self.include_answers = include_answers
+        fields = [f for f in FIELDS if include_answers or f[0] != "answer"]
+
+        records = dataset.records
+        self.size = len(records)
+        self.category_codes = np.array([r.category_code for r in records], dtype=np.int32)
+        self.subcategory_codes = np.array([r.subcategory_code for r in records], dtype=np.int32)
+
+        # exact match: ข้อความคำถาม -> record แรกที่มีข้อความนี้
+        self.exact = {}
+        for record, questions in zip(records, question_texts(dataset)):
+            for question in questions:
+                self.exact.setdefault(question, record.row_id)
+
+        # tf แยกฟิลด์ (เก็บไว้ให้ patched ตัดคำใหม่เฉพาะแถวที่เปลี่ยน)
+        if field_counts is None:
+            field_counts = {
+                name: [Counter(tokenize(self.field_text(record, name))) for record in records]
+                for name, _, _ in fields
+            }
+        self.field_counts = field_counts
+
+        # รวมเป็น tf ถ่วงน้ำหนักที่ normalize ความยาวแล้ว (BM25F)
+        weighted_tf = [Counter() for _ in records]
+        for name, weight, b in fields:
+            lengths = [sum(counts.values()) for counts in field_counts[name]]
+            average = (sum(lengths) / len(lengths)) if lengths else 0
+            for doc, (counts, length) in enumerate(zip(field_counts[name], lengths)):
+                if not length:
+                    continue
+                norm = 1 - b + b * length / average
+                for term, tf in counts.items():
+                    weighted_tf[doc][term] += weight * tf / norm
+
+        document_frequency = Counter()
+        for counts in weighted_tf:
+            document_frequency.update(counts.keys())
+
+        self.idf = {term: self.compute_idf(df) for term, df in document_frequency.items()}
+        self.unseen_idf = self.compute_idf(0)
+
+        postings = {}
+        for doc, counts in enumerate(weighted_tf):
+            for term, tf in counts.items():
+                impact = self.idf[term] * tf * (k1 + 1) / (k1 + tf)
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(doc)
+                postings[term][1].append(impact)
+
+        self.postings = {
+            term: (np.array(docs, dtype=np.int32), np.array(impacts))
+            for term, (docs, impacts) in postings.items()
+        }
+
+    def patched(self, dataset, changed_rows):
+        """index ของ dataset ใหม่ที่ตัดคำใหม่เฉพาะแถวที่เปลี่ยน
+
+        IDF ความยาวเฉลี่ย และน้ำหนักใน postings คำนวณใหม่ทั้งชุดจากจำนวนคำที่เก็บไว้
+        (เป็นตัวเลขล้วน ไม่ต้องตัดคำ) ผลจึงเหมือนสร้าง index ใหม่ทั้งชุด
+        """
+        changed = [row for row in set(changed_rows) if row < len(dataset)]
+        field_counts = {}
+        for name, counts in self.field_counts.items():
+            counts = counts[:len(dataset)] + [None] * (len(dataset) - len(counts))
+            for row in changed:
+                counts[row] = Counter(tokenize(self.field_text(dataset.records[row], name)))
+            field_counts[name] = counts
+        return BM25Index(dataset, self.include_answers, self.k1, field_counts)
+
+    @staticmethod
+    def field_text(record, name):
+        if name == "question":
+            return " ".join((record.question,) + record.aliases)
+        if name == "synonyms":
+            return record.synonyms
+        return record.answer
+
+    def compute_idf(self, df):
+        return math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+
+    def max_score(self, terms):
+        """คะแนนสูงสุดที่เป็นไปได้ของคำถาม (ใช้ normalize ให้อยู่ในช่วง 0-1)"""
+        return sum(self.idf.get(term, self.unseen_idf) for term in terms) * (self.k1 + 1)
+
+    def search(self, terms):
+        """คะแนนของแถวที่มีคำในคำถามอย่างน้อยหนึ่งคำ คืนค่า (แถว, คะแนน)"""
+        hits = [self.postings[term] for term in terms if term in self.postings]
+        if not hits:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+
+        docs = np.concatenate([h[0] for h in hits])
+        impacts = np.concatenate([h[1] for h in hits])
+        unique_docs, inverse = np.unique(docs, return_inverse=True)
+        return unique_docs, np.bincount(inverse, weights=impacts)
+
+
+# index ที่สร้างจาก index ของ dataset ก่อนหน้า (patch_index) หายไปพร้อม dataset
+_patched = weakref.WeakKeyDictionary()
+
+
+@lru_cache(maxsize=4)
+def build_index(dataset):
+    return BM25Index(dataset)
+
+
+def get_index(dataset):
+    """index ของ dataset (สร้างครั้งเดียวต่อ dataset)"""
+    index = _patched.get(dataset)
+    return index if index is not None else build_index(dataset)
+
+
+def patch_index(previous, dataset, changed_rows):
+    """สร้าง index ของ dataset ใหม่จาก index ของ previous (ตัดคำใหม่เฉพาะแถวที่เปลี่ยน)"""
+    index = get_index(previous).patched(dataset, changed_rows)
+    _patched[dataset] = index
+    return index
+
+
+def rank(user_input, dataset, context=None):
+    """เรียงแถวตามคะแนน BM25F (normalize แล้ว) คืนค่า (แถว, คะแนน) จากมากไปน้อย"""
+    index = get_index(dataset)
+    terms = list(dict.fromkeys(tokenize(user_input)))
+    docs, scores = index.search(terms)
+    if not len(docs):
+        return docs, scores
+
+    scores = scores / index.max_score(terms)
+    if context:
+        scores = scores + (index.category_codes[docs] == dataset.category_code(context.get('last_category'))) * CONTEXT_BONUS
+        scores = scores + (index.subcategory_codes[docs] == dataset.subcategory_code(context.get('last_subcategory'))) * CONTEXT_BONUS
+
+    # คะแนนเท่ากันให้แถวที่อยู่ก่อนชนะ
+    order = np.lexsort((docs, -scores))
+    return docs[order], scores[order]
+
+
+def best_match(user_input, dataset, context, threshold=MIN_SCORE):
+    """ค้นหาด้วย BM25F คืนค่า (row_id หรือ None, คะแนนสูงสุด) คะแนนเป็น None เมื่อตรงทุกตัวอักษร"""
+    if dataset.empty:
+        return None, 0.0
+
+    user_lower, _ = normalize_query(user_input)
+    exact = get_index(dataset).exact
+    if user_lower in exact:
+        return exact[user_lower], None
+
+    docs, scores = rank(user_lower, dataset, context)
+    if not len(docs):
+        return None, 0.0
+    if scores[0] >= threshold:
+        return int(docs[0]), float(scores[0])
+    return None, float(scores[0])
+
+
+def find_best_match(user_input, dataset, context, threshold=MIN_SCORE):
+    """ค้นหาคำถามที่ตรงที่สุดด้วย BM25F คืนค่าลำดับแถว (row_id) หรือ None"""
+    return best_match(user_input, dataset, context, threshold)[0]
@@ -0,0 +1,204 @@
+# consolidate.py
+# รวมคำถามที่ซ้ำกัน (near-duplicate) ใน dataset เป็นแถวเดียวตอนโหลดข้อมูล
+#
+# แถวที่ถามเรื่องเดียวกันด้วยคำต่างกัน (เช่น "Embedded System คืออะไร" กับ
+# "embedded system หมายถึงอะไร") รวมเป็นแถวเดียว คำถามอื่นเก็บเป็น alias ในคอลัมน์
+# คำถามที่คล้ายกัน ซึ่ง scorer ยังให้คะแนนทุกข้อ (ใช้คะแนนของคำถามที่ตรงที่สุด)
+# ingest.load_sources เรียกใช้ทุกครั้งที่โหลด ไฟล์ Excel ต้นฉบับไม่ถูกแก้ไข
+#
+# วิธีใช้:
+#   python consolidate.py dataset.xlsx                  # ดูว่าแถวไหนจะถูกรวมกัน
+#   python consolidate.py dataset.xlsx --output out.xlsx
+#   EMBEDBOT_CONSOLIDATE=0 streamlit run app.py         # ปิดการรวมตอนโหลด
+import argparse
+import os
+import re
+
+import pandas as pd
+
+from ingest import ALIAS_COLUMN, ALIAS_SEPARATOR, QUESTION_TYPE_COLUMN
+
+CONSOLIDATE_ENV = "EMBEDBOT_CONSOLIDATE"
+
+# คำ/วลีรูปแบบคำถามที่ตัดออกก่อนเปรียบเทียบ (เรียงจากยาวไปสั้น)
+QUESTION_TEMPLATE_WORDS = (
+    'หมายถึงอะไร', 'คืออะไร', 'ความหมายของ', 'นิยามของ', 'หมายถึง',
+    'ใช้ทำอะไร', 'ได้อย่างไร', 'อย่างไร', 'ยังไง', 'อะไร', 'คือ', '?'
+)
+
+# แถวที่จะรวมกันได้ต้องอยู่ใน block เดียวกัน (ไม่ต้องเทียบทุกคู่ทั้ง dataset)
+BLOCK_COLUMNS = ["หมวดหมู่", "หัวข้อย่อย", QUESTION_TYPE_COLUMN]
+
+
+def question_key(question):
+    """ตัดรูปแบบคำถามออก เหลือเฉพาะเนื้อหา เช่น "Embedded System คืออะไร" -> "embedded system" """
+    key = re.sub(r'\s+', ' ', str(question).lower())
+    for word in QUESTION_TEMPLATE_WORDS:
+        key = key.replace(word, ' ')
+    return re.sub(r'\s+', ' ', key).strip()
+
+
+def english_terms(question):
+    """คำภาษาอังกฤษ/ตัวเลขในคำถาม (ใช้กันการรวม Anode กับ Cathode, พอร์ต B กับ D)"""
+    return frozenset(re.findall(r'[a-z0-9_]+', str(question).lower()))
+
+
+def char_ngrams(text, n=3):
+    """ชุด character n-gram ของข้อความ"""
+    text = f" {text} "
+    return {text[i:i + n] for i in range(max(1, len(text) - n + 1))}
+
+
+def synonym_set(text):
+    """แยกคำพ้องเป็นชุดคำ"""
+    return {word.strip().lower() for word in str(text).split(',') if word.strip()}
+
+
+def find_duplicate_pairs(df, threshold=0.8):
+    """หาคู่แถวที่เป็นคำถามซ้ำกัน
+
+    - แบ่ง block ตาม BLOCK_COLUMNS แล้วหาคู่ผ่าน inverted index ของ n-gram
+      (นับ n-gram ที่ใช้ร่วมกันโดยไม่เทียบทุกคู่)
+    - ซ้ำกันเมื่อ Jaccard ของ n-gram >= threshold หรือเนื้อหาคำถามของแถวหนึ่ง
+      อยู่ในคำพ้องของอีกแถว
+    - ถ้าทั้งสองคำถามมีคำภาษาอังกฤษแต่ไม่ตรงกัน จะไม่นับว่าซ้ำ
+    """
+    block_columns = [col for col in BLOCK_COLUMNS if col in df.columns]
+    has_synonyms = 'คำพ้อง' in df.columns
+    pairs = []
+
+    for _, block in df.groupby(block_columns, sort=False) if block_columns else [(None, df)]:
+        positions = list(block.index)
+        if len(positions) < 2:
+            continue
+
+        keys = {pos: question_key(df.at[pos, 'คำถาม']) for pos in positions}
+        grams = {pos: char_ngrams(keys[pos]) for pos in positions}
+        terms = {pos: english_terms(df.at[pos, 'คำถาม']) for pos in positions}
+        synonyms = {pos: synonym_set(df.at[pos, 'คำพ้อง']) if has_synonyms else set() for pos in positions}
+
+        # inverted index: n-gram -> แถว, นับ n-gram ที่ใช้ร่วมกันของแต่ละคู่
+        postings = {}
+        shared = {}
+        for pos in positions:
+            for gram in grams[pos]:
+                for other in postings.get(gram, ()):
+                    shared[(other, pos)] = shared.get((other, pos), 0) + 1
+                postings.setdefault(gram, []).append(pos)
+
+        # คู่ที่เนื้อหาคำถามอยู่ในคำพ้องของอีกแถว
+        synonym_index = {}
+        for pos in positions:
+            for word in synonyms[pos]:
+                synonym_index.setdefault(word, []).append(pos)
+        for pos in positions:
+            for other in synonym_index.get(keys[pos], ()):
+                if other != pos:
+                    pair = (min(pos, other), max(pos, other))
+                    shared.setdefault(pair, 0)
+
+        for (a, b), common in shared.items():
+            if terms[a] and terms[b] and terms[a] != terms[b]:
+                continue
+            union = len(grams[a]) + len(grams[b]) - common
+            jaccard = common / union if union else 0
+            synonym_hit = bool(keys[a]) and keys[a] in synonyms[b] or bool(keys[b]) and keys[b] in synonyms[a]
+            if jaccard >= threshold or synonym_hit:
+                pairs.append((a, b))
+
+    return pairs
+
+
+def consolidate_near_duplicates(df, threshold=0.8):
+    """รวมคำถามที่ซ้ำกันเป็นแถวเดียว เก็บคำถามอื่นไว้ในคอลัมน์ ALIAS_COLUMN
+
+    แถวหลักของแต่ละกลุ่มคือแถวที่คำตอบยาวที่สุด คำพ้องของทุกแถวในกลุ่มรวมกัน
+    กลุ่มอยู่ที่ตำแหน่งของแถวแรกในกลุ่ม แถวที่ไม่ซ้ำกับแถวใดไม่ถูกแตะ
+    """
+    df = df.reset_index(drop=True)
+    if ALIAS_COLUMN not in df.columns:
+        df[ALIAS_COLUMN] = ''
+
+    # union-find รวมคู่ที่ซ้ำกันเป็นกลุ่ม (เฉพาะแถวที่มีคู่)
+    parent = {}
+
+    def find(pos):
+        parent.setdefault(pos, pos)
+        while parent[pos] != pos:
+            parent[pos] = parent[parent[pos]]
+            pos = parent[pos]
+        return pos
+
+    for a, b in find_duplicate_pairs(df, threshold):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    if not parent:
+        return df
+
+    clusters = {}
+    for pos in sorted(parent):
+        clusters.setdefault(find(pos), []).append(pos)
+
+    df = df.copy()
+    dropped = []
+    for first, members in clusters.items():
+        canonical = max(members, key=lambda pos: (len(str(df.at[pos, 'คำตอบ'])), -pos))
+        row = df.loc[canonical].copy()
+
+        aliases = [str(df.at[pos, 'คำถาม']) for pos in members if pos != canonical]
+        existing = [a for a in str(row[ALIAS_COLUMN]).split(ALIAS_SEPARATOR) if a]
+        row[ALIAS_COLUMN] = ALIAS_SEPARATOR.join(dict.fromkeys(existing + aliases))
+
+        if 'คำพ้อง' in df.columns:
+            words = []
+            for pos in members:
+                words.extend(w.strip() for w in str(df.at[pos, 'คำพ้อง']).split(',') if w.strip())
+            row['คำพ้อง'] = ", ".join(dict.fromkeys(words))
+
+        if 'รูปภาพ' in df.columns and not row['รูปภาพ']:
+            images = [df.at[pos, 'รูปภาพ'] for pos in members if df.at[pos, 'รูปภาพ']]
+            row['รูปภาพ'] = images[0] if images else ''
+
+        df.loc[first] = row
+        dropped.extend(pos for pos in members if pos != first)
+
+    return df.drop(index=dropped).reset_index(drop=True)
+
+
+def consolidate_excel(input_path, output_path=None, threshold=0.8):
+    """รวมคำถามที่ซ้ำกันในไฟล์ Excel ที่มีอยู่แล้ว
+
+    ไม่เขียนทับไฟล์ต้นฉบับ ถ้าไม่ระบุ output_path จะบันทึกเป็น <ชื่อไฟล์>_consolidated.xlsx
+    """
+    df = pd.read_excel(input_path).fillna('')
+    consolidated = consolidate_near_duplicates(df, threshold)
+    output_path = output_path or os.path.splitext(input_path)[0] + "_consolidated.xlsx"
+    consolidated.to_excel(output_path, index=False)
+    print(f"🔗 รวมคำถามที่ซ้ำกัน: {len(df)} -> {len(consolidated)} แถว")
+    print(f"✅ บันทึกไฟล์ '{output_path}' สำเร็จ!")
+    return consolidated
+
+
+def consolidate_enabled():
+    return os.environ.get(CONSOLIDATE_ENV, "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="แสดง/บันทึกผลการรวมคำถามที่ซ้ำกันในไฟล์ Excel")
+    parser.add_argument("path")
+    parser.add_argument("--output", help="บันทึกผลเป็นไฟล์ใหม่ (ไม่เขียนทับต้นฉบับ)")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    args = parser.parse_args()
+
+    df = pd.read_excel(args.path).fillna('')
+    for a, b in find_duplicate_pairs(df, args.threshold):
+        print(f"🔗 {df.at[a, 'คำถาม']}  ⟷  {df.at[b, 'คำถาม']}")
+    if args.output:
+        consolidate_excel(args.path, args.output, args.threshold)
+    else:
+        print(f"📊 {len(df)} -> {len(consolidate_near_duplicates(df, args.threshold))} แถว")
+
+
+if __name__ == "__main__":
+    main()
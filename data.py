@@ -327,7 +327,6 @@ def create_comprehensive_dataset():
         "สลับการแสดงผล, switching display, multiplex",
         "ขาcommon, common pins, digit select",
         "timer interrupt, timer, interrupt, การขัดจังหวะ",
-        "ปัญหา, problems, issues, faults",
         "ไม่ติด, not working, no display, dead",
         "แสดงผลไม่ถูกต้อง, wrong display, incorrect, error",
         "สว่างไม่เท่ากัน, uneven brightness, dim, bright",
@@ -477,7 +476,6 @@ def create_comprehensive_dataset():
         "common anode, ca, anode type",
         "common cathode, cc, cathode type",
         "ไม่มีโมดูล, without module, discrete",
-        "โมดูลและอุปกรณ์, modules and devices",
         "ส่วนประกอบ, components, parts, elements",
         "ค่าตัวต้านทาน, resistor values, resistance values",
         "การเลือกโมดูล, module selection, choosing module",
@@ -580,13 +578,11 @@ def create_comprehensive_dataset():
         "ต่างกัน, different, compare, comparison",
         "output use, output purpose, output application",
         "input use, input purpose, input application",
-        "ใช้งานจริง, practical use, real application",
         "led setup, configure led, led pin",
         "ปุ่มกด, button, switch, push button",
         "เซ็นเซอร์, sensor, detector",
         "มอเตอร์, motor, dc motor, stepper motor",
         "การสื่อสาร, communication, serial, uart",
-        "รีจิสเตอร์, register, ddr, port, pin",
         "ddrx, ddrb, ddrd, data direction",
         "portx, portb, portd, output register",
         "pinx, pinb, pind, input register",
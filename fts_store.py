@@ -0,0 +1,489 @@
+# fts_store.py
+# เก็บ dataset ในฐานข้อมูล SQLite พร้อม full-text index (FTS5) แล้วค้นหาจากฐานข้อมูล
+#
+# ตอนโหลด dataset นำเข้าทุกแถวลงไฟล์ SQLite ครั้งเดียวต่อเวอร์ชัน (process อื่นเปิดไฟล์เดิมได้)
+# ตอนค้นหา FTS5 คัดแถวที่เกี่ยวข้องด้วย bm25 ของ คำถาม / คำพ้อง / คำตอบ ไม่เกิน
+# CANDIDATES แถว แล้วให้คะแนนแบบเดิมของ matcher (partial / keyword / similarity /
+# บริบท) เฉพาะแถวเหล่านั้น ไม่ต้องถือ index ของทุกแถวไว้ในหน่วยความจำ
+#
+# เมื่อ EMBEDBOT_SCORER=fts app.py โหลด dataset ผ่าน load_or_build: แถวทั้งหมดอยู่ในไฟล์
+# SQLite เท่านั้น (SqliteRecords อ่านทีละแถวตาม row_id ตอนตอบ) process อื่นที่เปิดไฟล์
+# ของไฟล์ต้นทางชุดเดิมไม่ต้อง parse Excel และไม่ต้องถือคำตอบทุกแถวไว้
+#
+# ใช้ tokenizer แบบ trigram ของ SQLite (3.34 ขึ้นไป) ซึ่งค้นภาษาไทยได้โดยไม่ต้องตัดคำ
+# ถ้าไม่มีจะตัดคำด้วย bm25.tokenize แล้วเก็บเป็นข้อความคั่นด้วยช่องว่างแทน
+#
+# วิธีใช้:
+#   EMBEDBOT_SCORER=fts EMBEDBOT_FTS_DIR=/var/lib/embedbot streamlit run app.py
+#   python fts_store.py --replicate 50 --queries 200     # เทียบผลและเวลากับ vector
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+from bm25 import tokenize
+from matcher import question_score
+from normalize import normalize_query, normalize_text, question_texts
+from qa_store import CompactDataset, QARecord
+from shared_store import fingerprint_key
+from spelling import word_counts
+
+FTS_DIR_ENV = "EMBEDBOT_FTS_DIR"
+
+# จำนวนแถวที่ FTS5 คัดมาให้ให้คะแนนละเอียด
+CANDIDATES = 50
+
+# จำนวนคำสูงสุดในคำค้น MATCH (คำถามยาวมาก ๆ ไม่ทำให้คำค้นใหญ่เกินไป)
+MAX_TERMS = 64
+
+# น้ำหนักคอลัมน์ของ bm25() ตามลำดับ question, synonyms, answer (เหมือน bm25.FIELDS)
+COLUMN_WEIGHTS = (3.0, 1.5, 0.3)
+
+# ตัวคั่นคำถามหลักกับคำถามอื่น (alias) ในคอลัมน์ rows.questions
+QUESTION_SEPARATOR = "\x1f"
+
+# เปลี่ยนเมื่อโครงสร้างตารางเปลี่ยน (ไฟล์ของเวอร์ชันเดิมจะไม่ถูกใช้ซ้ำ)
+SCHEMA_VERSION = 4
+
+# ไฟล์ฐานข้อมูลของ process นี้ที่สร้าง/ตรวจแล้ว
+_ready = set()
+_ready_lock = threading.Lock()
+_local = threading.local()
+
+
+@lru_cache(maxsize=1)
+def trigram_available():
+    """SQLite รุ่นนี้มี tokenizer แบบ trigram หรือไม่"""
+    try:
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE VIRTUAL TABLE t USING fts5(x, tokenize='trigram')")
+        connection.close()
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def get_fts_dir():
+    return os.environ.get(FTS_DIR_ENV) or tempfile.gettempdir()
+
+
+def database_path(dataset):
+    return version_path(dataset.version)
+
+
+def version_path(version):
+    return os.path.join(get_fts_dir(), f"embedbot_fts_{version}_s{SCHEMA_VERSION}.sqlite")
+
+
+def source_path(fingerprint):
+    """ไฟล์ที่บอกว่าไฟล์ต้นทางชุดนี้ (fingerprint) นำเข้าเป็น dataset version ใด"""
+    return os.path.join(get_fts_dir(), f"embedbot_fts_source_{fingerprint_key(fingerprint)}_s{SCHEMA_VERSION}")
+
+
+def fts_text(text):
+    """ข้อความที่เก็บใน FTS5 (trigram เก็บตามเดิม ไม่มี trigram เก็บเป็นคำที่ตัดแล้ว)"""
+    if trigram_available():
+        return normalize_text(text)
+    return " ".join(tokenize(text))
+
+
+def row_values(record, questions):
+    """ค่าของแถวในตาราง rows"""
+    return (
+        record.row_id, record.category_code, record.subcategory_code, QUESTION_SEPARATOR.join(questions),
+        record.question, record.answer, record.synonyms, record.image_url, QUESTION_SEPARATOR.join(record.aliases),
+    )
+
+
+def meta_values(dataset, messages=None):
+    """ค่าในตาราง meta: version จำนวนแถว และข้อมูลของ CompactDataset ที่ไม่ต้องอ่านทุกแถวซ้ำ"""
+    values = [
+        ("version", dataset.version),
+        ("rows", str(len(dataset))),
+        ("categories", json.dumps(list(dataset.categories), ensure_ascii=False)),
+        ("subcategories", json.dumps(list(dataset.subcategories), ensure_ascii=False)),
+        ("quick_questions", json.dumps(dataset.quick_questions, ensure_ascii=False)),
+        ("stats", json.dumps(dataset.stats)),
+        ("spelling_counts", json.dumps(
+            dataset.spelling_counts if dataset.spelling_counts is not None else word_counts(dataset),
+            ensure_ascii=False,
+        )),
+    ]
+    if messages is not None:
+        values.append(messages_value(messages))
+    return values
+
+
+def messages_value(messages):
+    return "messages", json.dumps([list(m) for m in messages], ensure_ascii=False)
+
+
+def build_database(dataset, path, messages=()):
+    """นำเข้า dataset ลงไฟล์ SQLite (เขียนไฟล์ชั่วคราวแล้วเปลี่ยนชื่อ ผู้อ่านไม่เห็นไฟล์ครึ่ง ๆ)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    tokenizer = "trigram" if trigram_available() else "unicode61"
+    connection = sqlite3.connect(temp_path)
+    try:
+        connection.executescript(f"""
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE rows (
+                row_id INTEGER PRIMARY KEY,
+                category_code INTEGER,
+                subcategory_code INTEGER,
+                questions TEXT,
+                question TEXT,
+                answer TEXT,
+                synonyms TEXT,
+                image_url TEXT,
+                aliases TEXT
+            );
+            CREATE TABLE exact (text TEXT PRIMARY KEY, row_id INTEGER) WITHOUT ROWID;
+            CREATE VIRTUAL TABLE qa_fts USING fts5(question, synonyms, answer, tokenize='{tokenizer}');
+        """)
+        texts = question_texts(dataset)
+        connection.executemany(
+            "INSERT INTO rows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (row_values(r, q) for r, q in zip(dataset.records, texts)),
+        )
+        # exact match: ข้อความคำถาม (รวม alias) -> แถวแรกที่มีข้อความนี้
+        connection.executemany(
+            "INSERT OR IGNORE INTO exact VALUES (?, ?)",
+            ((text, r.row_id) for r, q in zip(dataset.records, texts) for text in q),
+        )
+        connection.executemany(
+            "INSERT INTO qa_fts (rowid, question, synonyms, answer) VALUES (?, ?, ?, ?)",
+            ((r.row_id, fts_text(" ".join((r.question,) + r.aliases)), fts_text(r.synonyms), fts_text(r.answer))
+             for r in dataset.records),
+        )
+        connection.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [("tokenizer", tokenizer)] + meta_values(dataset, messages),
+        )
+        connection.commit()
+        connection.execute("INSERT INTO qa_fts (qa_fts) VALUES ('optimize')")
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(temp_path, path)
+
+
+def patch_database(previous_path, dataset, path, changed_rows):
+    """สร้างไฟล์ของ dataset ใหม่จากไฟล์ของเวอร์ชันก่อน: คัดลอกแล้วเขียนใหม่เฉพาะแถวที่เปลี่ยน
+
+    row_id ของแถวที่ไม่เปลี่ยนต้องเป็นแถวเดิม ตาราง exact สร้างใหม่ทั้งตาราง (ไม่ต้องตัดคำ)
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    source = sqlite3.connect(f"file:{previous_path}?mode=ro", uri=True)
+    connection = sqlite3.connect(temp_path)
+    try:
+        source.backup(connection)
+        changed = sorted(row for row in set(changed_rows) if row < len(dataset))
+        texts = question_texts(dataset)
+        connection.execute("DELETE FROM rows WHERE row_id >= ?", (len(dataset),))
+        connection.execute("DELETE FROM qa_fts WHERE rowid >= ?", (len(dataset),))
+        connection.executemany("DELETE FROM qa_fts WHERE rowid = ?", ((row,) for row in changed))
+        records = [dataset.records[row] for row in changed]
+        connection.executemany(
+            "INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (row_values(r, texts[r.row_id]) for r in records),
+        )
+        connection.executemany(
+            "INSERT INTO qa_fts (rowid, question, synonyms, answer) VALUES (?, ?, ?, ?)",
+            ((r.row_id, fts_text(" ".join((r.question,) + r.aliases)), fts_text(r.synonyms), fts_text(r.answer))
+             for r in records),
+        )
+        connection.execute("DELETE FROM exact")
+        connection.executemany(
+            "INSERT OR IGNORE INTO exact VALUES (?, ?)",
+            ((text, row) for row, questions in enumerate(texts) for text in questions),
+        )
+        connection.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", meta_values(dataset))
+        connection.commit()
+    finally:
+        connection.close()
+        source.close()
+    os.replace(temp_path, path)
+
+
+def database_version(path):
+    try:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            row = connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        finally:
+            connection.close()
+        return row[0] if row else None
+    except sqlite3.Error:
+        return None
+
+
+def prepare(dataset):
+    """สร้างไฟล์ฐานข้อมูลของ dataset ถ้ายังไม่มี (ไฟล์ที่ process อื่นสร้างไว้แล้วใช้ได้เลย)"""
+    path = database_path(dataset)
+    with _ready_lock:
+        if path in _ready:
+            return path
+        if database_version(path) != dataset.version:
+            build_database(dataset, path)
+        _ready.add(path)
+    return path
+
+
+def patch(previous, dataset, changed_rows):
+    """เตรียมไฟล์ของ dataset ใหม่จากไฟล์ของ previous (ถ้าไม่มีไฟล์เดิมจะสร้างใหม่ทั้งชุด)"""
+    path = database_path(dataset)
+    previous_path = database_path(previous)
+    with _ready_lock:
+        if path in _ready:
+            return path
+        if database_version(path) != dataset.version:
+            if database_version(previous_path) == previous.version:
+                patch_database(previous_path, dataset, path, changed_rows)
+            else:
+                build_database(dataset, path)
+        _ready.add(path)
+    return path
+
+
+def get_connection(dataset):
+    """connection แบบอ่านอย่างเดียวของ thread นี้ (sqlite3 ใช้ข้าม thread ไม่ได้)"""
+    return open_connection(prepare(dataset))
+
+
+def open_connection(path):
+    """connection แบบอ่านอย่างเดียวของไฟล์ path สำหรับ thread นี้"""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    connection = connections.get(path)
+    if connection is None:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        connections[path] = connection
+    return connection
+
+
+class SqliteRecords:
+    """records ของ dataset ที่อ่านจากตาราง rows ทีละแถวตาม row_id (ไม่ถือทุกแถวไว้ในหน่วยความจำ)"""
+
+    def __init__(self, path, rows):
+        self.path = path
+        self.rows = rows
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row_id):
+        if row_id < 0:
+            row_id += self.rows
+        row = open_connection(self.path).execute(
+            f"SELECT {RECORD_SELECT} FROM rows WHERE row_id = ?", (row_id,)
+        ).fetchone()
+        if row is None:
+            raise IndexError(row_id)
+        return make_record(row)
+
+    def __iter__(self):
+        # connection แยกของการวนอ่าน (ไม่ชนกับการอ่านทีละแถวใน thread เดียวกัน)
+        connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            for row in connection.execute(f"SELECT {RECORD_SELECT} FROM rows ORDER BY row_id"):
+                yield make_record(row)
+        finally:
+            connection.close()
+
+
+RECORD_SELECT = "row_id, category_code, subcategory_code, question, answer, synonyms, image_url, aliases"
+
+
+def make_record(row):
+    row_id, category_code, subcategory_code, question, answer, synonyms, image_url, aliases = row
+    return QARecord(
+        row_id, category_code, subcategory_code, question, answer, synonyms, image_url,
+        tuple(aliases.split(QUESTION_SEPARATOR)) if aliases else (),
+    )
+
+
+def attach(path):
+    """เปิด dataset จากไฟล์ฐานข้อมูล คืนค่า (CompactDataset ที่ records อยู่ใน SQLite, messages)"""
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        meta = dict(connection.execute("SELECT key, value FROM meta"))
+    finally:
+        connection.close()
+    dataset = CompactDataset(
+        SqliteRecords(path, int(meta["rows"])),
+        tuple(json.loads(meta["categories"])),
+        tuple(json.loads(meta["subcategories"])),
+        version=meta["version"],
+        quick_questions=json.loads(meta["quick_questions"]),
+        stats=json.loads(meta["stats"]),
+    )
+    dataset.spelling_counts = Counter(json.loads(meta["spelling_counts"]))
+    with _ready_lock:
+        _ready.add(path)
+    messages = [tuple(m) for m in json.loads(meta.get("messages", "[]"))]
+    return dataset, messages
+
+
+def load_or_build(fingerprint, build):
+    """dataset ของไฟล์ต้นทางชุดนี้จากไฟล์ฐานข้อมูล (นำเข้าด้วย build() ถ้ายังไม่มี)
+
+    build() คืนค่า (CompactDataset, messages) dataset ที่สร้างถูกทิ้งหลังเขียนลงไฟล์
+    """
+    try:
+        with open(source_path(fingerprint), encoding="utf-8") as f:
+            version = f.read().strip()
+        path = version_path(version)
+        if database_version(path) == version:
+            return attach(path)
+    except (OSError, KeyError, ValueError, sqlite3.Error):
+        pass
+
+    dataset, messages = build()
+    if dataset.empty:
+        return dataset, messages
+    path = database_path(dataset)
+    if database_version(path) != dataset.version:
+        build_database(dataset, path, messages)
+    else:
+        # ไฟล์ที่ prepare() สร้างไว้ก่อนยังไม่มีข้อความผลการโหลด
+        connection = sqlite3.connect(path)
+        try:
+            connection.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", messages_value(messages))
+            connection.commit()
+        finally:
+            connection.close()
+    pointer = f"{source_path(fingerprint)}.{os.getpid()}.tmp"
+    with open(pointer, "w", encoding="utf-8") as f:
+        f.write(dataset.version)
+    os.replace(pointer, source_path(fingerprint))
+    del dataset
+    return attach(path)
+
+
+def match_expression(user_lower):
+    """คำค้น MATCH ของ FTS5: คำ (หรือ trigram) ของคำถามต่อกันด้วย OR"""
+    terms = tokenize(user_lower)
+    if trigram_available():
+        terms = [t for t in terms if len(t) >= 3]
+    terms = list(dict.fromkeys(terms))[:MAX_TERMS]
+    return " OR ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def candidates(connection, user_lower, limit=CANDIDATES):
+    """แถวที่ FTS5 คัดมา [(row_id, category_code, subcategory_code, คำถามทุกข้อของแถว)] เรียงตาม bm25"""
+    expression = match_expression(user_lower)
+    if not expression:
+        return []
+    weights = ", ".join(str(w) for w in COLUMN_WEIGHTS)
+    return connection.execute(
+        f"""SELECT rows.row_id, rows.category_code, rows.subcategory_code, rows.questions
+            FROM qa_fts JOIN rows ON rows.row_id = qa_fts.rowid
+            WHERE qa_fts MATCH ? ORDER BY bm25(qa_fts, {weights}) LIMIT ?""",
+        (expression, limit),
+    ).fetchall()
+
+
+def best_match(user_input, dataset, context, threshold=0.3):
+    """ค้นหาด้วย FTS5 แล้วให้คะแนนแบบ matcher เฉพาะแถวที่คัดมา
+
+    คืนค่า (row_id หรือ None, คะแนนสูงสุด) คะแนนเป็น None เมื่อตรงทุกตัวอักษร
+    """
+    if dataset.empty:
+        return None, 0
+
+    connection = get_connection(dataset)
+    user_lower, user_words = normalize_query(user_input)
+
+    # 1. Exact match
+    row = connection.execute("SELECT row_id FROM exact WHERE text = ?", (user_lower,)).fetchone()
+    if row is not None:
+        return row[0], None
+
+    if len(user_words) <= 3:
+        threshold = 0.2
+
+    last_category = last_subcategory = -1
+    if context:
+        last_category = dataset.category_code(context.get('last_category'))
+        last_subcategory = dataset.subcategory_code(context.get('last_subcategory'))
+
+    # 2-5. คะแนนแบบเดิมของแถวที่คัดมา (คะแนนเท่ากันให้แถวที่อยู่ก่อนชนะ เหมือน matcher)
+    best_match_idx = None
+    best_score = 0
+    for row_id, category_code, subcategory_code, questions in sorted(candidates(connection, user_lower)):
+        context_bonus = (category_code == last_category) * 0.1 + (subcategory_code == last_subcategory) * 0.1
+        # แถวที่มีคำถามอื่น (alias) ใช้คะแนนของคำถามที่ตรงที่สุด
+        for question in questions.split(QUESTION_SEPARATOR):
+            total_score = question_score(user_lower, user_words, question, context_bonus, best_score)
+            if total_score is not None and total_score > best_score:
+                best_score = total_score
+                best_match_idx = row_id
+
+    if best_score >= threshold:
+        return best_match_idx, best_score
+    return None, best_score
+
+
+def find_best_match(user_input, dataset, context, threshold=0.3):
+    """ค้นหาคำถามที่ตรงที่สุด คืนค่าลำดับแถว (row_id) หรือ None"""
+    return best_match(user_input, dataset, context, threshold)[0]
+
+
+def main():
+    from ingest import get_dataset_sources, load_sources
+    from qa_store import build_compact_dataset
+    from sharded import replicate_dataset
+    import vector_matcher
+
+    parser = argparse.ArgumentParser(description="นำเข้า dataset ลง SQLite FTS5 แล้วเทียบผลและเวลากับ vector")
+    parser.add_argument("--replicate", type=int, default=1, help="ขยาย dataset กี่เท่า")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    df, _ = load_sources(get_dataset_sources())
+    dataset = build_compact_dataset(df)
+    if args.replicate > 1:
+        dataset = replicate_dataset(dataset, args.replicate)
+
+    start = time.perf_counter()
+    path = prepare(dataset)
+    print(f"🗄️ {len(dataset)} แถว -> {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB, "
+          f"tokenizer {'trigram' if trigram_available() else 'unicode61'}) "
+          f"ใน {time.perf_counter() - start:.2f} s")
+
+    rng = random.Random(args.seed)
+    base = [r.question for r in dataset.records[:200]]
+    queries = [" ".join(rng.sample(q.split(), len(q.split()))) for q in rng.choices(base, k=args.queries)]
+
+    start = time.perf_counter()
+    found = [find_best_match(q, dataset, {}) for q in queries]
+    fts_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+    vector_matcher.get_index(dataset)
+    start = time.perf_counter()
+    expected = [vector_matcher.find_best_match(q, dataset, {}) for q in queries]
+    vector_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+    same = sum(a == b for a, b in zip(found, expected))
+    print(f"• fts    {fts_ms:8.2f} ms/query")
+    print(f"• vector {vector_ms:8.2f} ms/query")
+    print(f"• ผลตรงกัน {same}/{len(queries)}")
+
+
+if __name__ == "__main__":
+    main()
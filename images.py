@@ -0,0 +1,340 @@
+# images.py
+# ดาวน์โหลดรูปภาพประกอบคำตอบและจำไว้ในหน่วยความจำ (ใช้ร่วมกันทุก session)
+#
+# display_image_from_url ใน app.py เรียกทุกครั้งที่ rerun ถ้าไม่จำไว้จะดาวน์โหลดใหม่ทุกครั้ง
+# อยู่นอก app.py เพราะ Streamlit รัน app.py ใหม่ทุกครั้งที่ rerun
+#
+# URL ที่โหลดไม่สำเร็จจำไว้ FAIL_TTL วินาที (ไม่รอ timeout ซ้ำทุก rerun)
+# host ที่ล้มเหลวติดกัน BREAKER_FAILURES ครั้งจะถูกตัด (circuit breaker) BREAKER_COOLDOWN วินาที
+# แล้วให้ลองใหม่ได้หนึ่งคำขอ ถ้าสำเร็จจึงเปิดใช้ตามเดิม
+# ตอนโหลด dataset ตรวจ URL รูปทุกแถวพร้อมกันใน thread เบื้องหลัง (ดูผลใน sidebar)
+#
+# วิธีใช้:
+#   EMBEDBOT_IMAGE_FAIL_TTL=300 EMBEDBOT_IMAGE_BREAKER_FAILURES=3 EMBEDBOT_IMAGE_BREAKER_COOLDOWN=60 streamlit run app.py
+#   python images.py          # ตรวจ URL รูปทุกแถวของ dataset
+import argparse
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from lazy_modules import get_requests
+
+IMAGE_CACHE_ENV = "EMBEDBOT_IMAGE_CACHE_MB"
+FAIL_TTL_ENV = "EMBEDBOT_IMAGE_FAIL_TTL"
+BREAKER_FAILURES_ENV = "EMBEDBOT_IMAGE_BREAKER_FAILURES"
+BREAKER_COOLDOWN_ENV = "EMBEDBOT_IMAGE_BREAKER_COOLDOWN"
+
+# ขนาดรวมสูงสุดของรูปที่จำไว้ (MB)
+DEFAULT_IMAGE_CACHE_MB = 64
+
+# เวลารอสูงสุดต่อการดาวน์โหลดหนึ่งครั้ง และเวลารอเชื่อมต่อ host (วินาที)
+FETCH_TIMEOUT = 10
+CONNECT_TIMEOUT = 3
+
+# จำ URL ที่โหลดไม่สำเร็จกี่วินาที
+DEFAULT_FAIL_TTL = 300
+
+# host ล้มเหลวติดกันกี่ครั้งจึงตัด และตัดนานกี่วินาที
+DEFAULT_BREAKER_FAILURES = 3
+DEFAULT_BREAKER_COOLDOWN = 60
+
+# การตรวจ URL ตอนโหลด dataset: จำนวนคำขอพร้อมกันและเวลารอต่อ URL
+CHECK_WORKERS = 8
+CHECK_TIMEOUT = 5
+
+
+class ImageUnavailable(Exception):
+    """URL นี้เพิ่งโหลดไม่สำเร็จ หรือ host ถูกตัดอยู่ (ไม่ได้ส่งคำขอจริง)"""
+
+
+class ImageCache:
+    """LRU ของไฟล์รูป url -> bytes จำกัดด้วยขนาดรวม"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        with self.lock:
+            content = self.items.get(url)
+            if content is not None:
+                self.items.move_to_end(url)
+            return content
+
+    def put(self, url, content):
+        if len(content) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.items.pop(url, None)
+            if old is not None:
+                self.size -= len(old)
+            self.items[url] = content
+            self.size += len(content)
+            while self.size > self.max_bytes:
+                _, dropped = self.items.popitem(last=False)
+                self.size -= len(dropped)
+
+    def __contains__(self, url):
+        with self.lock:
+            return url in self.items
+
+    def stats(self):
+        with self.lock:
+            return {"images": len(self.items), "bytes": self.size}
+
+
+class FailureCache:
+    """URL ที่โหลดไม่สำเร็จ url -> (เวลาหมดอายุ, ข้อความ error)"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        """ข้อความ error ของ url ถ้ายังไม่หมดอายุ (None ถ้าไม่มี)"""
+        with self.lock:
+            item = self.items.get(url)
+            if item is None:
+                return None
+            if item[0] <= time.monotonic():
+                del self.items[url]
+                return None
+            return item[1]
+
+    def put(self, url, error):
+        if not self.ttl:
+            return
+        with self.lock:
+            self.items[url] = (time.monotonic() + self.ttl, error)
+
+    def discard(self, url):
+        with self.lock:
+            self.items.pop(url, None)
+
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            return {"failed_urls": sum(1 for expires, _ in self.items.values() if expires > now)}
+
+
+class HostBreaker:
+    """circuit breaker ต่อ host
+
+    ล้มเหลวติดกัน max_failures ครั้ง -> ตัด cooldown วินาที -> ให้ลองได้หนึ่งคำขอ
+    """
+
+    def __init__(self, max_failures, cooldown):
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def allow(self, host):
+        """ส่งคำขอไป host นี้ได้หรือไม่ (หลังครบเวลาตัด ให้ผ่านคำขอเดียวเพื่อลองใหม่)"""
+        with self.lock:
+            state = self.hosts.get(host)
+            if state is None or state["failures"] < self.max_failures:
+                return True
+            if state["trial"] or time.monotonic() < state["opened_until"]:
+                return False
+            state["trial"] = True
+            return True
+
+    def success(self, host):
+        with self.lock:
+            self.hosts.pop(host, None)
+
+    def failure(self, host):
+        with self.lock:
+            state = self.hosts.setdefault(host, {"failures": 0, "opened_until": 0.0, "trial": False})
+            state["failures"] += 1
+            state["trial"] = False
+            if self.max_failures and state["failures"] >= self.max_failures:
+                state["opened_until"] = time.monotonic() + self.cooldown
+
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            return {"open_hosts": sorted(
+                host for host, state in self.hosts.items()
+                if self.max_failures and state["failures"] >= self.max_failures and state["opened_until"] > now
+            )}
+
+
+def env_number(name, default):
+    try:
+        return max(0, int(float(os.environ.get(name, default))))
+    except ValueError:
+        return default
+
+
+def get_cache_bytes():
+    try:
+        return max(0, int(float(os.environ.get(IMAGE_CACHE_ENV, DEFAULT_IMAGE_CACHE_MB)) * 1024 * 1024))
+    except ValueError:
+        return DEFAULT_IMAGE_CACHE_MB * 1024 * 1024
+
+
+image_cache = ImageCache(get_cache_bytes())
+failed_urls = FailureCache(env_number(FAIL_TTL_ENV, DEFAULT_FAIL_TTL))
+host_breaker = HostBreaker(
+    env_number(BREAKER_FAILURES_ENV, DEFAULT_BREAKER_FAILURES),
+    env_number(BREAKER_COOLDOWN_ENV, DEFAULT_BREAKER_COOLDOWN),
+)
+
+
+def host_of(url):
+    return urlparse(url).netloc.lower()
+
+
+def request_image(url, timeout, stream=False):
+    """ส่งคำขอ GET ผ่าน negative cache และ circuit breaker แล้วบันทึกผล
+
+    4xx เป็นปัญหาของ URL นั้น (จำเฉพาะ URL) ส่วนเชื่อมต่อไม่ได้ / timeout / 5xx
+    นับเป็นความล้มเหลวของ host
+    """
+    error = failed_urls.get(url)
+    if error is not None:
+        raise ImageUnavailable(error)
+    requests = get_requests()
+    host = host_of(url)
+    if not host_breaker.allow(host):
+        raise ImageUnavailable(f"host {host} ใช้งานไม่ได้ชั่วคราว")
+
+    try:
+        response = requests.get(url, timeout=(min(CONNECT_TIMEOUT, timeout), timeout), stream=stream)
+    except BaseException as e:
+        # บันทึกความล้มเหลวทุกกรณี (ไม่เช่นนั้นคำขอทดลองของ host ที่ถูกตัดจะค้างสถานะไว้)
+        host_breaker.failure(host)
+        if isinstance(e, requests.RequestException):
+            failed_urls.put(url, str(e))
+        raise
+
+    if response.status_code >= 500:
+        host_breaker.failure(host)
+    else:
+        host_breaker.success(host)
+    try:
+        response.raise_for_status()
+    except requests.HTTPError as e:
+        response.close()
+        failed_urls.put(url, str(e))
+        raise
+    failed_urls.discard(url)
+    return response
+
+
+def fetch_image(url, timeout=FETCH_TIMEOUT):
+    """ไฟล์รูปของ url (bytes) ดาวน์โหลดเมื่อยังไม่มีในแคช
+
+    ถ้าดาวน์โหลดไม่สำเร็จจะ raise exception ของ requests ให้ผู้เรียกจัดการ
+    URL ที่เพิ่งล้มเหลวหรือ host ที่ถูกตัดอยู่จะ raise ImageUnavailable ทันที
+    """
+    content = image_cache.get(url)
+    if content is not None:
+        return content
+
+    content = request_image(url, timeout).content
+    image_cache.put(url, content)
+    return content
+
+
+def check_image(url, timeout=CHECK_TIMEOUT):
+    """ข้อความ error ของ url หรือ None ถ้าใช้ได้ (ไม่ดาวน์โหลดเนื้อไฟล์)"""
+    if url in image_cache:
+        return None
+    if not url.startswith("http"):
+        return "URL ไม่ถูกต้อง"
+    try:
+        request_image(url, timeout, stream=True).close()
+    except Exception as e:
+        return str(e) or type(e).__name__
+    return None
+
+
+def validate_image_urls(urls, workers=CHECK_WORKERS, timeout=CHECK_TIMEOUT):
+    """ตรวจ URL หลายรายการพร้อมกัน คืนค่า {url: ข้อความ error} ของ URL ที่ใช้ไม่ได้"""
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(workers, len(urls)), thread_name_prefix="image-check") as executor:
+        errors = executor.map(lambda url: check_image(url, timeout), urls)
+        return {url: error for url, error in zip(urls, errors) if error is not None}
+
+
+def dataset_image_urls(dataset):
+    """{url: [row_id]} ของแถวที่มีรูป"""
+    urls = {}
+    for record in dataset.records:
+        if record.image_url and record.image_url != 'nan':
+            urls.setdefault(record.image_url, []).append(record.row_id)
+    return urls
+
+
+# ผลการตรวจ URL รูปต่อ dataset version
+_checks = {}
+_checks_lock = threading.Lock()
+
+
+def start_image_check(dataset):
+    """เริ่มตรวจ URL รูปของ dataset ใน thread เบื้องหลัง (ครั้งเดียวต่อเวอร์ชัน)
+
+    คืนค่า thread ที่เริ่ม หรือ None ถ้าตรวจไปแล้ว/ไม่มีรูป
+    """
+    urls = dataset_image_urls(dataset)
+    with _checks_lock:
+        if not urls or dataset.version in _checks:
+            return None
+        result = _checks[dataset.version] = {"done": False, "urls": len(urls), "broken": {}}
+
+    def run():
+        start = time.perf_counter()
+        errors = validate_image_urls(urls)
+        broken = {row: errors[url] for url, rows in urls.items() if url in errors for row in rows}
+        with _checks_lock:
+            result["broken"] = broken
+            result["done"] = True
+        print(f"🖼️ ตรวจรูป {len(urls)} URL: ใช้ไม่ได้ {len(errors)} URL ({len(broken)} แถว) "
+              f"ใน {time.perf_counter() - start:.2f} s")
+
+    thread = threading.Thread(target=run, name="image-check", daemon=True)
+    thread.start()
+    return thread
+
+
+def image_check_status(dataset):
+    """ผลการตรวจ URL รูปของ dataset {"done", "urls", "broken": {row_id: error}} หรือ None ถ้ายังไม่เริ่ม"""
+    with _checks_lock:
+        result = _checks.get(dataset.version)
+        return None if result is None else {**result, "broken": dict(result["broken"])}
+
+
+def main():
+    from ingest import get_dataset_sources, load_sources
+    from qa_store import build_compact_dataset
+
+    parser = argparse.ArgumentParser(description="ตรวจ URL รูปทุกแถวของ dataset พร้อมกัน")
+    parser.add_argument("--workers", type=int, default=CHECK_WORKERS)
+    parser.add_argument("--timeout", type=float, default=CHECK_TIMEOUT)
+    args = parser.parse_args()
+
+    df, _ = load_sources(get_dataset_sources())
+    dataset = build_compact_dataset(df)
+    urls = dataset_image_urls(dataset)
+
+    start = time.perf_counter()
+    errors = validate_image_urls(urls, args.workers, args.timeout)
+    print(f"🖼️ {len(urls)} URL ใน {time.perf_counter() - start:.2f} s | ใช้ไม่ได้ {len(errors)} URL")
+    for url, error in errors.items():
+        print(f"  • แถว {urls[url]} {url}\n    {error}")
+    print(f"host ที่ถูกตัด: {host_breaker.stats()['open_hosts']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+# ingest.py
+# โหลด dataset จากหลายไฟล์ / หลายชีต แบบขนาน แล้วรวมเป็นชุดเดียว
+import os
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pandas as pd
+
+# คอลัมน์ที่ต้องมีในทุกชีต
+REQUIRED_COLUMNS = ['หมวดหมู่', 'หัวข้อย่อย', 'คำถาม', 'คำตอบ', 'รูปภาพ']
+
+# คำถามอื่นที่ถูกรวมเข้าแถวเดียวกัน (สร้างโดย consolidate.consolidate_near_duplicates ตอนโหลด)
+ALIAS_COLUMN = 'คำถามที่คล้ายกัน'
+ALIAS_SEPARATOR = ' | '
+
+# ประเภทคำถาม (นิยาม, วิธีใช้ ...) ใช้แบ่งกลุ่มตอนรวมคำถามที่ซ้ำกัน
+QUESTION_TYPE_COLUMN = 'ประเภทคำถาม'
+
+# คอลัมน์ที่เก็บไว้ถ้ามีในชีต (ไม่บังคับ)
+OPTIONAL_COLUMNS = ['คำพ้อง', ALIAS_COLUMN, QUESTION_TYPE_COLUMN]
+
+# คอลัมน์บอกที่มาของแต่ละแถว (provenance)
+SOURCE_COLUMN = 'แหล่งข้อมูล'
+SHEET_COLUMN = 'ชีต'
+
+# ไฟล์เริ่มต้น (sheets=None คือชีตแรก, "*" คือทุกชีต หรือระบุเป็น list)
+DEFAULT_SOURCES = [
+    {"path": "dataset.xlsx", "sheets": None},
+]
+
+# ตัวแปรแวดล้อมสำหรับกำหนดไฟล์เอง เช่น
+# EMBEDBOT_DATASETS="dataset.xlsx;unit2.xlsx:Sheet1,Sheet2;unit3.xlsx:*"
+SOURCES_ENV = "EMBEDBOT_DATASETS"
+
+# โหมดการอ่านไฟล์: "stream" อ่านทีละแถวแบบ read-only (ประหยัดหน่วยความจำ)
+# หรือ "pandas" อ่านทั้งชีตด้วย pd.read_excel แบบเดิม
+INGEST_MODE_ENV = "EMBEDBOT_INGEST_MODE"
+DEFAULT_INGEST_MODE = "stream"
+
+
+def parse_sources_spec(spec):
+    """แปลงข้อความกำหนดไฟล์/ชีตเป็นรายการ source"""
+    sources = []
+    for item in spec.split(";"):
+        item = item.strip()
+        if not item:
+            continue
+        path, _, sheet_part = item.partition(":")
+        sheet_part = sheet_part.strip()
+        if not sheet_part:
+            sheets = None
+        elif sheet_part == "*":
+            sheets = "*"
+        else:
+            sheets = [s.strip() for s in sheet_part.split(",") if s.strip()]
+        sources.append({"path": path.strip(), "sheets": sheets})
+    return sources
+
+
+def get_dataset_sources():
+    """อ่านรายการไฟล์ dataset จาก environment (ถ้าไม่มีใช้ค่าเริ่มต้น)"""
+    spec = os.environ.get(SOURCES_ENV, "").strip()
+    if spec:
+        return parse_sources_spec(spec)
+    return [dict(source) for source in DEFAULT_SOURCES]
+
+
+def get_ingest_mode():
+    """อ่านโหมดการอ่านไฟล์จาก environment"""
+    mode = os.environ.get(INGEST_MODE_ENV, DEFAULT_INGEST_MODE).strip().lower()
+    return mode if mode in ("stream", "pandas") else DEFAULT_INGEST_MODE
+
+
+def resolve_path(file_path):
+    """ลองหาไฟล์จากหลายตำแหน่ง คืนค่า path ที่พบ หรือ None"""
+    possible_paths = [
+        file_path,
+        f"./{file_path}",
+        f"data/{file_path}",
+        os.path.join(os.getcwd(), file_path)
+    ]
+    for path in possible_paths:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def sources_fingerprint(sources):
+    """ข้อมูลระบุสถานะไฟล์ (path, ชีต, เวลาแก้ไข) ใช้เป็น key ของ cache"""
+    parts = []
+    for source in sources:
+        path = resolve_path(source["path"])
+        mtime = os.path.getmtime(path) if path else None
+        parts.append((source["path"], str(source.get("sheets")), mtime))
+    return tuple(parts)
+
+
+def clean_sheet(df):
+    """ตรวจสอบคอลัมน์และทำความสะอาดข้อมูลของชีตเดียว"""
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_cols:
+        return None, f"ขาดคอลัมน์: {missing_cols} (คอลัมน์ที่มี: {list(df.columns)})"
+
+    df = df[REQUIRED_COLUMNS + [col for col in OPTIONAL_COLUMNS if col in df.columns]].copy()
+    df = df.fillna('')
+    for col in OPTIONAL_COLUMNS:
+        if col not in df.columns:
+            df[col] = ''
+
+    # แปลงเป็น string ทั้งหมด
+    for col in df.columns:
+        df[col] = df[col].astype(str).str.strip()
+
+    df = df[df['คำถาม'] != '']
+    df = df[df['คำตอบ'] != '']
+    return df, None
+
+
+def clean_cell(value):
+    """แปลงค่าในเซลล์เป็น string ที่ตัดช่องว่างแล้ว และ intern ไว้ใช้ซ้ำ"""
+    if value is None:
+        return ''
+    text = str(value).strip()
+    if text == 'nan':
+        return ''
+    return sys.intern(text)
+
+
+def stream_sheet(worksheet):
+    """อ่านชีตทีละแถว (read-only) เก็บเฉพาะคอลัมน์ที่ใช้ แล้วสร้าง DataFrame
+
+    ไม่โหลดทั้งชีตเข้าหน่วยความจำ หน่วยความจำที่ใช้จึงขึ้นกับข้อมูลที่เก็บจริง
+    ไม่ใช่ขนาดไฟล์หรือการจัดรูปแบบเซลล์
+    """
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return None, "ชีตว่าง"
+
+    header = [str(h).strip() if h is not None else '' for h in header]
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in header]
+    if missing_cols:
+        found = [h for h in header if h]
+        return None, f"ขาดคอลัมน์: {missing_cols} (คอลัมน์ที่มี: {found})"
+
+    columns = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+    positions = [header.index(col) if col in header else None for col in columns]
+    question_pos = columns.index('คำถาม')
+    answer_pos = columns.index('คำตอบ')
+
+    data = {col: [] for col in columns}
+    for row in rows:
+        values = [
+            clean_cell(row[pos]) if pos is not None and pos < len(row) else ''
+            for pos in positions
+        ]
+        if not values[question_pos] or not values[answer_pos]:
+            continue
+        for col, value in zip(columns, values):
+            data[col].append(value)
+
+    return pd.DataFrame(data, columns=columns), None
+
+
+def parse_source_streaming(source):
+    """อ่านไฟล์ Excel หนึ่งไฟล์ด้วย openpyxl แบบ read-only ทีละแถว"""
+    import openpyxl
+
+    file_path = source["path"]
+    sheets = source.get("sheets")
+
+    excel_file = resolve_path(file_path)
+    if not excel_file:
+        return [{"path": file_path, "sheet": None, "df": None, "error": "ไม่พบไฟล์"}]
+
+    results = []
+    try:
+        book = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+    except Exception as e:
+        return [{"path": excel_file, "sheet": None, "df": None, "error": str(e)}]
+
+    try:
+        if sheets is None:
+            sheet_names = book.sheetnames[:1]
+        elif sheets == "*":
+            sheet_names = book.sheetnames
+        else:
+            sheet_names = list(sheets)
+
+        for sheet in sheet_names:
+            if sheet not in book.sheetnames:
+                results.append({"path": excel_file, "sheet": sheet, "df": None, "error": "ไม่พบชีต"})
+                continue
+            try:
+                df, error = stream_sheet(book[sheet])
+            except Exception as e:
+                df, error = None, str(e)
+            results.append({"path": excel_file, "sheet": sheet, "df": df, "error": error})
+    finally:
+        book.close()
+    return results
+
+
+def parse_source(source, mode=DEFAULT_INGEST_MODE):
+    """อ่านไฟล์ Excel หนึ่งไฟล์ (ทำงานใน worker process)
+
+    คืนค่า list ของผลลัพธ์รายชีต แต่ละรายการมี path, sheet, df และ error
+    """
+    if mode == "stream":
+        return parse_source_streaming(source)
+
+    file_path = source["path"]
+    sheets = source.get("sheets")
+
+    excel_file = resolve_path(file_path)
+    if not excel_file:
+        return [{"path": file_path, "sheet": None, "df": None, "error": "ไม่พบไฟล์"}]
+
+    results = []
+    try:
+        with pd.ExcelFile(excel_file) as book:
+            if sheets is None:
+                sheet_names = book.sheet_names[:1]
+            elif sheets == "*":
+                sheet_names = book.sheet_names
+            else:
+                sheet_names = list(sheets)
+
+            for sheet in sheet_names:
+                if sheet not in book.sheet_names:
+                    results.append({"path": excel_file, "sheet": sheet, "df": None, "error": "ไม่พบชีต"})
+                    continue
+                df, error = clean_sheet(book.parse(sheet))
+                results.append({"path": excel_file, "sheet": sheet, "df": df, "error": error})
+    except Exception as e:
+        results.append({"path": excel_file, "sheet": None, "df": None, "error": str(e)})
+    return results
+
+
+def split_source(source):
+    """แยก source เป็นงานละหนึ่งชีต ให้ชีตของไฟล์เดียวกันถูกอ่านขนานกันได้
+
+    อ่านเฉพาะรายชื่อชีต (ไม่อ่านข้อมูล) ไฟล์ที่ไม่พบหรือเปิดไม่ได้คืน source เดิม
+    ให้ parse_source รายงานข้อผิดพลาดตามปกติ
+    """
+    sheets = source.get("sheets")
+    if sheets is None:
+        # ชีตแรกชีตเดียว ไม่ต้องเปิดไฟล์ดูรายชื่อชีต
+        return [source]
+    if isinstance(sheets, (list, tuple)):
+        return [dict(source, sheets=[sheet]) for sheet in sheets] or [source]
+
+    excel_file = resolve_path(source["path"])
+    if not excel_file:
+        return [source]
+    try:
+        with pd.ExcelFile(excel_file) as book:
+            sheet_names = book.sheet_names
+    except Exception:
+        return [source]
+    return [dict(source, sheets=[sheet]) for sheet in sheet_names] or [source]
+
+
+def load_sources(sources, max_workers=None, mode=None, consolidate=None):
+    """อ่านทุก source แบบขนานด้วย process pool แล้วรวมเป็น DataFrame เดียว
+
+    คำถามที่ซ้ำกันถูกรวมเป็นแถวเดียว (คำถามอื่นเป็น alias) ถ้าไม่ได้ปิดด้วย
+    consolidate=False หรือ EMBEDBOT_CONSOLIDATE=0
+
+    คืนค่า (df, report) โดย report เป็น list ของผลลัพธ์รายชีต
+    (path, sheet, rows, error) สำหรับแสดงผลหรือ log
+    """
+    from consolidate import consolidate_enabled, consolidate_near_duplicates
+
+    empty_columns = REQUIRED_COLUMNS + OPTIONAL_COLUMNS + [SOURCE_COLUMN, SHEET_COLUMN]
+    if not sources:
+        return pd.DataFrame(columns=empty_columns), []
+
+    if mode is None:
+        mode = get_ingest_mode()
+    if consolidate is None:
+        consolidate = consolidate_enabled()
+    parse = partial(parse_source, mode=mode)
+
+    # งานละหนึ่งชีต (ชีตของไฟล์เดียวกันกระจายไปหลาย worker ได้)
+    tasks = [task for source in sources for task in split_source(source)]
+    if len(tasks) == 1:
+        # ชีตเดียวไม่คุ้มค่าเปิด process ใหม่
+        batches = [parse(tasks[0])]
+    else:
+        if max_workers is None:
+            max_workers = min(len(tasks), os.cpu_count() or 1)
+        # ใช้ spawn เพราะ Streamlit รันหลาย thread (fork ไม่ปลอดภัย)
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+            batches = list(executor.map(parse, tasks))
+
+    frames = []
+    report = []
+    for batch in batches:
+        for result in batch:
+            df = result["df"]
+            rows = 0
+            if df is not None:
+                df = df.copy()
+                df[SOURCE_COLUMN] = os.path.basename(result["path"])
+                df[SHEET_COLUMN] = str(result["sheet"])
+                rows = len(df)
+                if rows:
+                    frames.append(df)
+            report.append({
+                "path": result["path"],
+                "sheet": result["sheet"],
+                "rows": rows,
+                "error": result["error"]
+            })
+
+    if not frames:
+        return pd.DataFrame(columns=empty_columns), report
+
+    merged = pd.concat(frames, ignore_index=True)
+    if consolidate:
+        merged = consolidate_near_duplicates(merged)
+    return merged, report
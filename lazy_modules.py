@@ -0,0 +1,43 @@
+# lazy_modules.py
+# import โมดูลหนัก ๆ เมื่อใช้งานจริงเท่านั้น (ลดเวลาเริ่มแอปแบบ cold start)
+#
+# อยู่นอก app.py เพราะ Streamlit รัน app.py ใหม่ทุกครั้งที่ rerun
+# cache ในโมดูลนี้จึงอยู่ตลอดอายุ process
+import importlib
+import importlib.util
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def module_available(name):
+    """ตรวจว่าติดตั้งโมดูลไว้หรือไม่ โดยไม่ import จริง"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+@lru_cache(maxsize=None)
+def load_module(name):
+    """import โมดูลครั้งแรกที่เรียก (ครั้งต่อไปคืนจาก cache)"""
+    return importlib.import_module(name)
+
+
+def get_genai():
+    """google.generativeai"""
+    return load_module("google.generativeai")
+
+
+def get_ngrok():
+    """pyngrok.ngrok"""
+    return load_module("pyngrok.ngrok")
+
+
+def get_requests():
+    """requests"""
+    return load_module("requests")
+
+
+def get_pil_image():
+    """PIL.Image"""
+    return load_module("PIL.Image")
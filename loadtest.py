@@ -0,0 +1,303 @@
+# loadtest.py
+# จำลองผู้ใช้หลาย session พร้อมกัน (headless ผ่าน streamlit.testing AppTest)
+#
+# วิธีใช้:
+#   python loadtest.py --sessions 20 --turns 10
+#   python loadtest.py --ramp 5,10,20,40 --turns 5 --output bench_output.txt
+#
+# แต่ละ session คือ AppTest หนึ่งตัว (session_state แยกกัน แต่ cache_resource
+# ใช้ร่วมกันใน process เหมือน server จริง) ทุก session รันใน thread ของตัวเอง
+# บันทึกเวลา rerun แยกตามประเภทการกระทำ และหน่วยความจำต่อ session
+#
+# AppTest สลับ Runtime แบบ global ทุกครั้งที่ run จึงรันพร้อมกันใน process
+# เดียวไม่ได้ การ rerun ใน process เดียวกันจึงต่อคิวผ่าน lock (ใกล้เคียงกับ
+# server หนึ่ง process ที่ทุก session แย่ง GIL กัน) เวลาที่รายงานรวมเวลารอคิว
+# ด้วย (เวลาที่ผู้ใช้รอจริง) และแยก service time ไว้ให้ดูต่างหาก
+# ใช้ --processes เพื่อจำลอง server หลาย worker process
+import argparse
+import json
+import multiprocessing
+import os
+import pickle
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# สัดส่วนการกระทำของผู้ใช้จำลอง
+ACTION_WEIGHTS = {
+    "ask": 0.6,        # พิมพ์คำถาม
+    "quick": 0.25,     # กดปุ่มคำถามแนะนำ
+    "switch": 0.1,     # สลับไป session อื่น
+    "new": 0.05,       # สร้างการสนทนาใหม่
+}
+
+# AppTest.run ต้องรันทีละตัวต่อ process
+RUN_LOCK = threading.Lock()
+
+# คำถามเพิ่มเติมที่ไม่ตรงกับ dataset (ทดสอบกรณีหาไม่พบ)
+EXTRA_QUESTIONS = [
+    "arduino", "digitalwrite คือ อะไร", "pinMode", "led rgb ทำงาน อย่างไร",
+    "การบัดกรี", "สภาพอากาศวันนี้", "ทำไม Embedded System ถึงสำคัญ",
+]
+
+
+def read_rss_bytes():
+    """หน่วยความจำ resident ของ process (bytes)"""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def load_questions():
+    """คำถามจาก dataset สำหรับสุ่มพิมพ์"""
+    from ingest import get_dataset_sources, load_sources
+    df, _ = load_sources(get_dataset_sources())
+    questions = list(df['คำถาม']) if not df.empty else []
+    return questions + EXTRA_QUESTIONS
+
+
+def session_state_bytes(at):
+    """ขนาดของข้อมูลสนทนาใน session (pickle) ใช้ประมาณหน่วยความจำต่อ session"""
+    total = 0
+    for key in ("conversation_sessions", "current_messages", "conversation_context"):
+        try:
+            total += len(pickle.dumps(at.session_state[key]))
+        except Exception:
+            pass
+    return total
+
+
+class SimulatedSession:
+    """ผู้ใช้จำลองหนึ่งคน"""
+
+    def __init__(self, index, questions, seed, timeout):
+        self.index = index
+        self.questions = questions
+        self.random = random.Random(seed)
+        self.at = None
+        self.timeout = timeout
+        self.errors = []
+
+    def timed(self, action, func, latencies):
+        """รันการกระทำหนึ่งครั้งแล้วบันทึกเวลา (รวมเวลารอคิว และ service time)"""
+        start = time.perf_counter()
+        with RUN_LOCK:
+            service_start = time.perf_counter()
+            try:
+                func()
+                if self.at.exception:
+                    self.errors.append(f"{action}: {self.at.exception[0].message}")
+            except Exception as e:
+                self.errors.append(f"{action}: {e}")
+            end = time.perf_counter()
+        latencies.append((action, end - start))
+        latencies.append((f"{action}:service", end - service_start))
+
+    def start(self, latencies):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(APP_FILE, default_timeout=self.timeout)
+        self.timed("first_render", lambda: self.at.run(), latencies)
+
+    def pick_action(self):
+        actions = list(ACTION_WEIGHTS)
+        return self.random.choices(actions, weights=[ACTION_WEIGHTS[a] for a in actions])[0]
+
+    def step(self, latencies):
+        at = self.at
+        action = self.pick_action()
+
+        if action == "quick":
+            buttons = [b for b in at.button if b.key and b.key.startswith("quick_")]
+            if buttons:
+                button = self.random.choice(buttons)
+                self.timed("quick", lambda: button.click().run(), latencies)
+                return
+            action = "ask"
+
+        if action == "switch":
+            buttons = [b for b in at.button if b.key and b.key.startswith("session_")]
+            if len(buttons) > 1:
+                button = self.random.choice(buttons)
+                self.timed("switch", lambda: button.click().run(), latencies)
+                return
+            action = "new"
+
+        if action == "new":
+            buttons = [b for b in at.button if b.key == "new_chat"]
+            if buttons:
+                self.timed("new", lambda: buttons[0].click().run(), latencies)
+                return
+            action = "ask"
+
+        question = self.random.choice(self.questions)
+        if at.chat_input:
+            self.timed("ask", lambda: at.chat_input[0].set_value(question).run(), latencies)
+
+
+def percentile(values, pct):
+    """percentile แบบ nearest-rank"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarize_latencies(latencies):
+    """สรุปเวลาแยกตามการกระทำ (มิลลิวินาที)"""
+    by_action = {}
+    for action, seconds in latencies:
+        by_action.setdefault(action, []).append(seconds * 1000)
+    summary = {}
+    for action, values in sorted(by_action.items()):
+        summary[action] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50), 1),
+            "p95_ms": round(percentile(values, 95), 1),
+            "p99_ms": round(percentile(values, 99), 1),
+            "max_ms": round(max(values), 1),
+            "mean_ms": round(statistics.mean(values), 1),
+        }
+    return summary
+
+
+def run_level(sessions, turns, questions, seed, timeout, think_time):
+    """รันผู้ใช้จำลอง sessions คนพร้อมกันใน process นี้ คนละ turns ครั้ง
+
+    คืนค่า dict ที่มี latencies ดิบ (สำหรับรวมผลหลาย process) และตัวเลขสรุป
+    """
+    latencies = []
+    lock = threading.Lock()
+    rss_before = read_rss_bytes()
+
+    def record(action_latencies):
+        with lock:
+            latencies.extend(action_latencies)
+
+    users = [SimulatedSession(i, questions, seed + i, timeout) for i in range(sessions)]
+
+    def drive(user):
+        local = []
+        user.start(local)
+        for _ in range(turns):
+            if think_time:
+                time.sleep(user.random.uniform(0, think_time))
+            user.step(local)
+        record(local)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        list(executor.map(drive, users))
+    elapsed = time.perf_counter() - start
+
+    rss_after = read_rss_bytes()
+    state_sizes = [session_state_bytes(user.at) for user in users if user.at is not None]
+    errors = [error for user in users for error in user.errors]
+
+    return {
+        "sessions": sessions,
+        "elapsed": elapsed,
+        "latencies": latencies,
+        "rss_after": rss_after,
+        "rss_growth": max(0, rss_after - rss_before),
+        "state_sizes": state_sizes,
+        "errors": errors,
+    }
+
+
+def run_level_worker(args):
+    """จุดเริ่มของ worker process (ใช้กับ --processes)"""
+    return run_level(*args)
+
+
+def run_distributed(sessions, processes, turns, questions, seed, timeout, think_time):
+    """แบ่ง session ไปหลาย process (จำลอง server หลาย worker) แล้วรวมผล"""
+    if processes <= 1:
+        parts = [run_level(sessions, turns, questions, seed, timeout, think_time)]
+    else:
+        shares = [sessions // processes + (1 if i < sessions % processes else 0) for i in range(processes)]
+        jobs = [
+            (share, turns, questions, seed + 1000 * i, timeout, think_time)
+            for i, share in enumerate(shares) if share
+        ]
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(len(jobs)) as pool:
+            parts = pool.map(run_level_worker, jobs)
+
+    latencies = [item for part in parts for item in part["latencies"]]
+    state_sizes = [size for part in parts for size in part["state_sizes"]]
+    errors = [error for part in parts for error in part["errors"]]
+    elapsed = max(part["elapsed"] for part in parts)
+    reruns = sum(1 for action, _ in latencies if not action.endswith(":service"))
+
+    return {
+        "sessions": sessions,
+        "processes": max(1, processes),
+        "turns": turns,
+        "reruns": reruns,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(reruns / elapsed, 2) if elapsed else 0.0,
+        "latency": summarize_latencies(latencies),
+        "rss_mb": round(sum(part["rss_after"] for part in parts) / 1e6, 1),
+        "rss_per_session_kb": round(sum(part["rss_growth"] for part in parts) / sessions / 1024, 1),
+        "session_state_kb_mean": round(statistics.mean(state_sizes) / 1024, 1) if state_sizes else 0.0,
+        "session_state_kb_max": round(max(state_sizes) / 1024, 1) if state_sizes else 0.0,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+    }
+
+
+def print_level(result):
+    """แสดงผลหนึ่งระดับ"""
+    print(f"\n👥 {result['sessions']} sessions × {result['turns']} turns ({result['processes']} process) "
+          f"({result['reruns']} reruns ใน {result['elapsed_s']} s, {result['throughput_rps']} rerun/s)")
+    for action, data in result["latency"].items():
+        print(f"  • {action:<20} n={data['count']:<5} p50={data['p50_ms']:>8} ms  "
+              f"p95={data['p95_ms']:>8} ms  p99={data['p99_ms']:>8} ms  max={data['max_ms']:>8} ms")
+    print(f"  • RSS {result['rss_mb']} MB | เพิ่มขึ้น ~{result['rss_per_session_kb']} KB/session | "
+          f"session_state เฉลี่ย {result['session_state_kb_mean']} KB (สูงสุด {result['session_state_kb_max']} KB)")
+    if result["errors"]:
+        print(f"  ⚠️ ผิดพลาด {result['errors']} ครั้ง เช่น {result['error_samples'][:2]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test แอป EmbedBot ด้วยผู้ใช้จำลองหลาย session")
+    parser.add_argument("--sessions", type=int, default=10, help="จำนวน session พร้อมกัน")
+    parser.add_argument("--ramp", help="ทดสอบหลายระดับ เช่น 5,10,20,40 (แทน --sessions)")
+    parser.add_argument("--processes", type=int, default=1, help="จำนวน worker process (จำลอง server หลาย process)")
+    parser.add_argument("--turns", type=int, default=10, help="จำนวนการกระทำต่อ session")
+    parser.add_argument("--think-time", type=float, default=0.0, help="เวลาคิดสูงสุดระหว่างการกระทำ (วินาที)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="timeout ต่อ rerun (วินาที)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="บันทึกผลเป็น JSON ลงไฟล์")
+    args = parser.parse_args()
+
+    levels = [int(x) for x in args.ramp.split(",")] if args.ramp else [args.sessions]
+    questions = load_questions()
+
+    results = []
+    for sessions in levels:
+        result = run_distributed(
+            sessions, args.processes, args.turns, questions, args.seed, args.timeout, args.think_time
+        )
+        print_level(result)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ บันทึกผลที่ {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# lsa.py
+# ค้นหาคำถามที่ความหมายใกล้กันด้วย Latent Semantic Analysis (ทำงานในเครื่องทั้งหมด)
+#
+# TF-IDF ของ character n-gram (ไม่ต้องตัดคำภาษาไทย) -> TruncatedSVD
+# เวกเตอร์ของทุกแถวคำนวณไว้ตอนสร้าง index เป็นเมทริกซ์ float32 ที่ normalize แล้ว
+# ตอนค้นหาใช้ matrix-vector product ครั้งเดียวได้ cosine similarity ของทุกแถว
+#
+# ใช้ vocabulary ของ n-gram ที่พบจริงแทน hashing เพื่อให้เมทริกซ์ projection
+# (n-gram x มิติ latent) มีขนาดเล็ก ไม่ใช่ 2^18 คอลัมน์
+#
+# scikit-learn ถูก import ตอนสร้าง index ครั้งแรกเท่านั้น (ไม่ถ่วงเวลาเริ่มแอป)
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from ann import DEFAULT_PROBES, LSHIndex
+from lazy_modules import load_module
+from normalize import normalize_query, normalize_text, question_texts
+
+# ขนาดของ latent space (ไม่เกินจำนวนแถว - 1)
+N_COMPONENTS = 128
+NGRAM_RANGE = (2, 4)
+
+# cosine similarity ขั้นต่ำที่ถือว่าตอบได้
+MIN_SCORE = 0.6
+
+# dataset ที่มีแถวตั้งแต่จำนวนนี้จะใช้ ANN (LSH) หา shortlist ก่อน re-rank แบบ exact
+# (มีผลเฉพาะ scorer lsa ไม่เปลี่ยน scorer ค่าเริ่มต้น vector ซึ่งยังให้คะแนนทุกแถว)
+ANN_MIN_ROWS = 20000
+
+# จำนวน bucket ที่เปิดดูต่อตาราง LSH (มาก = recall สูงขึ้น แต่ช้าลง)
+ANN_PROBES_ENV = "EMBEDBOT_ANN_PROBES"
+
+# โบนัสบริบทต่อแถวที่ตรงกับหมวดหมู่/หัวข้อย่อยเดิม
+CONTEXT_BONUS = 0.02
+
+
+def document_text(record):
+    """ข้อความของแถวที่ใช้สร้าง latent space (คำถามซ้ำสองครั้งให้มีน้ำหนักมากกว่าคำพ้อง)
+
+    ไม่ใส่คำตอบ เพราะ n-gram ทั่วไปในคำตอบยาว ๆ ทำให้คำถามนอกเรื่องได้คะแนนสูงตาม
+    """
+    questions = " ".join((record.question,) + record.aliases)
+    return normalize_text(" ".join((questions, questions, record.synonyms)))
+
+
+class LSAIndex:
+    """เวกเตอร์ latent ของทุกแถว (float32, แต่ละแถวยาว 1)"""
+
+    def __init__(self, dataset, n_components=N_COMPONENTS):
+        text = load_module("sklearn.feature_extraction.text")
+        decomposition = load_module("sklearn.decomposition")
+
+        records = dataset.records
+        self.category_codes = np.array([r.category_code for r in records], dtype=np.int32)
+        self.subcategory_codes = np.array([r.subcategory_code for r in records], dtype=np.int32)
+
+        self.exact = {}
+        for record, questions in zip(records, question_texts(dataset)):
+            for question in questions:
+                self.exact.setdefault(question, record.row_id)
+
+        self.vectorizer = text.TfidfVectorizer(
+            analyzer="char_wb",
+            ngram_range=NGRAM_RANGE,
+            sublinear_tf=True,
+            dtype=np.float32,
+        )
+        weighted = self.vectorizer.fit_transform([document_text(r) for r in records])
+
+        components = max(1, min(n_components, len(records) - 1, weighted.shape[1] - 1))
+        svd = decomposition.TruncatedSVD(n_components=components, random_state=0)
+        self.matrix = self.normalize(svd.fit_transform(weighted))
+        # n-gram -> latent (เก็บแค่นี้ ไม่ต้องเก็บ TruncatedSVD ทั้งก้อน)
+        self.projection = np.ascontiguousarray(svd.components_.T, dtype=np.float32)
+
+        self.ann = LSHIndex(self.matrix) if len(records) >= ANN_MIN_ROWS else None
+
+    @staticmethod
+    def normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1
+        return vectors / norms
+
+    def embed(self, query):
+        """เวกเตอร์ latent ของคำถามผู้ใช้ (ยาว 1)"""
+        weighted = self.vectorizer.transform([normalize_text(query)])
+        return self.normalize(weighted @ self.projection)[0]
+
+    def scores(self, query):
+        """cosine similarity ของทุกแถว"""
+        return self.matrix @ self.embed(query)
+
+    def shortlist_scores(self, query):
+        """(แถว, cosine similarity) ของแถวที่ต้องพิจารณา
+
+        dataset ใหญ่ใช้ shortlist จาก LSH ส่วน dataset เล็กคำนวณทุกแถว
+        """
+        vector = self.embed(query)
+        if self.ann is None:
+            return np.arange(len(self.matrix)), self.matrix @ vector
+        rows = self.ann.candidates(vector, get_ann_probes())
+        if not len(rows):
+            rows = np.arange(len(self.matrix))
+        return rows, self.matrix[rows] @ vector
+
+
+def get_ann_probes():
+    try:
+        return max(1, int(os.environ.get(ANN_PROBES_ENV, DEFAULT_PROBES)))
+    except ValueError:
+        return DEFAULT_PROBES
+
+
+@lru_cache(maxsize=4)
+def get_index(dataset):
+    """index ของ dataset (สร้างครั้งเดียวต่อ dataset)"""
+    return LSAIndex(dataset)
+
+
+def best_match(user_input, dataset, context, threshold=MIN_SCORE):
+    """ค้นหาคำถามที่ความหมายใกล้ที่สุด คืนค่า (row_id หรือ None, คะแนนสูงสุด)
+
+    คะแนนเป็น None เมื่อตรงทุกตัวอักษร
+    """
+    if dataset.empty:
+        return None, 0.0
+
+    index = get_index(dataset)
+    user_lower, _ = normalize_query(user_input)
+    if user_lower in index.exact:
+        return index.exact[user_lower], None
+    if not user_lower:
+        return None, 0.0
+
+    rows, scores = index.shortlist_scores(user_lower)
+    if context:
+        scores = scores + (index.category_codes[rows] == dataset.category_code(context.get('last_category'))) * CONTEXT_BONUS
+        scores = scores + (index.subcategory_codes[rows] == dataset.subcategory_code(context.get('last_subcategory'))) * CONTEXT_BONUS
+
+    best = int(np.argmax(scores))
+    if scores[best] >= threshold:
+        return int(rows[best]), float(scores[best])
+    return None, float(scores[best])
+
+
+def find_best_match(user_input, dataset, context, threshold=MIN_SCORE):
+    """ค้นหาคำถามที่ความหมายใกล้ที่สุด คืนค่าลำดับแถว (row_id) หรือ None"""
+    return best_match(user_input, dataset, context, threshold)[0]
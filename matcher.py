@@ -0,0 +1,138 @@
+# matcher.py
+# ค้นหาคำถามที่ตรงที่สุดจาก dataset
+from difflib import SequenceMatcher
+
+from normalize import STOPWORDS, normalize_query, question_texts
+
+
+def similarity_score(str1, str2):
+    """คำนวณความคล้ายคลึงระหว่างสองสตริง (ที่ normalize แล้ว)"""
+    return SequenceMatcher(None, str1, str2).ratio()
+
+
+def question_score(user_lower, user_words, question, context_bonus=0, min_score=None):
+    """คะแนนรวมของคำถามหนึ่งข้อที่ normalize แล้ว (คืนค่า None ถ้าตรงทุกตัวอักษร)
+
+    ถ้าระบุ min_score และคะแนนสูงสุดที่เป็นไปได้ (similarity = 1) ยังไม่ถึง
+    จะคืนค่า 0 โดยไม่คำนวณ similarity ซึ่งช้าที่สุด
+    """
+    question_words = question.split()
+
+    # 1. Exact match (คะแนนเต็ม)
+    if user_lower == question:
+        return None
+
+    # 2. Partial match - ตรวจสอบว่าคำในคำถามผู้ใช้มีอยู่ในคำถาม dataset
+    partial_match_score = 0
+    for user_word in user_words:
+        # ข้ามคำทั่วไป
+        if user_word in STOPWORDS:
+            continue
+
+        # ตรวจสอบว่าคำนี้มีในคำถาม dataset หรือไม่
+        for q_word in question_words:
+            # Exact word match
+            if user_word == q_word:
+                partial_match_score += 1.0
+            # Partial word match (เช่น "embed" ใน "embedded")
+            elif user_word in q_word or q_word in user_word:
+                if len(user_word) >= 3:  # คำต้องยาวพอสมควร
+                    partial_match_score += 0.8
+
+    # ปรับคะแนนตามจำนวนคำ
+    if len(user_words) > 0:
+        partial_match_score = partial_match_score / len(user_words)
+
+    # 3. Keyword matching
+    user_word_set = set(user_words)
+    question_word_set = set(question_words)
+    common_words = user_word_set.intersection(question_word_set)
+    keyword_score = len(common_words) / max(len(user_word_set), len(question_word_set)) if len(user_word_set) > 0 else 0
+
+    # 4. Similarity score (อยู่ระหว่าง 0-1 จึงรู้คะแนนสูงสุดที่เป็นไปได้ก่อนคำนวณ)
+    if min_score is not None:
+        short = len(user_words) <= 3
+        upper = (partial_match_score * 0.5 + keyword_score * 0.2 + 0.2 if short
+                 else partial_match_score * 0.3 + keyword_score * 0.3 + 0.3)
+        upper += context_bonus + (0.3 if short and partial_match_score > 0.6 else 0)
+        if upper + 1e-9 < min_score:
+            return 0
+    sim_score = similarity_score(user_lower, question)
+
+    # คำนวณคะแนนรวม
+    # ให้น้ำหนัก partial match มากสำหรับคำสั้น
+    if len(user_words) <= 3:
+        total_score = (partial_match_score * 0.5) + (keyword_score * 0.2) + (sim_score * 0.2) + context_bonus
+    else:
+        total_score = (partial_match_score * 0.3) + (keyword_score * 0.3) + (sim_score * 0.3) + context_bonus
+
+    # โบนัสพิเศษสำหรับคำถามสั้นที่มี partial match สูง
+    if len(user_words) <= 3 and partial_match_score > 0.6:
+        total_score += 0.3
+
+    return total_score
+
+
+def best_match(user_input, dataset, context, threshold=0.3):
+    """
+    ค้นหาคำถามที่ตรงที่สุดจาก dataset (CompactDataset)
+
+    วิธีการค้นหา:
+    1. ตรวจสอบคำถามที่ตรงทุกตัวอักษร (exact match)
+    2. ตรวจสอบคำที่มีอยู่บางส่วน (partial match) - เหมาะกับคำสั้น
+    3. ตรวจสอบคำถามที่มีคำสำคัญตรงกัน (keyword match)
+    4. ตรวจสอบความคล้ายคลึง (similarity)
+    5. พิจารณาบริบท (หมวดหมู่และหัวข้อย่อยเดิม)
+
+    แถวที่มีคำถามอื่น (alias) จะใช้คะแนนของคำถามที่ตรงที่สุด
+    คืนค่า (row_id หรือ None, คะแนนสูงสุด) คะแนนเป็น None เมื่อตรงทุกตัวอักษร
+    """
+    if dataset.empty:
+        return None, 0
+
+    user_lower, user_words = normalize_query(user_input)
+
+    # ปรับ threshold สำหรับคำถามสั้น
+    if len(user_words) <= 3:
+        threshold = 0.2
+
+    # แปลงบริบทเป็นรหัสครั้งเดียว แล้วเทียบเป็นตัวเลขในลูป
+    last_category = -1
+    last_subcategory = -1
+    if context:
+        last_category = dataset.category_code(context.get('last_category'))
+        last_subcategory = dataset.subcategory_code(context.get('last_subcategory'))
+
+    best_match_idx = None
+    best_score = 0
+
+    for record, questions in zip(dataset.records, question_texts(dataset)):
+        # 5. Context bonus (เทียบรหัส categorical)
+        context_bonus = 0
+        if record.category_code == last_category:
+            context_bonus += 0.1
+        if record.subcategory_code == last_subcategory:
+            context_bonus += 0.1
+
+        # ให้คะแนนทั้งคำถามหลักและคำถามอื่นที่ถูกรวมไว้ (alias) ใช้คะแนนสูงสุด
+        for question in questions:
+            total_score = question_score(user_lower, user_words, question, context_bonus)
+
+            # 1. Exact match (คะแนนเต็ม)
+            if total_score is None:
+                return record.row_id, None
+
+            if total_score > best_score:
+                best_score = total_score
+                best_match_idx = record.row_id
+
+    # คืนค่าถ้าคะแนนเกิน threshold
+    if best_score >= threshold:
+        return best_match_idx, best_score
+
+    return None, best_score
+
+
+def find_best_match(user_input, dataset, context, threshold=0.3):
+    """ค้นหาคำถามที่ตรงที่สุด คืนค่าลำดับแถว (row_id) หรือ None"""
+    return best_match(user_input, dataset, context, threshold)[0]
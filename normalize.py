@@ -0,0 +1,76 @@
+# normalize.py
+# ทำข้อความให้อยู่ในรูปมาตรฐานเดียวกันก่อนเปรียบเทียบ (ใช้ร่วมกันทั้งแถวของ dataset และคำถามผู้ใช้)
+#
+# ขั้นตอน: Unicode NFC -> ลบอักขระความกว้างศูนย์ -> แก้ลำดับ/การซ้ำของสระและวรรณยุกต์ไทย
+# -> ยุบช่องว่าง -> ตัวพิมพ์เล็ก แถวของ dataset ทำครั้งเดียวตอนโหลด ส่วนคำถามผู้ใช้
+# ทำครั้งเดียวต่อข้อความ (จำผลไว้) ลูปให้คะแนนจึงไม่ต้อง normalize ซ้ำ
+import re
+import unicodedata
+from functools import lru_cache
+
+# คำทั่วไปที่ไม่นับใน partial match
+STOPWORDS = frozenset(('คือ', 'อะไร', 'คือ?', 'อะไร?', 'ใช่', 'ไหม', 'หรือไม่'))
+
+# จำนวนคำถามผู้ใช้ที่จำผล normalize ไว้
+QUERY_CACHE_SIZE = 4096
+
+ZERO_WIDTH_RE = re.compile("[\u200b\u200c\u200d\u2060\ufeff\u00ad]")
+WHITESPACE_RE = re.compile(r"\s+")
+
+# นิคหิต (+ วรรณยุกต์) + สระอา ที่พิมพ์แยกกัน -> สระอำ (เช่น "น ํ ้ า" -> "น้ำ")
+SARA_AM_RE = re.compile("\u0e4d([\u0e48-\u0e4b]?)\u0e32")
+# สระเอสองตัวติดกัน -> สระแอ
+SARA_AE_RE = re.compile("\u0e40\u0e40")
+# วรรณยุกต์ที่พิมพ์ก่อนสระบน/ล่าง -> สระก่อนวรรณยุกต์ (ลำดับมาตรฐาน)
+TONE_ORDER_RE = re.compile("([\u0e48-\u0e4b])([\u0e31\u0e34-\u0e3a])")
+# สระบน/ล่าง วรรณยุกต์ และเครื่องหมายที่พิมพ์ซ้ำ -> ตัวเดียว
+REPEATED_MARK_RE = re.compile("([\u0e31\u0e34-\u0e3a\u0e47-\u0e4e])\\1+")
+
+
+def normalize_text(text):
+    """ข้อความในรูปมาตรฐาน (ตัวพิมพ์เล็ก ช่องว่างเดียว ไม่มีช่องว่างหัวท้าย)"""
+    text = unicodedata.normalize("NFC", str(text))
+    text = ZERO_WIDTH_RE.sub("", text)
+    text = SARA_AM_RE.sub("\\1\u0e33", text)
+    text = SARA_AE_RE.sub("\u0e41", text)
+    text = TONE_ORDER_RE.sub("\\2\\1", text)
+    text = REPEATED_MARK_RE.sub("\\1", text)
+    text = WHITESPACE_RE.sub(" ", text).strip()
+    return text.lower()
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def normalize_query(user_input):
+    """คำถามผู้ใช้ในรูปมาตรฐาน คืนค่า (ข้อความ, tuple ของคำ)"""
+    text = normalize_text(user_input)
+    return text, tuple(text.split())
+
+
+@lru_cache(maxsize=4)
+def question_texts(dataset):
+    """คำถามทุกข้อของแต่ละแถว (คำถามหลักตามด้วย alias) ในรูปมาตรฐาน
+
+    คืนค่า list ที่ลำดับตรงกับ dataset.records (ทำครั้งเดียวต่อ dataset)
+    ถ้า dataset มีผลที่เตรียมไว้แล้ว (แนบจาก shared_store) จะใช้อันนั้น
+    """
+    if dataset.normalized_questions is not None:
+        return dataset.normalized_questions
+    return [
+        tuple(normalize_text(text) for text in (record.question,) + record.aliases)
+        for record in dataset.records
+    ]
+
+
+def patch_question_texts(previous, dataset, changed_rows):
+    """คำถามในรูปมาตรฐานของ dataset ใหม่ โดย normalize ใหม่เฉพาะแถวที่เปลี่ยน
+
+    แถวอื่นใช้ผลของ previous (row_id เดิมต้องเป็นแถวเดิม) ผลถูกเก็บไว้ใน dataset.normalized_questions
+    """
+    texts = list(question_texts(previous)[:len(dataset)])
+    texts.extend([()] * (len(dataset) - len(texts)))
+    for row in changed_rows:
+        if row < len(dataset):
+            record = dataset.records[row]
+            texts[row] = tuple(normalize_text(text) for text in (record.question,) + record.aliases)
+    dataset.normalized_questions = texts
+    return texts
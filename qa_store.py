@@ -0,0 +1,181 @@
+# qa_store.py
+# โครงสร้าง dataset แบบกะทัดรัดสำหรับการค้นหาคำตอบ
+import sys
+import hashlib
+
+import pandas as pd
+
+from ingest import ALIAS_COLUMN, ALIAS_SEPARATOR
+
+# คอลัมน์ที่มีค่าซ้ำกันมาก เก็บเป็น categorical (รหัสตัวเลข)
+CATEGORICAL_COLUMNS = ['หมวดหมู่', 'หัวข้อย่อย']
+
+# จำนวนคำถามแนะนำสูงสุดต่อหัวข้อย่อย
+QUICK_QUESTIONS_PER_SUBCATEGORY = 4
+
+
+class QARecord:
+    """ข้อมูลคำถาม-คำตอบหนึ่งแถว (ใช้ __slots__ ไม่มี __dict__ ต่อแถว)
+
+    หมวดหมู่และหัวข้อย่อยเก็บเป็นรหัสตัวเลข ใช้เปรียบเทียบบริบทได้เร็ว
+    """
+    __slots__ = (
+        "row_id",
+        "category_code",
+        "subcategory_code",
+        "question",
+        "aliases",
+        "answer",
+        "synonyms",
+        "image_url",
+    )
+
+    def __init__(self, row_id, category_code, subcategory_code, question, answer, synonyms, image_url, aliases=()):
+        self.row_id = row_id
+        self.category_code = category_code
+        self.subcategory_code = subcategory_code
+        self.question = question
+        self.aliases = aliases
+        self.answer = answer
+        self.synonyms = synonyms
+        self.image_url = image_url
+
+
+class CompactDataset:
+    """dataset ที่พร้อมใช้ค้นหา: records แบบ slots + ชื่อหมวดหมู่/หัวข้อย่อยแบบรหัส
+
+    ไม่เก็บ DataFrame ไว้ (DataFrame ที่โหลดมาถูกทิ้งหลัง build_compact_dataset)
+    """
+
+    def __init__(self, records, categories, subcategories, version=None, quick_questions=None, stats=None):
+        self.records = records
+        self.categories = categories
+        self.subcategories = subcategories
+        self.category_index = {name: code for code, name in enumerate(categories)}
+        self.subcategory_index = {name: code for code, name in enumerate(subcategories)}
+
+        # คำนวณครั้งเดียวต่อ dataset version แล้วให้ UI อ่านอย่างเดียว
+        # (dataset ที่แนบจาก shared_store ส่งค่าที่คำนวณไว้แล้วมาให้)
+        self.version = version or compute_version(records, categories, subcategories)
+        self.quick_questions = quick_questions if quick_questions is not None else build_quick_questions(self)
+        self.stats = stats if stats is not None else compute_stats(self)
+
+        # ข้อมูลที่เตรียมไว้แล้ว (เช่นแนบจาก shared_store) หรือ None ถ้าต้องสร้างเอง:
+        # index ของ vector_matcher, คำถามที่ normalize แล้ว และจำนวนคำของ spelling
+        self.question_index = None
+        self.normalized_questions = None
+        self.spelling_counts = None
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def empty(self):
+        return not self.records
+
+    def category_of(self, record):
+        """ชื่อหมวดหมู่ของแถว"""
+        return self.categories[record.category_code]
+
+    def subcategory_of(self, record):
+        """ชื่อหัวข้อย่อยของแถว"""
+        return self.subcategories[record.subcategory_code]
+
+    def category_code(self, name):
+        """รหัสหมวดหมู่ (-1 ถ้าไม่มี)"""
+        return self.category_index.get(name, -1)
+
+    def subcategory_code(self, name):
+        """รหัสหัวข้อย่อย (-1 ถ้าไม่มี)"""
+        return self.subcategory_index.get(name, -1)
+
+
+def compute_version(records, categories, subcategories):
+    """สร้างรหัสเวอร์ชันของ dataset จากเนื้อหา (เปลี่ยนเมื่อข้อมูลเปลี่ยน)"""
+    digest = hashlib.sha1()
+    for record in records:
+        row = (
+            categories[record.category_code],
+            subcategories[record.subcategory_code],
+            record.question,
+            record.answer,
+            record.synonyms,
+            record.image_url,
+        ) + record.aliases
+        digest.update("\x1f".join(row).encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()[:12]
+
+
+def build_quick_questions(dataset):
+    """สร้างรายการคำถามแนะนำ {หมวดหมู่: {หัวข้อย่อย: [คำถาม, ...]}}"""
+    categories = {}
+
+    for record in dataset.records:
+        category = dataset.category_of(record)
+        subcategory = dataset.subcategory_of(record)
+
+        subcategories = categories.setdefault(category, {})
+        questions = subcategories.setdefault(subcategory, [])
+
+        if len(questions) < QUICK_QUESTIONS_PER_SUBCATEGORY:
+            questions.append(record.question)
+
+    return categories
+
+
+def compute_stats(dataset):
+    """สถิติของ dataset สำหรับแถบสถานะและ sidebar"""
+    return {
+        "questions": len(dataset.records),
+        "categories": len(dataset.categories),
+        "subcategories": len(dataset.subcategories),
+        "images": sum(1 for record in dataset.records if record.image_url != ''),
+    }
+
+
+def intern_column(series):
+    """intern ทุกค่าในคอลัมน์ เพื่อให้ข้อความที่ซ้ำกันใช้ object เดียวกัน"""
+    return series.map(lambda value: sys.intern(str(value)))
+
+
+def split_aliases(text):
+    """แยกคำถามอื่น (alias) ของแถวเป็น tuple"""
+    if not text:
+        return ()
+    return tuple(sys.intern(alias.strip()) for alias in text.split(ALIAS_SEPARATOR) if alias.strip())
+
+
+def build_compact_dataset(df):
+    """แปลง DataFrame ที่โหลดมาเป็น CompactDataset"""
+    if df is None or df.empty:
+        return CompactDataset([], (), ())
+
+    df = df.reset_index(drop=True).copy()
+    for col in df.columns:
+        if col in CATEGORICAL_COLUMNS:
+            # เรียงรหัสตามลำดับที่พบในไฟล์ (ไม่เรียงตามตัวอักษร)
+            values = df[col].astype(str)
+            df[col] = pd.Categorical(values, categories=pd.unique(values))
+        else:
+            df[col] = intern_column(df[col])
+
+    categories = tuple(sys.intern(str(c)) for c in df['หมวดหมู่'].cat.categories)
+    subcategories = tuple(sys.intern(str(c)) for c in df['หัวข้อย่อย'].cat.categories)
+
+    synonyms = df['คำพ้อง'] if 'คำพ้อง' in df.columns else [''] * len(df)
+    aliases = df[ALIAS_COLUMN] if ALIAS_COLUMN in df.columns else [''] * len(df)
+    records = [
+        QARecord(row_id, int(cat_code), int(sub_code), question, answer, synonym, image_url, split_aliases(alias))
+        for row_id, (cat_code, sub_code, question, answer, synonym, image_url, alias) in enumerate(zip(
+            df['หมวดหมู่'].cat.codes,
+            df['หัวข้อย่อย'].cat.codes,
+            df['คำถาม'],
+            df['คำตอบ'],
+            synonyms,
+            df['รูปภาพ'],
+            aliases,
+        ))
+    ]
+
+    return CompactDataset(records, categories, subcategories)
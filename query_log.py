@@ -0,0 +1,236 @@
+# query_log.py
+# บันทึกคำถามของผู้ใช้ทุกข้อ (เวลา, session, แถวที่ตอบ, คะแนน, เวลาที่ใช้, cache hit)
+#
+# generate_response แค่ใส่รายการลงคิวในหน่วยความจำ thread เบื้องหลังเป็นคนเขียนไฟล์
+# แบบรวมหลายรายการต่อครั้ง (batch) จึงไม่เพิ่มเวลาตอบผู้ใช้
+# ไฟล์ปัจจุบันจะถูกปิดเป็น segment เมื่อใหญ่เกินหรือเปิดนานเกินกำหนด แล้วบีบอัดเป็น .gz
+#
+# วิธีใช้:
+#   EMBEDBOT_QUERY_LOG=/var/log/embedbot/queries.jsonl streamlit run app.py
+#   EMBEDBOT_QUERY_LOG=off streamlit run app.py          # ไม่บันทึก
+import atexit
+import glob
+import gzip
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+QUERY_LOG_ENV = "EMBEDBOT_QUERY_LOG"
+MAX_MB_ENV = "EMBEDBOT_QUERY_LOG_MAX_MB"
+MAX_HOURS_ENV = "EMBEDBOT_QUERY_LOG_MAX_HOURS"
+
+# ขนาด (MB) และอายุ (ชั่วโมง) สูงสุดของไฟล์ปัจจุบันก่อนปิดเป็น segment
+DEFAULT_MAX_MB = 16
+DEFAULT_MAX_HOURS = 24
+
+# จำนวนรายการที่รอเขียนได้ ถ้าเต็มจะทิ้ง (ไม่ให้ disk ช้าถ่วงผู้ใช้)
+QUEUE_SIZE = 10000
+
+# เขียนครั้งละไม่เกิน BATCH_SIZE รายการ หรือทุก FLUSH_SECONDS วินาที
+BATCH_SIZE = 256
+FLUSH_SECONDS = 1.0
+
+_STOP = object()
+
+
+def get_log_path():
+    """ไฟล์ log (None ถ้าปิดไว้)"""
+    path = os.environ.get(QUERY_LOG_ENV, "").strip()
+    if path.lower() in ("0", "off", "false", "no"):
+        return None
+    return path or os.path.join(tempfile.gettempdir(), "embedbot_queries.jsonl")
+
+
+def env_number(name, default):
+    try:
+        return max(0.0, float(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+def segment_paths(path):
+    """segment ที่ปิดแล้วของไฟล์ log (เรียงจากเก่าไปใหม่)"""
+    base, ext = os.path.splitext(path)
+    return sorted(glob.glob(f"{glob.escape(base)}-*{ext}.gz"))
+
+
+class QueryLogWriter:
+    """thread เบื้องหลังที่เขียนรายการจากคิวลงไฟล์ JSON lines พร้อมหมุนไฟล์"""
+
+    def __init__(self, path, max_bytes=None, max_seconds=None):
+        self.path = path
+        self.max_bytes = max_bytes if max_bytes is not None else env_number(MAX_MB_ENV, DEFAULT_MAX_MB) * 1024 * 1024
+        self.max_seconds = max_seconds if max_seconds is not None else env_number(MAX_HOURS_ENV, DEFAULT_MAX_HOURS) * 3600
+        self.entries = queue.Queue(maxsize=QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.segments = 0
+        self.opened_at = self.current_opened_at()
+        self.thread = threading.Thread(target=self.run, name="query-log", daemon=True)
+        self.thread.start()
+
+    def current_opened_at(self):
+        """เวลาที่ไฟล์ปัจจุบันเริ่ม (ไฟล์ที่มีอยู่แล้วจากรอบก่อนใช้เวลาของรายการแรก)
+
+        ไม่ใช้ ctime/mtime ของไฟล์ เพราะบน Linux เปลี่ยนทุกครั้งที่เขียน
+        ไฟล์ที่ถูกเขียนต่อเนื่องจะไม่มีวันถึงอายุที่ต้องหมุน
+        """
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return float(json.loads(f.readline())["time"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return time.time()
+
+    def submit(self, entry):
+        try:
+            self.entries.put_nowait(entry)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            entry = self.entries.get()
+            if entry is _STOP:
+                break
+            batch = [entry]
+            deadline = time.monotonic() + FLUSH_SECONDS
+            # รวมรายการที่ตามมาติด ๆ ให้เป็นการเขียนไฟล์ครั้งเดียว
+            while len(batch) < BATCH_SIZE:
+                try:
+                    entry = self.entries.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            self.write(batch)
+
+    def write(self, batch):
+        lines = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in batch)
+        try:
+            self.rotate_if_needed()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError:
+            with self.lock:
+                self.dropped += len(batch)
+            return
+        with self.lock:
+            self.written += len(batch)
+
+    def rotate_if_needed(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        too_big = self.max_bytes and size >= self.max_bytes
+        too_old = self.max_seconds and time.time() - self.opened_at >= self.max_seconds
+        if size and (too_big or too_old):
+            self.rotate()
+
+    def rotate(self):
+        """ปิดไฟล์ปัจจุบันเป็น segment ที่บีบอัดแล้ว แล้วเริ่มไฟล์ใหม่"""
+        base, ext = os.path.splitext(self.path)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        closed = f"{base}-{stamp}{ext}"
+        os.replace(self.path, closed)
+        self.opened_at = time.time()
+        with open(closed, "rb") as src, gzip.open(closed + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(closed)
+        with self.lock:
+            self.segments += 1
+
+    def close(self, timeout=5):
+        """เขียนรายการที่ค้างในคิวให้หมดแล้วหยุด thread"""
+        if self.thread.is_alive():
+            self.entries.put(_STOP)
+            self.thread.join(timeout)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "path": self.path,
+                "written": self.written,
+                "pending": self.entries.qsize(),
+                "dropped": self.dropped,
+                "segments": self.segments,
+            }
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """QueryLogWriter ของ process (สร้างครั้งแรกที่ใช้) หรือ None ถ้าปิดไว้"""
+    global _writer
+    path = get_log_path()
+    if path is None:
+        return None
+    with _writer_lock:
+        if _writer is None or _writer.path != path:
+            if _writer is not None:
+                _writer.close()
+            _writer = QueryLogWriter(path)
+            atexit.register(_writer.close)
+        return _writer
+
+
+def log_query(session_id, query, result, seconds, version=None, context=None):
+    """ส่งรายการของคำถามหนึ่งข้อเข้าคิว (ไม่รอเขียนไฟล์)
+
+    result คือผลจาก scorers.search: {"row", "score", "cached", "scorer"}
+    """
+    writer = get_writer()
+    if writer is None:
+        return
+    context = context or {}
+    writer.submit({
+        "time": time.time(),
+        "session": session_id,
+        "query": query,
+        "category": context.get("last_category"),
+        "subcategory": context.get("last_subcategory"),
+        "version": version,
+        "scorer": result.get("scorer"),
+        "row": result.get("row"),
+        "score": None if result.get("score") is None else round(result["score"], 4),
+        "latency_ms": round(seconds * 1000, 3),
+        "cache_hit": bool(result.get("cached")),
+    })
+
+
+def read_entries(path, since=None, max_segments=None):
+    """อ่านรายการจากไฟล์ปัจจุบันและ segment ที่บีบอัดแล้ว (ใหม่สุด max_segments ไฟล์)
+
+    since: เวลา (epoch) ที่เก่าที่สุดที่ต้องการ บรรทัดที่อ่านไม่ได้จะถูกข้าม
+    """
+    paths = segment_paths(path)
+    if max_segments is not None:
+        paths = paths[-max_segments:] if max_segments else []
+    files = [(p, gzip.open) for p in paths] + [(path, open)]
+
+    entries = []
+    for file_path, opener in files:
+        try:
+            with opener(file_path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if since is None or entry.get("time", 0) >= since:
+                        entries.append(entry)
+        except (OSError, EOFError):
+            continue
+    return entries
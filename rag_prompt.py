@@ -0,0 +1,222 @@
+# rag_prompt.py
+# สร้าง prompt สำหรับ LLM จากแถวของ dataset ที่ค้นเจอ ภายในงบ token ที่กำหนด
+#
+# ดึง top-k แถวจาก vector_matcher ตัดแถวที่คำตอบซ้ำกัน แล้วใส่ทีละแถวตามลำดับ
+# ความเกี่ยวข้องจนเต็มงบ นับ token ด้วย tiktoken (ถ้าติดตั้งและมีไฟล์ encoding อยู่ในเครื่องแล้ว
+# จะไม่ดาวน์โหลดระหว่างตอบแชต) ถ้าไม่มีจะประมาณแบบนับเกิน (อักษรไม่ใช่ ASCII ตัวละ 1 token,
+# ASCII 4 ตัวต่อ 1 token) prompt ที่สร้างแล้วจำไว้ตาม (คำถาม, เวอร์ชัน dataset, บริบท, k, งบ)
+#
+# แอปจะเรียก Gemini เฉพาะเมื่อเปิด EMBEDBOT_LLM_FALLBACK=1 เพราะเป็นการเรียกเครือข่ายแบบรอผล
+# ในรอบ render ของคำถามที่ไม่พบใน dataset
+#
+# วิธีใช้:
+#   python rag_prompt.py "LED RGB ทำงานอย่างไร" --budget 600 --k 5
+#   EMBEDBOT_LLM_FALLBACK=1 EMBEDBOT_RAG_BUDGET=800 EMBEDBOT_GEMINI_TIMEOUT=15 streamlit run app.py
+import argparse
+import hashlib
+import os
+import tempfile
+from functools import lru_cache
+
+from lazy_modules import load_module, module_available
+from normalize import normalize_query
+from prompt import PROMPT_RAG
+from scorers import ResultCache
+from vector_matcher import top_matches
+
+BUDGET_ENV = "EMBEDBOT_RAG_BUDGET"
+TIMEOUT_ENV = "EMBEDBOT_GEMINI_TIMEOUT"
+LLM_ENV = "EMBEDBOT_LLM_FALLBACK"
+
+# งบ token ของ prompt ทั้งหมด (system + ข้อมูลอ้างอิง + คำถาม)
+DEFAULT_BUDGET = 800
+
+# จำนวนแถวที่ดึงมาพิจารณา
+DEFAULT_TOP_K = 5
+
+# เวลารอคำตอบจาก LLM สูงสุด (วินาที) เกินแล้วผู้เรียกได้ exception แทนการค้างทั้ง chat
+DEFAULT_TIMEOUT = 15.0
+
+# encoding ของ tiktoken ที่ใช้นับ
+ENCODING = "cl100k_base"
+
+# ที่มาของไฟล์ encoding (tiktoken ใช้ sha1 ของ URL นี้เป็นชื่อไฟล์ใน cache)
+ENCODING_URL = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+
+# จำนวน prompt ที่จำไว้
+PROMPT_CACHE_SIZE = 1024
+
+prompt_cache = ResultCache(PROMPT_CACHE_SIZE)
+
+
+def llm_enabled():
+    return os.environ.get(LLM_ENV, "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+def encoding_cached():
+    """ไฟล์ encoding อยู่ใน cache ของ tiktoken แล้วหรือไม่ (ตำแหน่งเดียวกับที่ tiktoken ใช้)"""
+    cache_dir = os.environ.get("TIKTOKEN_CACHE_DIR") or os.environ.get("DATA_GYM_CACHE_DIR")
+    if cache_dir is None:
+        cache_dir = os.path.join(tempfile.gettempdir(), "data-gym-cache")
+    if not cache_dir:
+        return False
+    return os.path.exists(os.path.join(cache_dir, hashlib.sha1(ENCODING_URL.encode()).hexdigest()))
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """encoding ของ tiktoken (None ถ้าไม่ได้ติดตั้ง ยังไม่มีไฟล์ encoding ในเครื่อง หรือโหลดไม่ได้)"""
+    if not module_available("tiktoken") or not encoding_cached():
+        return None
+    try:
+        return load_module("tiktoken").get_encoding(ENCODING)
+    except Exception:
+        return None
+
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    ascii_chars = sum(1 for ch in text if ch < "\x80")
+    return (len(text) - ascii_chars) + -(-ascii_chars // 4)
+
+
+def truncate_tokens(text, max_tokens):
+    """ตัดข้อความให้ไม่เกิน max_tokens"""
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[:max_tokens])
+    # ค้นหาความยาวที่ยาวที่สุดที่ยังอยู่ในงบ
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+
+def get_budget():
+    try:
+        return max(1, int(os.environ.get(BUDGET_ENV, DEFAULT_BUDGET)))
+    except ValueError:
+        return DEFAULT_BUDGET
+
+
+def get_timeout():
+    try:
+        return max(1.0, float(os.environ.get(TIMEOUT_ENV, DEFAULT_TIMEOUT)))
+    except ValueError:
+        return DEFAULT_TIMEOUT
+
+
+def retrieve(user_input, dataset, context, k=DEFAULT_TOP_K):
+    """row_id ของแถวที่เกี่ยวข้องตามลำดับ (ตัดแถวที่คำตอบซ้ำกัน)"""
+    # ดึงเผื่อไว้ 2 เท่า เพราะแถวที่คำตอบซ้ำจะถูกตัดออก
+    exact, matches, _ = top_matches(user_input, dataset, context, 2 * k)
+    rows = ([exact] if exact is not None else []) + [row for score, row in matches if score > 0]
+
+    seen_answers = set()
+    results = []
+    for row in rows:
+        answer = normalize_query(dataset.records[row].answer)[0]
+        if answer in seen_answers:
+            continue
+        seen_answers.add(answer)
+        results.append(row)
+    return results[:k]
+
+
+def reference_block(dataset, row, number):
+    record = dataset.records[row]
+    return (f"[{number}] {dataset.category_of(record)} / {dataset.subcategory_of(record)}\n"
+            f"Q: {record.question}\nA: {record.answer}\n")
+
+
+def build_prompt(user_input, dataset, context=None, budget=None, k=DEFAULT_TOP_K, system_prompt=PROMPT_RAG):
+    """prompt ที่มีข้อมูลอ้างอิงเท่าที่ใส่ได้ภายในงบ token
+
+    คืนค่า {"text", "rows", "tokens", "budget"} (rows คือแถวที่ใส่ลงไปจริง)
+    """
+    budget = budget or get_budget()
+    context = context or {}
+    key = (
+        normalize_query(user_input)[0],
+        dataset.version,
+        dataset.category_code(context.get('last_category')),
+        dataset.subcategory_code(context.get('last_subcategory')),
+        k,
+        budget,
+        system_prompt,
+    )
+    cached = prompt_cache.get(key)
+    if cached is not None:
+        return cached
+
+    system_prompt = system_prompt.strip()
+    header = "ข้อมูลอ้างอิง:\n"
+    question = f"\nคำถาม: {user_input.strip()}\nตอบจากข้อมูลอ้างอิงเท่านั้น"
+    remaining = budget - count_tokens(system_prompt + "\n\n" + header + question)
+
+    blocks = []
+    rows = []
+    for row in retrieve(user_input, dataset, context, k):
+        block = reference_block(dataset, row, len(blocks) + 1)
+        tokens = count_tokens(block)
+        if tokens > remaining:
+            # แถวที่เกี่ยวข้องที่สุดยาวเกินงบ ตัดให้พอดีแทนการไม่ใส่เลย
+            if blocks or remaining <= 0:
+                continue
+            block = truncate_tokens(block, remaining)
+            tokens = count_tokens(block)
+        blocks.append(block)
+        rows.append(row)
+        remaining -= tokens
+
+    text = system_prompt + "\n\n" + header + "".join(blocks) + question
+    # การนับแยกส่วนอาจต่างจากการนับทั้งข้อความเล็กน้อย ตรวจซ้ำให้อยู่ในงบแน่นอน
+    while blocks and count_tokens(text) > budget:
+        blocks.pop()
+        rows.pop()
+        text = system_prompt + "\n\n" + header + "".join(blocks) + question
+    prompt = {"text": text, "rows": rows, "tokens": count_tokens(text), "budget": budget}
+    prompt_cache.put(key, prompt)
+    return prompt
+
+
+def generate_answer(model, user_input, dataset, context=None, budget=None, system_prompt=PROMPT_RAG, timeout=None):
+    """ถาม LLM (เช่น Gemini GenerativeModel) ด้วย prompt ที่จัดแล้ว คืนค่าข้อความหรือ None
+
+    ถ้าไม่ตอบภายใน timeout วินาที (ค่าเริ่มต้นจาก EMBEDBOT_GEMINI_TIMEOUT) จะ raise exception
+    """
+    prompt = build_prompt(user_input, dataset, context, budget, system_prompt=system_prompt)
+    if not prompt["rows"]:
+        return None
+    response = model.generate_content(prompt["text"], request_options={"timeout": timeout or get_timeout()})
+    return getattr(response, "text", None) or None
+
+
+def main():
+    from ingest import get_dataset_sources, load_sources
+    from qa_store import build_compact_dataset
+
+    parser = argparse.ArgumentParser(description="แสดง prompt ที่จัดจากแถวที่ค้นเจอภายในงบ token")
+    parser.add_argument("question")
+    parser.add_argument("--budget", type=int, default=DEFAULT_BUDGET)
+    parser.add_argument("--k", type=int, default=DEFAULT_TOP_K)
+    args = parser.parse_args()
+
+    df, _ = load_sources(get_dataset_sources())
+    dataset = build_compact_dataset(df)
+    prompt = build_prompt(args.question, dataset, budget=args.budget, k=args.k)
+    counter = "tiktoken" if get_encoding() is not None else "ประมาณ"
+    print(prompt["text"])
+    print(f"\n🧮 {prompt['tokens']}/{prompt['budget']} token ({counter}) | แถว {prompt['rows']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+# scorers.py
+# รวมตัวค้นหาคำตอบ (scorer) ทุกแบบ เลือกใช้ผ่าน environment และเปรียบเทียบแบบ shadow
+#
+# scorer คือฟังก์ชัน (user_input, dataset, context) -> (row_id หรือ None, คะแนน)
+#
+# วิธีใช้:
+#   EMBEDBOT_SCORER=vector streamlit run app.py
+#   EMBEDBOT_SHADOW_SCORER=bm25 streamlit run app.py    # รัน bm25 เทียบเงียบ ๆ
+#   python scorers.py --report                           # สรุปผล shadow จาก log
+#
+# shadow scorer รันใน thread แยก (ไม่อยู่ในเส้นทางตอบผู้ใช้) แล้วบันทึกเวลา
+# ผลที่ได้ และว่าตรงกับ scorer หลักหรือไม่ ลงไฟล์ JSON lines
+# ทุกคำถามถูกส่งให้ shadow รวมคำถามที่ตอบจาก cache (สถิติไม่เอียงไปทางคำถามที่ถามน้อย)
+# ไฟล์ log ใหญ่เกิน EMBEDBOT_SHADOW_LOG_MAX_MB จะถูกย้ายเป็น <ไฟล์>.1 (เก็บไว้ไฟล์เดียว)
+#
+# ผลของ scorer หลักถูกจำไว้ใน ResultCache ตาม (เวอร์ชัน dataset, scorer, คำถามที่
+# normalize แล้ว, บริบท) คำถามซ้ำจึงไม่ต้องค้นใหม่
+import argparse
+import json
+import os
+import queue
+import statistics
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import bm25
+import fts_store
+import lsa
+import matcher
+import vector_matcher
+from normalize import normalize_query, patch_question_texts, question_texts
+from spelling import correct_query, get_corrector, patch_word_counts, spelling_enabled
+
+SCORER_ENV = "EMBEDBOT_SCORER"
+SHADOW_ENV = "EMBEDBOT_SHADOW_SCORER"
+SHADOW_LOG_ENV = "EMBEDBOT_SHADOW_LOG"
+SHADOW_LOG_MAX_MB_ENV = "EMBEDBOT_SHADOW_LOG_MAX_MB"
+RESULT_CACHE_ENV = "EMBEDBOT_RESULT_CACHE_SIZE"
+DEFAULT_SCORER = "vector"
+
+# จำนวนผลการค้นหาที่จำไว้ (ทุก session ใช้ร่วมกัน)
+DEFAULT_RESULT_CACHE_SIZE = 4096
+
+# จำนวนงาน shadow ที่รอได้ ถ้าเต็มจะทิ้ง (ไม่ให้ shadow ถ่วงผู้ใช้)
+SHADOW_QUEUE_SIZE = 1000
+
+# ขนาดสูงสุดของไฟล์ log ของ shadow (MB) ก่อนย้ายเป็น <ไฟล์>.1
+DEFAULT_SHADOW_LOG_MAX_MB = 16
+
+# ชื่อ -> (ฟังก์ชันค้นหา, ฟังก์ชันเตรียม index ตอนโหลด dataset หรือ None,
+#         ฟังก์ชันสร้าง index จาก dataset ก่อนหน้าเมื่อเปลี่ยนไม่กี่แถว หรือ None)
+SCORERS = {}
+
+
+def register_scorer(name, find, prepare=None, patch=None):
+    """เพิ่ม scorer ใหม่ในระบบ"""
+    SCORERS[name] = (find, prepare, patch)
+
+
+register_scorer("legacy", matcher.best_match, question_texts)
+register_scorer("vector", vector_matcher.best_match, vector_matcher.get_index, vector_matcher.patch_index)
+register_scorer("bm25", bm25.best_match, bm25.get_index, bm25.patch_index)
+register_scorer("lsa", lsa.best_match, lsa.get_index)
+register_scorer("fts", fts_store.best_match, fts_store.prepare, fts_store.patch)
+
+
+def scorer_names():
+    return sorted(SCORERS)
+
+
+def get_primary_name():
+    """ชื่อ scorer หลัก (ค่าที่ไม่รู้จักจะใช้ค่าเริ่มต้น)"""
+    name = os.environ.get(SCORER_ENV, DEFAULT_SCORER).strip().lower()
+    return name if name in SCORERS else DEFAULT_SCORER
+
+
+def get_shadow_name():
+    """ชื่อ shadow scorer (None ถ้าไม่ได้เปิด หรือซ้ำกับ scorer หลัก)"""
+    name = os.environ.get(SHADOW_ENV, "").strip().lower()
+    if name in SCORERS and name != get_primary_name():
+        return name
+    return None
+
+
+def get_shadow_log_path():
+    return os.environ.get(SHADOW_LOG_ENV) or os.path.join(tempfile.gettempdir(), "embedbot_shadow.jsonl")
+
+
+def get_shadow_log_max_bytes():
+    try:
+        return max(0.0, float(os.environ.get(SHADOW_LOG_MAX_MB_ENV, DEFAULT_SHADOW_LOG_MAX_MB))) * 1024 * 1024
+    except ValueError:
+        return DEFAULT_SHADOW_LOG_MAX_MB * 1024 * 1024
+
+
+def prepare_scorers(dataset):
+    """สร้าง index ของ scorer หลักและ shadow ล่วงหน้า (เรียกตอนโหลด dataset)"""
+    if spelling_enabled() and not dataset.empty:
+        get_corrector(dataset)
+    for name in filter(None, (get_primary_name(), get_shadow_name())):
+        prepare = SCORERS[name][1]
+        if prepare is not None and not dataset.empty:
+            prepare(dataset)
+
+
+def patch_scorers(previous, dataset, changed_rows):
+    """เตรียม index ของ dataset ใหม่จากของ previous โดยทำใหม่เฉพาะแถวที่เปลี่ยน
+
+    ใช้เมื่อ row_id ของแถวที่ไม่เปลี่ยนยังเป็นแถวเดิม scorer ที่ไม่มีฟังก์ชัน patch (lsa)
+    สร้าง index ใหม่ทั้งชุด
+    """
+    if dataset.empty or previous.empty:
+        prepare_scorers(dataset)
+        return
+    patch_question_texts(previous, dataset, changed_rows)
+    if spelling_enabled():
+        patch_word_counts(previous, dataset, changed_rows)
+        get_corrector(dataset)
+    for name in filter(None, (get_primary_name(), get_shadow_name())):
+        _, prepare, patch = SCORERS[name]
+        if patch is not None:
+            patch(previous, dataset, changed_rows)
+        elif prepare is not None:
+            prepare(dataset)
+
+
+class ShadowRunner:
+    """thread เบื้องหลังที่รัน shadow scorer แล้วบันทึกผลเทียบกับ scorer หลัก"""
+
+    def __init__(self, name, log_path, max_bytes=None):
+        self.name = name
+        self.log_path = log_path
+        self.max_bytes = max_bytes if max_bytes is not None else get_shadow_log_max_bytes()
+        self.log_file = None
+        self.jobs = queue.Queue(maxsize=SHADOW_QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.compared = 0
+        self.agreed = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.run, name=f"shadow-{name}", daemon=True)
+        self.thread.start()
+
+    def submit(self, job):
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+
+    def run(self):
+        find = SCORERS[self.name][0]
+        while True:
+            job = self.jobs.get()
+            start = time.perf_counter()
+            try:
+                result = find(job["query"], job["dataset"], job["context"])[0]
+                error = None
+            except Exception as e:
+                result = None
+                error = str(e)
+            elapsed = time.perf_counter() - start
+
+            agree = error is None and result == job["primary_result"]
+            with self.lock:
+                self.compared += 1
+                self.agreed += agree
+
+            entry = {
+                "time": job["time"],
+                "version": job["dataset"].version,
+                "query": job["query"],
+                "primary": job["primary"],
+                "shadow": self.name,
+                "primary_result": job["primary_result"],
+                "shadow_result": result,
+                "primary_ms": round(job["primary_seconds"] * 1000, 3),
+                "shadow_ms": round(elapsed * 1000, 3),
+                "agree": agree,
+                "cached": job["cached"],
+            }
+            if error:
+                entry["error"] = error
+            self.write(entry)
+
+    def write(self, entry):
+        """เขียนหนึ่งบรรทัดลงไฟล์ที่เปิดค้างไว้ ย้ายไฟล์เป็น .1 เมื่อใหญ่เกิน max_bytes"""
+        try:
+            if self.log_file is None:
+                self.log_file = open(self.log_path, "a", encoding="utf-8")
+            self.log_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.log_file.flush()
+            if self.max_bytes and self.log_file.tell() >= self.max_bytes:
+                self.log_file.close()
+                self.log_file = None
+                os.replace(self.log_path, self.log_path + ".1")
+        except OSError:
+            if self.log_file is not None:
+                self.log_file.close()
+                self.log_file = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "shadow": self.name,
+                "compared": self.compared,
+                "agreement": self.agreed / self.compared if self.compared else None,
+                "dropped": self.dropped,
+            }
+
+
+_shadow = None
+_shadow_lock = threading.Lock()
+
+
+def get_shadow_runner():
+    """ShadowRunner ของ process (สร้างครั้งแรกที่ใช้) หรือ None ถ้าไม่ได้เปิด"""
+    global _shadow
+    name = get_shadow_name()
+    if name is None:
+        return None
+    with _shadow_lock:
+        if _shadow is None or _shadow.name != name:
+            _shadow = ShadowRunner(name, get_shadow_log_path())
+        return _shadow
+
+
+class ResultCache:
+    """LRU ของผลการค้นหา: (เวอร์ชัน, scorer, คำถาม, รหัสหมวดหมู่, รหัสหัวข้อย่อย) -> (row_id, คะแนน)"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(user_input, dataset, context, scorer):
+        context = context or {}
+        return (
+            dataset.version,
+            scorer,
+            normalize_query(user_input)[0],
+            dataset.category_code(context.get('last_category')),
+            dataset.subcategory_code(context.get('last_subcategory')),
+        )
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else None,
+            }
+
+
+def get_result_cache_size():
+    try:
+        return max(0, int(os.environ.get(RESULT_CACHE_ENV, DEFAULT_RESULT_CACHE_SIZE)))
+    except ValueError:
+        return DEFAULT_RESULT_CACHE_SIZE
+
+
+result_cache = ResultCache(get_result_cache_size())
+
+
+def search(user_input, dataset, context, shadow=True):
+    """ค้นหาด้วย scorer หลัก (ใช้ผลที่จำไว้ถ้ามี) แล้วส่งงานให้ shadow scorer ทำต่อเบื้องหลัง
+
+    คำภาษาอังกฤษที่พิมพ์ผิดจะถูกแก้ก่อนส่งให้ทุก scorer
+    shadow=False ไม่ส่งให้ shadow (ใช้กับคำถามที่ไม่ได้มาจากผู้ใช้ เช่น warm-up)
+    คืนค่า {"row", "score", "cached", "scorer"}
+    """
+    primary = get_primary_name()
+    start = time.perf_counter()
+    key = ResultCache.key(user_input, dataset, context, primary)
+    cached = result_cache.get(key)
+    if cached is not None:
+        row, score, corrected = cached
+    else:
+        corrected = correct_query(user_input, dataset)
+        row, score = SCORERS[primary][0](corrected, dataset, context)
+        result_cache.put(key, (row, score, corrected))
+    # เวลาจริงของคำถามนี้ (ผลจากแคชคือเวลาค้นแคช) shadow log ติด cached ไว้ให้ --report แยกออก
+    elapsed = time.perf_counter() - start
+
+    runner = get_shadow_runner() if shadow else None
+    if runner is not None:
+        runner.submit({
+            "time": time.time(),
+            "query": corrected,
+            "dataset": dataset,
+            "context": dict(context or {}),
+            "primary": primary,
+            "primary_result": row,
+            "primary_seconds": elapsed,
+            "cached": cached is not None,
+        })
+    return {"row": row, "score": score, "cached": cached is not None, "scorer": primary}
+
+
+def find_best_match(user_input, dataset, context):
+    """ค้นหาด้วย scorer หลัก คืนค่าลำดับแถว (row_id) หรือ None"""
+    return search(user_input, dataset, context)["row"]
+
+
+def read_shadow_log(path):
+    """รายการจากไฟล์ log ก่อนหน้า (.1) และไฟล์ปัจจุบัน"""
+    entries = []
+    for file_path in (path + ".1", path):
+        try:
+            with open(file_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            continue
+    return entries
+
+
+def summarize_shadow_log(entries, samples=10):
+    """สรุป agreement rate, เวลา p50/p95 และตัวอย่างคำถามที่ผลต่างกัน"""
+    def latency(values):
+        if not values:
+            return {}
+        ordered = sorted(values)
+        return {
+            "p50_ms": round(statistics.median(ordered), 3),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        }
+
+    summary = {}
+    for entry in entries:
+        key = f"{entry['primary']} vs {entry['shadow']}"
+        summary.setdefault(key, []).append(entry)
+
+    report = {}
+    for key, group in summary.items():
+        disagreements = [e for e in group if not e["agree"]]
+        # เทียบเวลาเฉพาะคำถามที่ scorer หลักค้นจริง (shadow ค้นจริงทุกครั้ง ไม่มีแคช)
+        searched = [e for e in group if not e.get("cached")]
+        report[key] = {
+            "compared": len(group),
+            "cached": len(group) - len(searched),
+            "agreement": round(1 - len(disagreements) / len(group), 4),
+            "primary_latency": latency([e["primary_ms"] for e in searched]),
+            "shadow_latency": latency([e["shadow_ms"] for e in searched]),
+            "disagreements": [
+                {"query": e["query"], "primary": e["primary_result"], "shadow": e["shadow_result"]}
+                for e in disagreements[-samples:]
+            ],
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="สรุปผลการเปรียบเทียบ scorer แบบ shadow")
+    parser.add_argument("--report", action="store_true", help="สรุปผลจากไฟล์ log")
+    parser.add_argument("--log", help="ไฟล์ log (ค่าเริ่มต้นจาก EMBEDBOT_SHADOW_LOG)")
+    parser.add_argument("--samples", type=int, default=10, help="จำนวนตัวอย่างคำถามที่ผลต่างกัน")
+    args = parser.parse_args()
+
+    if not args.report:
+        print(f"scorer ที่มี: {', '.join(scorer_names())}")
+        print(f"scorer หลัก: {get_primary_name()} | shadow: {get_shadow_name() or '-'}")
+        return
+
+    path = args.log or get_shadow_log_path()
+    report = summarize_shadow_log(read_shadow_log(path), args.samples)
+    if not report:
+        print(f"⚠️ ไม่มีข้อมูลใน {path}")
+        return
+    for key, data in report.items():
+        print(f"\n🔀 {key}: เทียบ {data['compared']} ครั้ง | ตรงกัน {data['agreement']:.1%}")
+        print(f"  • เวลา scorer หลัก {data['primary_latency']} | shadow {data['shadow_latency']} "
+              f"(ไม่นับ {data['cached']} ครั้งที่ใช้ผลจากแคช)")
+        for item in data["disagreements"]:
+            print(f"  • \"{item['query']}\" หลัก={item['primary']} shadow={item['shadow']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# session_store.py
+# จำกัดหน่วยความจำของประวัติการสนทนาต่อผู้ใช้
+#
+# session ที่ไม่ได้ใช้งาน (idle) จะถูกบีบอัดด้วย zlib ก่อน ถ้ายังเกินงบ
+# จะย้ายไปเก็บเป็นไฟล์ (spill) และโหลดกลับเมื่อสลับไปใช้ (switch_session)
+# ไฟล์ spill ที่เก่ากว่า SPILL_MAX_HOURS ชั่วโมงถูกลบตอนเขียน spill ใหม่
+# (browser session ที่ปิดไปแล้วไม่ได้ลบไฟล์ของตัวเอง) ไฟล์ของ session ที่ยังใช้งานอยู่
+# ถูกต่ออายุทุกครั้งที่ enforce_budget ทำงาน ถ้าไฟล์หายไปแล้วตอนโหลดกลับ session
+# จะถูกติด expired ไว้ให้ UI แจ้งว่าประวัติหมดอายุ
+import glob
+import json
+import os
+import tempfile
+import time
+import uuid
+import zlib
+
+# งบหน่วยความจำต่อผู้ใช้ (KB) กำหนดผ่าน environment ได้
+BUDGET_ENV = "EMBEDBOT_SESSION_BUDGET_KB"
+DEFAULT_BUDGET_KB = 512
+
+# โฟลเดอร์เก็บ session ที่ถูกย้ายออกจากหน่วยความจำ
+SPILL_DIR_ENV = "EMBEDBOT_SPILL_DIR"
+
+# อายุสูงสุดของไฟล์ spill (ชั่วโมง) และระยะห่างขั้นต่ำระหว่างการล้างไฟล์ (วินาที)
+SPILL_MAX_HOURS_ENV = "EMBEDBOT_SPILL_MAX_HOURS"
+DEFAULT_SPILL_MAX_HOURS = 24
+CLEANUP_INTERVAL = 600
+
+# โฟลเดอร์ -> เวลาที่ล้างไฟล์ครั้งล่าสุด
+_last_cleanup = {}
+
+# สถานะของ session
+STATE_LIVE = "live"
+STATE_COMPRESSED = "compressed"
+STATE_SPILLED = "spilled"
+
+
+def get_budget_bytes():
+    """งบหน่วยความจำต่อผู้ใช้ (bytes)"""
+    try:
+        return int(float(os.environ.get(BUDGET_ENV, DEFAULT_BUDGET_KB)) * 1024)
+    except ValueError:
+        return DEFAULT_BUDGET_KB * 1024
+
+
+def get_spill_dir():
+    """โฟลเดอร์สำหรับไฟล์ spill (สร้างถ้ายังไม่มี)"""
+    path = os.environ.get(SPILL_DIR_ENV) or os.path.join(tempfile.gettempdir(), "embedbot_sessions")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_spill_max_seconds():
+    try:
+        return max(0.0, float(os.environ.get(SPILL_MAX_HOURS_ENV, DEFAULT_SPILL_MAX_HOURS))) * 3600
+    except ValueError:
+        return DEFAULT_SPILL_MAX_HOURS * 3600
+
+
+def cleanup_spill_dir(spill_dir, max_seconds=None):
+    """ลบไฟล์ spill ที่ไม่ได้แก้ไขนานกว่า max_seconds คืนค่าจำนวนไฟล์ที่ลบ"""
+    if max_seconds is None:
+        max_seconds = get_spill_max_seconds()
+    if not max_seconds:
+        return 0
+    cutoff = time.time() - max_seconds
+    removed = 0
+    for path in glob.glob(os.path.join(glob.escape(spill_dir), "*.json.z")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+def maybe_cleanup_spill_dir(spill_dir):
+    """ล้างไฟล์ spill เก่า ไม่เกินหนึ่งครั้งต่อ CLEANUP_INTERVAL วินาที"""
+    now = time.monotonic()
+    last = _last_cleanup.get(spill_dir)
+    if last is not None and now - last < CLEANUP_INTERVAL:
+        return 0
+    _last_cleanup[spill_dir] = now
+    return cleanup_spill_dir(spill_dir)
+
+
+def messages_size(messages):
+    """ประมาณขนาดของข้อความในหน่วยความจำ (bytes ของข้อความทั้งหมด)"""
+    total = 0
+    for message in messages:
+        for value in message.values():
+            if isinstance(value, str):
+                total += len(value.encode("utf-8"))
+    return total
+
+
+def session_state_of(session):
+    """สถานะปัจจุบันของ session (live / compressed / spilled)"""
+    return session.get("storage", STATE_LIVE)
+
+
+def session_memory(session):
+    """หน่วยความจำที่ session ใช้อยู่ตอนนี้ (bytes)"""
+    state = session_state_of(session)
+    if state == STATE_COMPRESSED:
+        return len(session.get("messages_blob") or b"")
+    if state == STATE_SPILLED:
+        return 0
+    if "size" not in session:
+        session["size"] = messages_size(session.get("messages") or [])
+    return session["size"]
+
+
+def session_question_count(session):
+    """จำนวนคำถามของผู้ใช้ใน session (ไม่ต้องคลายการบีบอัด)"""
+    if session_state_of(session) == STATE_LIVE:
+        session["question_count"] = len([m for m in session["messages"] if m["role"] == "user"])
+    return session.get("question_count", 0)
+
+
+def touch_session(session):
+    """บันทึกเวลาใช้งานล่าสุด และคำนวณขนาดใหม่หลังข้อความเปลี่ยน"""
+    session["last_active"] = time.time()
+    if session_state_of(session) == STATE_LIVE:
+        session["size"] = messages_size(session["messages"])
+        session_question_count(session)
+
+
+def encode_messages(messages):
+    return zlib.compress(json.dumps(messages, ensure_ascii=False).encode("utf-8"), 6)
+
+
+def decode_messages(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def compress_session(session):
+    """บีบอัดข้อความของ session (live -> compressed)"""
+    if session_state_of(session) != STATE_LIVE:
+        return
+    session_question_count(session)
+    session["messages_blob"] = encode_messages(session["messages"])
+    session["messages"] = None
+    session["storage"] = STATE_COMPRESSED
+
+
+def spill_session(session, spill_dir=None):
+    """ย้ายข้อความที่บีบอัดแล้วไปเก็บในไฟล์ (compressed -> spilled)"""
+    if session_state_of(session) == STATE_LIVE:
+        compress_session(session)
+    if session_state_of(session) != STATE_COMPRESSED:
+        return
+
+    spill_dir = spill_dir or get_spill_dir()
+    maybe_cleanup_spill_dir(spill_dir)
+    path = os.path.join(spill_dir, f"{uuid.uuid4().hex}.json.z")
+    with open(path, "wb") as f:
+        f.write(session["messages_blob"])
+    session["spill_path"] = path
+    session["messages_blob"] = None
+    session["storage"] = STATE_SPILLED
+
+
+def restore_session(session):
+    """โหลดข้อความกลับเข้าหน่วยความจำ (ใช้ตอน switch_session)"""
+    state = session_state_of(session)
+    if state == STATE_LIVE:
+        return session["messages"]
+
+    if state == STATE_SPILLED:
+        path = session.get("spill_path")
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+            os.remove(path)
+        except (OSError, TypeError):
+            blob = None
+            # ไฟล์ถูกลบไปแล้ว (ไม่ได้ใช้งานนานเกิน SPILL_MAX_HOURS)
+            session["expired"] = True
+        session["spill_path"] = None
+    else:
+        blob = session.get("messages_blob")
+
+    session["messages"] = decode_messages(blob) if blob else []
+    session["messages_blob"] = None
+    session["storage"] = STATE_LIVE
+    touch_session(session)
+    return session["messages"]
+
+
+def discard_session(session):
+    """ลบไฟล์ spill ของ session (ใช้ตอนลบ session)"""
+    path = session.get("spill_path")
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        session["spill_path"] = None
+
+
+def keep_spills(sessions):
+    """ต่ออายุไฟล์ spill ของ session ที่ยังอยู่ ไม่ให้ cleanup_spill_dir ลบ"""
+    for session in sessions:
+        path = session.get("spill_path")
+        if path and session_state_of(session) == STATE_SPILLED:
+            try:
+                os.utime(path)
+            except OSError:
+                continue
+
+
+def total_memory(sessions):
+    """หน่วยความจำรวมของทุก session (bytes)"""
+    return sum(session_memory(session) for session in sessions)
+
+
+def enforce_budget(sessions, active_id, budget_bytes=None, spill_dir=None):
+    """ถ้าใช้หน่วยความจำเกินงบ บีบอัด/ย้าย session ที่ไม่ได้ใช้นานที่สุดก่อน
+
+    session ที่กำลังใช้งาน (active_id) จะไม่ถูกแตะ
+    ขั้นแรกบีบอัดทุก session ที่ idle ตามลำดับ ถ้ายังเกินจึงย้ายไปไฟล์
+    ไฟล์ spill ของทุก session ใน sessions ถูกต่ออายุทุกครั้งที่เรียก
+    """
+    if budget_bytes is None:
+        budget_bytes = get_budget_bytes()
+
+    keep_spills(sessions)
+    used = total_memory(sessions)
+    if used <= budget_bytes:
+        return used
+
+    idle = sorted(
+        (s for s in sessions if s["id"] != active_id),
+        key=lambda s: s.get("last_active", 0)
+    )
+
+    for step in (compress_session, spill_session):
+        for session in idle:
+            if used <= budget_bytes:
+                return used
+            before = session_memory(session)
+            if step is spill_session:
+                step(session, spill_dir)
+            else:
+                step(session)
+            used -= before - session_memory(session)
+
+    return used
@@ -0,0 +1,176 @@
+# sharded.py
+# ค้นหาแบบแบ่งแถวของ dataset (shard) ไปหลาย worker process แล้วรวมผล
+#
+# แต่ละ worker ถือ index ของ shard ตัวเอง (สร้างครั้งเดียวตอนเริ่ม pool)
+# แล้วคืนค่า top-k ของ shard ให้ตัวประสาน (coordinator) รวมผล กติกาการรวม
+# (คะแนนมากก่อน คะแนนเท่ากันแถวที่อยู่ก่อนชนะ, exact match แถวแรกชนะ)
+# ทำให้ผลเหมือนการค้นหาด้วย vector_matcher ใน process เดียวทุกประการ
+#
+# เหมาะกับการให้คะแนนคำถามทีละมาก ๆ (batch) และ dataset ที่ใหญ่มาก
+#
+# วิธีใช้ (เทียบผลและวัด throughput กับ dataset ที่ขยายขนาด):
+#   python sharded.py --replicate 200 --workers 1,2,4 --queries 200
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from qa_store import CompactDataset, QARecord
+import vector_matcher
+
+# จำนวนคำถามต่อการส่งงานหนึ่งครั้งให้ worker (ลด overhead ของการสื่อสารระหว่าง process)
+BATCH_SIZE = 64
+
+# shard ของ worker process นี้ (ตั้งค่าตอนเริ่ม worker)
+_shard = None
+
+
+def init_worker(records, categories, subcategories):
+    """สร้าง dataset และ index ของ shard ใน worker (ครั้งเดียวต่อ worker)"""
+    global _shard
+    _shard = CompactDataset(records, categories, subcategories, quick_questions={}, stats={})
+    vector_matcher.get_index(_shard)
+
+
+def search_shard(queries, k):
+    """top-k ของ shard สำหรับคำถามทุกข้อใน batch"""
+    return [vector_matcher.top_matches(query, _shard, context, k) for query, context in queries]
+
+
+def merge_results(parts, k=1):
+    """รวมผลจากทุก shard ของคำถามหนึ่งข้อ คืนค่า (exact, [(คะแนน, row_id)], threshold)"""
+    exact_rows = [exact for exact, _, _ in parts if exact is not None]
+    threshold = parts[0][2]
+    if exact_rows:
+        return min(exact_rows), [], threshold
+    matches = sorted((m for _, shard_matches, _ in parts for m in shard_matches), key=lambda m: (-m[0], m[1]))
+    return None, matches[:k], threshold
+
+
+def best_of(merged):
+    """แปลงผลที่รวมแล้วเป็นคำตอบแบบ find_best_match"""
+    exact, matches, threshold = merged
+    if exact is not None:
+        return exact
+    if matches and matches[0][0] >= threshold:
+        return matches[0][1]
+    return None
+
+
+def split_records(records, shards):
+    """แบ่งแถวเป็นช่วงต่อเนื่องเท่า ๆ กัน (row_id เดิมไม่เปลี่ยน)"""
+    records = list(records)
+    size = -(-len(records) // shards) if records else 0
+    return [records[i:i + size] for i in range(0, len(records), size)] if size else []
+
+
+class ShardedSearcher:
+    """ตัวประสานการค้นหาแบบหลาย shard
+
+    ใช้แบบ context manager เพื่อปิด worker เมื่อเลิกใช้:
+        with ShardedSearcher(dataset, workers=4) as searcher:
+            results = searcher.search_many(queries)
+    """
+
+    def __init__(self, dataset, workers=None):
+        self.dataset = dataset
+        workers = workers or os.cpu_count() or 1
+        self.shards = split_records(dataset.records, workers)
+        context = multiprocessing.get_context("spawn")
+        # หนึ่ง executor ต่อ shard เพื่อให้ shard อยู่กับ worker ของตัวเองตลอด
+        self.executors = [
+            ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=init_worker,
+                initargs=(shard, dataset.categories, dataset.subcategories),
+            )
+            for shard in self.shards
+        ]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for executor in self.executors:
+            executor.shutdown()
+        self.executors = []
+
+    def search_many(self, queries, contexts=None, k=1):
+        """ค้นหาคำถามหลายข้อ คืนค่า row_id (หรือ None) ตามลำดับคำถาม"""
+        return [best_of(merged) for merged in self.top_many(queries, contexts, k)]
+
+    def top_many(self, queries, contexts=None, k=1):
+        """ผลที่รวมจากทุก shard ของคำถามแต่ละข้อ (exact, [(คะแนน, row_id)], threshold)"""
+        if not self.executors:
+            return [(None, [], 0.3) for _ in queries]
+        contexts = contexts or [{}] * len(queries)
+        pairs = list(zip(queries, contexts))
+        batches = [pairs[i:i + BATCH_SIZE] for i in range(0, len(pairs), BATCH_SIZE)]
+
+        # ส่งทุก batch ให้ทุก shard พร้อมกัน แล้วรวมผลตามลำดับเดิม
+        futures = [[executor.submit(search_shard, batch, k) for batch in batches] for executor in self.executors]
+        per_shard = [[result for future in shard_futures for result in future.result()] for shard_futures in futures]
+        return [merge_results(parts, k) for parts in zip(*per_shard)]
+
+    def find_best_match(self, user_input, context=None):
+        return self.search_many([user_input], [context or {}])[0]
+
+
+def replicate_dataset(dataset, times):
+    """ขยาย dataset ด้วยการคัดลอกแถวพร้อมเติมรหัสท้ายคำถาม (ใช้ทดสอบเท่านั้น)"""
+    records = []
+    for copy in range(times):
+        for record in dataset.records:
+            suffix = f" ชุด{copy}" if copy else ""
+            records.append(QARecord(
+                len(records), record.category_code, record.subcategory_code,
+                record.question + suffix, record.answer, record.synonyms, record.image_url,
+                tuple(alias + suffix for alias in record.aliases),
+            ))
+    return CompactDataset(records, dataset.categories, dataset.subcategories)
+
+
+def main():
+    from ingest import get_dataset_sources, load_sources
+    from qa_store import build_compact_dataset
+
+    parser = argparse.ArgumentParser(description="ค้นหาแบบหลาย shard: เทียบผลกับ process เดียวและวัด throughput")
+    parser.add_argument("--replicate", type=int, default=100, help="ขยาย dataset กี่เท่า")
+    parser.add_argument("--workers", default="1,2,4", help="จำนวน worker ที่จะทดสอบ")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    df, _ = load_sources(get_dataset_sources())
+    dataset = replicate_dataset(build_compact_dataset(df), args.replicate)
+    rng = random.Random(args.seed)
+    base = [r.question for r in dataset.records[:200]]
+    queries = [" ".join(rng.sample(q.split(), len(q.split()))) for q in rng.choices(base, k=args.queries)]
+    print(f"📚 {len(dataset)} แถว | {len(queries)} คำถาม")
+
+    # สร้าง index ก่อนจับเวลา (shard ก็สร้าง index เสร็จก่อนจับเวลาเหมือนกัน)
+    vector_matcher.get_index(dataset)
+    start = time.perf_counter()
+    expected = [vector_matcher.find_best_match(q, dataset, {}) for q in queries]
+    single = time.perf_counter() - start
+    print(f"• process เดียว        {len(queries) / single:8.1f} คำถาม/วินาที")
+
+    for workers in [int(w) for w in args.workers.split(",")]:
+        with ShardedSearcher(dataset, workers) as searcher:
+            searcher.search_many(queries[:1])  # รอให้ทุก worker สร้าง index เสร็จ
+            start = time.perf_counter()
+            found = searcher.search_many(queries)
+            elapsed = time.perf_counter() - start
+        same = sum(a == b for a, b in zip(found, expected))
+        print(f"• {workers} shard{'s' if workers > 1 else ' '}            {len(queries) / elapsed:8.1f} คำถาม/วินาที "
+              f"(เร็วขึ้น {single / elapsed:.2f} เท่า) | ผลตรงกัน {same}/{len(queries)}")
+
+
+if __name__ == "__main__":
+    main()
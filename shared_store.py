@@ -0,0 +1,382 @@
+# shared_store.py
+# เผยแพร่ dataset และ index ที่เตรียมแล้วเป็นไฟล์ memory-mapped ให้ทุก worker process ใช้ร่วมกัน
+#
+# เมื่อรัน Streamlit หลาย process (หลัง load balancer) process แรกที่โหลดข้อมูล
+# จะ parse Excel แล้วเขียนผลลง EMBEDBOT_SHARED_DIR process อื่นแค่ mmap ไฟล์
+# (ไม่ต้อง parse ใหม่ และหน้าหน่วยความจำของไฟล์ใช้ร่วมกันผ่าน page cache)
+#
+# โครงสร้างไฟล์ (แยกโฟลเดอร์ตามเวอร์ชัน เขียนเสร็จแล้วค่อยเปลี่ยน CURRENT):
+#   <dir>/CURRENT                         ชื่อโฟลเดอร์เวอร์ชันปัจจุบัน
+#   <dir>/<version>-<fingerprint>-f<format>/
+#       manifest.json                     เวอร์ชัน, หมวดหมู่, สถิติ, รายชื่อไฟล์
+#       <column>.bin + <column>.off.npy   ข้อความ UTF-8 ต่อกัน + offset ของแต่ละแถว
+#       <array>.npy                       รหัสหมวดหมู่ และเมทริกซ์ของ vector_matcher
+#
+# process ที่เริ่มพร้อมกันถือ lock (fcntl.flock บน <dir>/.lock) ระหว่าง "แนบ หรือสร้างแล้วเผยแพร่"
+# process แรกเป็นคน parse ที่เหลือรอแล้วแนบผล (บน Windows ไม่มี flock จึงอาจ parse ซ้ำได้)
+#
+# ใช้ร่วมกัน: records, index ของ vector_matcher, คำถามที่ normalize แล้ว และจำนวนคำของ spelling
+# ยังสร้างเองทุก process: deletion index ของ spelling (จากคำที่ไม่ซ้ำไม่กี่ร้อยคำ)
+# และ index ของ scorer อื่น (bm25 / lsa / fts) ถ้าเลือกใช้
+#
+# วิธีใช้:
+#   EMBEDBOT_SHARED_DIR=/dev/shm/embedbot streamlit run app.py --server.port 8501
+#   EMBEDBOT_SHARED_DIR=/dev/shm/embedbot streamlit run app.py --server.port 8502
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from collections import Counter
+
+import numpy as np
+
+from normalize import question_texts
+from qa_store import CompactDataset, QARecord
+from spelling import word_counts
+from vector_matcher import QuestionIndex, get_index
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+SHARED_DIR_ENV = "EMBEDBOT_SHARED_DIR"
+FORMAT_VERSION = 5
+
+LOCK_NAME = ".lock"
+
+# จำนวนโฟลเดอร์เวอร์ชันเก่าที่เก็บไว้ (worker ที่ยัง map เวอร์ชันเก่าอยู่ใช้ต่อได้)
+KEEP_VERSIONS = 3
+
+# ตัวคั่นคำถามอื่น (alias) ภายในแถว
+ALIAS_JOIN = "\x1f"
+
+RECORD_COLUMNS = ("question", "answer", "synonyms", "image_url", "aliases")
+
+
+def get_shared_dir():
+    """โฟลเดอร์ที่ใช้ร่วมกัน (None ถ้าไม่ได้เปิดโหมดนี้)"""
+    return os.environ.get(SHARED_DIR_ENV) or None
+
+
+def fingerprint_key(fingerprint):
+    """แปลง fingerprint ของไฟล์ต้นทางเป็นข้อความสั้น ๆ"""
+    return hashlib.sha1(repr(fingerprint).encode("utf-8")).hexdigest()[:12]
+
+
+def text_hash(text):
+    """hash 64 บิตของข้อความ (ใช้ค้นหาแบบ searchsorted แทน dict)"""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+class MappedStrings:
+    """รายการข้อความที่เก็บเป็น UTF-8 ต่อกัน ถอดรหัสเฉพาะตัวที่ถูกอ่าน"""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class HashedLookup:
+    """ข้อความ -> ตำแหน่ง ด้วย hash ที่เรียงไว้ (ใช้แทน dict โดยไม่ต้องสร้าง object ต่อ process)"""
+
+    def __init__(self, hashes, positions, strings, values=None):
+        self.hashes = hashes
+        self.positions = positions
+        self.strings = strings
+        self.values = values
+
+    def get(self, text, default=None):
+        key = text_hash(text)
+        i = int(np.searchsorted(self.hashes, key))
+        while i < len(self.hashes) and self.hashes[i] == key:
+            position = int(self.positions[i])
+            if self.strings[position] == text:
+                return int(self.values[position]) if self.values is not None else position
+            i += 1
+        return default
+
+    def __contains__(self, text):
+        return self.get(text) is not None
+
+    def __getitem__(self, text):
+        value = self.get(text)
+        if value is None:
+            raise KeyError(text)
+        return value
+
+
+class MappedQuestionTexts:
+    """ผลของ normalize.question_texts ที่เก็บเป็นข้อความต่อกัน (tuple ต่อแถวเมื่อถูกอ่าน)"""
+
+    def __init__(self, strings):
+        self.strings = strings
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __getitem__(self, row_id):
+        return tuple(self.strings[row_id].split(ALIAS_JOIN))
+
+    def __iter__(self):
+        for row_id in range(len(self)):
+            yield self[row_id]
+
+
+class MappedRecords:
+    """records ของ dataset ที่สร้าง QARecord เมื่อถูกอ่าน (ไม่เก็บ object ทุกแถวไว้)"""
+
+    def __init__(self, columns, category_codes, subcategory_codes):
+        self.columns = columns
+        self.category_codes = category_codes
+        self.subcategory_codes = subcategory_codes
+
+    def __len__(self):
+        return len(self.category_codes)
+
+    def __getitem__(self, row_id):
+        if row_id < 0:
+            row_id += len(self)
+        aliases = self.columns["aliases"][row_id]
+        return QARecord(
+            row_id,
+            int(self.category_codes[row_id]),
+            int(self.subcategory_codes[row_id]),
+            self.columns["question"][row_id],
+            self.columns["answer"][row_id],
+            self.columns["synonyms"][row_id],
+            self.columns["image_url"][row_id],
+            tuple(aliases.split(ALIAS_JOIN)) if aliases else (),
+        )
+
+    def __iter__(self):
+        for row_id in range(len(self)):
+            yield self[row_id]
+
+
+def write_strings(folder, name, values):
+    encoded = [str(value).encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    with open(os.path.join(folder, f"{name}.bin"), "wb") as f:
+        for b in encoded:
+            f.write(b)
+    np.save(os.path.join(folder, f"{name}.off.npy"), offsets)
+
+
+def read_strings(folder, name):
+    offsets = np.load(os.path.join(folder, f"{name}.off.npy"), mmap_mode="r")
+    path = os.path.join(folder, f"{name}.bin")
+    if os.path.getsize(path):
+        blob = np.memmap(path, dtype=np.uint8, mode="r")
+    else:
+        blob = np.zeros(0, dtype=np.uint8)
+    return MappedStrings(blob, offsets)
+
+
+def lookup_arrays(strings):
+    """hash ที่เรียงแล้วและตำแหน่งของข้อความ (ข้อความซ้ำเก็บตำแหน่งแรก)"""
+    first = {}
+    for position, text in enumerate(strings):
+        first.setdefault(text, position)
+    pairs = sorted((text_hash(text), position) for text, position in first.items())
+    hashes = np.array([h for h, _ in pairs], dtype=np.int64)
+    positions = np.array([p for _, p in pairs], dtype=np.int32)
+    return hashes, positions
+
+
+def publish(dataset, fingerprint, messages=(), shared_dir=None):
+    """เขียน dataset และ index ลงโฟลเดอร์เวอร์ชันใหม่ แล้วชี้ CURRENT ไปที่โฟลเดอร์นั้น"""
+    shared_dir = shared_dir or get_shared_dir()
+    os.makedirs(shared_dir, exist_ok=True)
+    # ใส่ FORMAT_VERSION ในชื่อ โฟลเดอร์ของรูปแบบเก่าจะไม่ถูกใช้ซ้ำ
+    name = f"{dataset.version}-{fingerprint_key(fingerprint)}-f{FORMAT_VERSION}"
+    final = os.path.join(shared_dir, name)
+
+    if not os.path.exists(final):
+        tmp = os.path.join(shared_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp)
+        try:
+            write_version(tmp, dataset, fingerprint, messages)
+            os.rename(tmp, final)
+        except OSError:
+            # process อื่นเขียนเวอร์ชันเดียวกันเสร็จก่อน
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.exists(final):
+                raise
+
+    pointer = os.path.join(shared_dir, f".CURRENT-{uuid.uuid4().hex}")
+    with open(pointer, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(pointer, os.path.join(shared_dir, "CURRENT"))
+
+    remove_old_versions(shared_dir, keep=name)
+    return final
+
+
+def attach_or_publish(fingerprint, build, shared_dir=None):
+    """แนบเวอร์ชันที่เผยแพร่แล้ว หรือสร้างด้วย build() แล้วเผยแพร่
+
+    build() คืนค่า (CompactDataset, messages) ถูกเรียกโดย process เดียวต่อเวอร์ชัน
+    process อื่นที่เริ่มพร้อมกันรอ lock แล้วแนบผลแทนการ parse ซ้ำ
+    """
+    shared_dir = shared_dir or get_shared_dir()
+    attached = attach(fingerprint, shared_dir)
+    if attached is not None:
+        return attached
+
+    os.makedirs(shared_dir, exist_ok=True)
+    with open(os.path.join(shared_dir, LOCK_NAME), "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            # process ที่ถือ lock ก่อนอาจเผยแพร่เสร็จแล้วระหว่างรอ
+            attached = attach(fingerprint, shared_dir)
+            if attached is not None:
+                return attached
+            dataset, messages = build()
+            if dataset.empty:
+                return dataset, messages
+            publish(dataset, fingerprint, messages, shared_dir)
+            return attach(fingerprint, shared_dir) or (dataset, messages)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_version(folder, dataset, fingerprint, messages):
+    records = dataset.records
+    columns = {
+        "question": [r.question for r in records],
+        "answer": [r.answer for r in records],
+        "synonyms": [r.synonyms for r in records],
+        "image_url": [r.image_url for r in records],
+        "aliases": [ALIAS_JOIN.join(r.aliases) for r in records],
+    }
+    for column, values in columns.items():
+        write_strings(folder, column, values)
+
+    arrays = {
+        "category_code": np.array([r.category_code for r in records], dtype=np.int32),
+        "subcategory_code": np.array([r.subcategory_code for r in records], dtype=np.int32),
+    }
+
+    # index ของ vector_matcher (scorer ค่าเริ่มต้น)
+    index = get_index(dataset)
+    write_strings(folder, "index_texts", index.texts)
+    write_strings(folder, "index_vocab", index.vocab)
+    # exact match: ข้อความคำถาม (รวม alias) -> แถวแรกที่มีข้อความนี้
+    write_strings(folder, "exact_texts", list(index.exact))
+    arrays.update({
+        "index_owners": index.owners,
+        "index_tokens": index.tokens,
+        "index_unique_tokens": index.unique_tokens,
+        "index_unique_counts": index.unique_counts,
+        "index_category_codes": index.category_codes,
+        "index_subcategory_codes": index.subcategory_codes,
+    })
+    arrays["exact_owners"] = np.array(list(index.exact.values()), dtype=np.int32)
+    arrays["exact_hashes"], arrays["exact_positions"] = lookup_arrays(list(index.exact))
+    arrays["vocab_hashes"], arrays["vocab_positions"] = lookup_arrays(index.vocab)
+
+    # คำถามที่ normalize แล้ว (scorer อื่นและ fts ใช้) และจำนวนคำของ spelling
+    write_strings(folder, "question_texts", [ALIAS_JOIN.join(q) for q in question_texts(dataset)])
+    counts = word_counts(dataset)
+    write_strings(folder, "spelling_words", list(counts))
+    arrays["spelling_counts"] = np.array(list(counts.values()), dtype=np.int64)
+
+    for array_name, array in arrays.items():
+        np.save(os.path.join(folder, f"{array_name}.npy"), np.ascontiguousarray(array))
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "version": dataset.version,
+        "fingerprint": fingerprint_key(fingerprint),
+        "created": time.time(),
+        "rows": len(records),
+        "categories": list(dataset.categories),
+        "subcategories": list(dataset.subcategories),
+        "quick_questions": dataset.quick_questions,
+        "stats": dataset.stats,
+        "messages": [list(m) for m in messages],
+        "strings": list(columns) + ["index_texts", "index_vocab", "exact_texts", "question_texts", "spelling_words"],
+        "arrays": list(arrays),
+    }
+    with open(os.path.join(folder, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+
+def remove_old_versions(shared_dir, keep):
+    """ลบโฟลเดอร์เวอร์ชันเก่า เหลือไว้ KEEP_VERSIONS โฟลเดอร์ล่าสุด"""
+    folders = [
+        os.path.join(shared_dir, name) for name in os.listdir(shared_dir)
+        if not name.startswith(".") and name != keep and os.path.isdir(os.path.join(shared_dir, name))
+    ]
+    folders.sort(key=os.path.getmtime, reverse=True)
+    for folder in folders[KEEP_VERSIONS - 1:]:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def attach(fingerprint=None, shared_dir=None):
+    """แนบ dataset เวอร์ชันปัจจุบันแบบ mmap คืนค่า (CompactDataset, messages) หรือ None
+
+    ถ้าระบุ fingerprint แล้วไม่ตรงกับเวอร์ชันที่เผยแพร่ไว้ (ไฟล์ต้นทางเปลี่ยน) คืนค่า None
+    """
+    shared_dir = shared_dir or get_shared_dir()
+    try:
+        with open(os.path.join(shared_dir, "CURRENT"), encoding="utf-8") as f:
+            folder = os.path.join(shared_dir, f.read().strip())
+        with open(os.path.join(folder, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, TypeError, ValueError):
+        return None
+
+    if manifest.get("format") != FORMAT_VERSION:
+        return None
+    if fingerprint is not None and manifest["fingerprint"] != fingerprint_key(fingerprint):
+        return None
+
+    strings = {name: read_strings(folder, name) for name in manifest["strings"]}
+    arrays = {name: np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r") for name in manifest["arrays"]}
+
+    records = MappedRecords(
+        {column: strings[column] for column in RECORD_COLUMNS},
+        arrays["category_code"],
+        arrays["subcategory_code"],
+    )
+    dataset = CompactDataset(
+        records,
+        tuple(manifest["categories"]),
+        tuple(manifest["subcategories"]),
+        version=manifest["version"],
+        quick_questions=manifest["quick_questions"],
+        stats=manifest["stats"],
+    )
+    dataset.question_index = QuestionIndex.from_arrays(
+        texts=strings["index_texts"],
+        vocab=strings["index_vocab"],
+        exact=HashedLookup(arrays["exact_hashes"], arrays["exact_positions"], strings["exact_texts"], arrays["exact_owners"]),
+        vocab_index=HashedLookup(arrays["vocab_hashes"], arrays["vocab_positions"], strings["index_vocab"]),
+        owners=arrays["index_owners"],
+        tokens=arrays["index_tokens"],
+        unique_tokens=arrays["index_unique_tokens"],
+        unique_counts=arrays["index_unique_counts"],
+        category_codes=arrays["index_category_codes"],
+        subcategory_codes=arrays["index_subcategory_codes"],
+    )
+    dataset.normalized_questions = MappedQuestionTexts(strings["question_texts"])
+    dataset.spelling_counts = Counter(dict(zip(strings["spelling_words"], arrays["spelling_counts"].tolist())))
+    messages = [tuple(m) for m in manifest.get("messages", [])]
+    return dataset, messages
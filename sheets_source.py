@@ -0,0 +1,452 @@
+# sheets_source.py
+# ใช้ Google Sheets เป็นแหล่ง dataset (ผู้เขียนแก้ในชีตที่แชร์กันได้เลย)
+#
+# thread เบื้องหลังถาม revision ของชีตทุก ๆ POLL_SECONDS วินาที (คำขอเล็ก ๆ)
+# เมื่อ revision เปลี่ยนจึงอ่านค่าของชีตเป็นช่วงตามบล็อกของแถว (BLOCK_ROWS แถวต่อช่วง)
+# - client ที่รู้ว่าแก้บล็อกไหนไปบ้าง (changed_blocks) อ่านเฉพาะช่วงที่เปลี่ยน
+# - Sheets API ไม่มีรายการช่วงที่เปลี่ยน GspreadClient จึงอ่านทุกช่วงในคำขอ batch_get เดียว
+#   แล้วเทียบ hash ทีละบล็อก
+# บล็อกที่ hash เหมือนเดิมใช้แถวที่แปลงแล้วของเดิม แถวที่เปลี่ยนจริงถูก patch เข้า index
+# ของ vector / bm25 / fts (scorers.patch_scorers) โดยไม่สร้าง index ทั้งชุดใหม่
+# ถ้าแถวที่เปลี่ยนมีมากหรือ row_id เลื่อน (ลบ/แทรกแถวกลางชีต) จะสร้างใหม่ทั้งชุด
+# ระหว่าง sync ผู้ใช้ยังได้คำตอบจาก snapshot เดิม
+#
+# การโหลดครั้งแรกทำใน thread เบื้องหลังเช่นกัน ระหว่างนั้นใช้ snapshot ล่าสุดที่บันทึกไว้ในเครื่อง
+# (EMBEDBOT_SHEET_CACHE) ถ้ายังไม่เคยมีจะแสดงว่ากำลังโหลดและ dataset ว่างไว้ก่อน
+#
+# client ของชีตเป็นแบบเสียบเปลี่ยนได้: ต้องมี revision(), read_header(), row_count(),
+# read_blocks() และ changed_blocks() (GspreadClient ใช้ชีตจริง, LocalSheetClient เป็นชีต
+# ในหน่วยความจำสำหรับทดสอบ)
+#
+# วิธีใช้:
+#   EMBEDBOT_SHEET=<spreadsheet key>[:ชื่อชีต] streamlit run app.py
+#   EMBEDBOT_SHEET_CREDENTIALS=google_service_account.json EMBEDBOT_SHEET_POLL_SECONDS=30
+#   EMBEDBOT_SHEET_CACHE=/var/lib/embedbot/sheet.json
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+
+from ingest import OPTIONAL_COLUMNS, REQUIRED_COLUMNS, clean_cell
+from lazy_modules import load_module
+from qa_store import CompactDataset, QARecord, split_aliases
+from scorers import patch_scorers, prepare_scorers
+
+SHEET_ENV = "EMBEDBOT_SHEET"
+CREDENTIALS_ENV = "EMBEDBOT_SHEET_CREDENTIALS"
+POLL_ENV = "EMBEDBOT_SHEET_POLL_SECONDS"
+CACHE_ENV = "EMBEDBOT_SHEET_CACHE"
+
+DEFAULT_CREDENTIALS = "google_service_account.json"
+DEFAULT_POLL_SECONDS = 30.0
+
+# จำนวนแถวต่อบล็อกที่ใช้เทียบการเปลี่ยนแปลง (และขนาดช่วงที่อ่านจากชีต)
+BLOCK_ROWS = 200
+
+# ถ้าแถวที่เปลี่ยนเกินสัดส่วนนี้ของ dataset จะสร้าง index ใหม่ทั้งชุดแทนการ patch
+PATCH_MAX_FRACTION = 0.25
+
+COLUMNS = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+
+
+class GspreadClient:
+    """ชีตจริงผ่าน gspread (ใช้ service account)
+
+    เชื่อมต่อครั้งแรกที่ใช้ ถ้าเชื่อมต่อไม่ได้จะลองใหม่ในการ poll รอบถัดไป
+    """
+
+    def __init__(self, key, worksheet=None, credentials=DEFAULT_CREDENTIALS):
+        self.key = key
+        self.worksheet_name = worksheet
+        self.credentials = credentials
+        self.spreadsheet = None
+
+    def open(self):
+        if self.spreadsheet is None:
+            gspread = load_module("gspread")
+            self.spreadsheet = gspread.service_account(filename=self.credentials).open_by_key(self.key)
+        return self.spreadsheet
+
+    def revision(self):
+        """เวลาแก้ไขล่าสุดของไฟล์ (จาก Drive API คำขอเล็ก ๆ ไม่อ่านข้อมูลชีต)"""
+        spreadsheet = self.open()
+        getter = getattr(spreadsheet, "get_lastUpdateTime", None)
+        if getter is not None:
+            return getter()
+        return spreadsheet.lastUpdateTime
+
+    def worksheet(self):
+        spreadsheet = self.open()
+        if self.worksheet_name:
+            return spreadsheet.worksheet(self.worksheet_name)
+        return spreadsheet.sheet1
+
+    def read_header(self):
+        return self.worksheet().row_values(1)
+
+    def row_count(self):
+        """จำนวนแถวข้อมูล (ไม่รวมหัวคอลัมน์) ตามขนาดตารางของชีต"""
+        return max(0, self.worksheet().row_count - 1)
+
+    def read_blocks(self, numbers, width):
+        """ค่าของบล็อกที่ระบุ {หมายเลขบล็อก: แถว} อ่านทุกช่วงในคำขอ batch_get เดียว"""
+        numbers = list(numbers)
+        if not numbers:
+            return {}
+        gspread = load_module("gspread")
+        last_column = gspread.utils.rowcol_to_a1(1, max(1, width)).rstrip("0123456789")
+        ranges = [f"A{2 + n * BLOCK_ROWS}:{last_column}{1 + (n + 1) * BLOCK_ROWS}" for n in numbers]
+        return {n: list(values) for n, values in zip(numbers, self.worksheet().batch_get(ranges))}
+
+    def changed_blocks(self, since_revision):
+        """Sheets API ไม่บอกว่าช่วงไหนเปลี่ยน (None = ต้องอ่านทุกบล็อกแล้วเทียบ hash)"""
+        return None
+
+
+class LocalSheetClient:
+    """ชีตในหน่วยความจำที่ทำงานเหมือน GspreadClient (ใช้ทดสอบหรือรันแบบไม่มีอินเทอร์เน็ต)
+
+    จำว่าแต่ละ revision แก้บล็อกไหน จึงตอบ changed_blocks ได้ (อ่านเฉพาะช่วงที่เปลี่ยน)
+    """
+
+    def __init__(self, values):
+        self.values = [list(row) for row in values]
+        self.rev = 1
+        self.rows_read = 0
+        self.changes = []
+        self.lock = threading.Lock()
+
+    def revision(self):
+        with self.lock:
+            return self.rev
+
+    def read_header(self):
+        with self.lock:
+            return list(self.values[0]) if self.values else []
+
+    def row_count(self):
+        with self.lock:
+            return max(0, len(self.values) - 1)
+
+    def read_blocks(self, numbers, width):
+        with self.lock:
+            body = self.values[1:]
+            blocks = {n: [list(row) for row in body[n * BLOCK_ROWS:(n + 1) * BLOCK_ROWS]] for n in numbers}
+            self.rows_read += sum(len(rows) for rows in blocks.values())
+            return blocks
+
+    def changed_blocks(self, since_revision):
+        """บล็อกที่ถูกแก้หลัง since_revision (None ถ้าเก่ากว่าประวัติที่จำไว้)"""
+        with self.lock:
+            if since_revision is None or since_revision < self.rev - len(self.changes):
+                return None
+            return set().union(*(blocks for rev, blocks in self.changes if rev > since_revision))
+
+    def record_change(self, first_row, last_row=None):
+        """จำบล็อกของแถว first_row..last_row (นับแบบ Sheets) ไว้กับ revision ใหม่"""
+        last_row = first_row if last_row is None else last_row
+        self.rev += 1
+        self.changes.append((self.rev, set(range((first_row - 2) // BLOCK_ROWS, (last_row - 2) // BLOCK_ROWS + 1))))
+
+    def update_cell(self, row, col, value):
+        """แก้ค่าเซลล์ (row, col นับจาก 1 แบบ Sheets)"""
+        with self.lock:
+            self.values[row - 1][col - 1] = value
+            self.record_change(row)
+
+    def append_row(self, values):
+        with self.lock:
+            self.values.append(list(values))
+            self.record_change(len(self.values))
+
+    def delete_row(self, row):
+        with self.lock:
+            # แถวหลังจากนี้เลื่อนขึ้นทั้งหมด
+            self.record_change(row, max(row, len(self.values)))
+            del self.values[row - 1]
+
+
+def parse_row(cells, positions):
+    """แถวของชีต -> tuple ตามลำดับ COLUMNS (None ถ้าไม่มีคำถามหรือคำตอบ)"""
+    row = tuple(clean_cell(cells[pos]) if pos is not None and pos < len(cells) else '' for pos in positions)
+    question, answer = row[COLUMNS.index('คำถาม')], row[COLUMNS.index('คำตอบ')]
+    return row if question and answer else None
+
+
+def block_digest(rows):
+    digest = hashlib.sha1()
+    for row in rows:
+        digest.update("\x1f".join(map(str, row)).encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.digest()
+
+
+class SheetSnapshot:
+    """ผลการอ่านชีตหนึ่งครั้ง: บล็อกของแถวที่แปลงแล้ว + dataset ที่พร้อมใช้"""
+
+    def __init__(self, revision, header, digests, blocks, dataset, messages):
+        self.revision = revision
+        self.header = header
+        self.digests = digests
+        self.blocks = blocks
+        self.dataset = dataset
+        self.messages = messages
+
+
+def build_snapshot(revision, header, block_count, fetched, previous=None):
+    """แปลงบล็อกที่อ่านมาเป็น snapshot ใช้บล็อกที่ไม่ได้อ่านหรือ hash ไม่เปลี่ยนจาก previous ซ้ำ
+
+    fetched เป็น {หมายเลขบล็อก: แถวดิบ} บล็อกที่ไม่มีใน fetched ต้องมีใน previous
+    คืนค่า (snapshot, จำนวนบล็อกที่แปลงใหม่, row_id ที่เปลี่ยน)
+    ถ้าชีตขาดคอลัมน์จะ raise ValueError
+    """
+    header = [str(h).strip() for h in header]
+    missing = [col for col in REQUIRED_COLUMNS if col not in header]
+    if missing:
+        raise ValueError(f"ขาดคอลัมน์ {missing} (คอลัมน์ที่มี: {[h for h in header if h]})")
+
+    positions = [header.index(col) if col in header else None for col in COLUMNS]
+    reuse = previous is not None and previous.header == header
+
+    digests = []
+    blocks = []
+    parsed = 0
+    for number in range(block_count):
+        raw = fetched.get(number)
+        if raw is None:
+            digests.append(previous.digests[number])
+            blocks.append(previous.blocks[number])
+            continue
+        digest = block_digest(raw)
+        digests.append(digest)
+        if reuse and number < len(previous.digests) and previous.digests[number] == digest:
+            blocks.append(previous.blocks[number])
+            continue
+        blocks.append([row for row in (parse_row(cells, positions) for cells in raw) if row is not None])
+        parsed += 1
+
+    # แถวว่างท้ายตารางของชีตไม่นับเป็นบล็อก
+    while blocks and not blocks[-1]:
+        blocks.pop()
+        digests.pop()
+
+    dataset, changed_rows = build_dataset(blocks, previous.dataset if reuse else None)
+    messages = [("success", f"✅ โหลดข้อมูลจาก Google Sheets สำเร็จ: {len(dataset)} คำถาม")]
+    return SheetSnapshot(revision, header, digests, blocks, dataset, messages), parsed, changed_rows
+
+
+def build_dataset(blocks, previous=None):
+    """สร้าง CompactDataset จากบล็อกของแถว คืนค่า (dataset, row_id ที่เปลี่ยนหรือเพิ่มใหม่)
+
+    QARecord ของแถวที่ข้อมูลและตำแหน่งเหมือนเดิมใช้ object เดิมจาก previous
+    รหัสหมวดหมู่/หัวข้อย่อยเรียงตาม previous ก่อน (รหัสเดิมไม่เลื่อน) ถ้ายังใช้ครบทุกชื่อ
+    """
+    rows = [row for block in blocks for row in block]
+    categories = {}
+    subcategories = {}
+    if previous is not None:
+        used_categories = {row[0] for row in rows}
+        used_subcategories = {row[1] for row in rows}
+        if used_categories.issuperset(previous.categories) and used_subcategories.issuperset(previous.subcategories):
+            categories = {name: code for code, name in enumerate(previous.categories)}
+            subcategories = {name: code for code, name in enumerate(previous.subcategories)}
+
+    old_records = previous.records if previous is not None else []
+    records = []
+    changed_rows = []
+    for row in rows:
+        category, subcategory, question, answer, image_url, synonyms, aliases = row[:7]
+        cat_code = categories.setdefault(sys.intern(category), len(categories))
+        sub_code = subcategories.setdefault(sys.intern(subcategory), len(subcategories))
+        row_id = len(records)
+
+        old = old_records[row_id] if row_id < len(old_records) else None
+        if (old is not None and old.question == question and old.answer == answer
+                and old.synonyms == synonyms and old.image_url == image_url
+                and old.category_code == cat_code and old.subcategory_code == sub_code
+                and old.aliases == split_aliases(aliases)):
+            records.append(old)
+            continue
+        records.append(QARecord(row_id, cat_code, sub_code, question, answer, synonyms, image_url, split_aliases(aliases)))
+        changed_rows.append(row_id)
+
+    return CompactDataset(records, tuple(categories), tuple(subcategories)), changed_rows
+
+
+def save_snapshot(path, snapshot):
+    """บันทึก snapshot ลงไฟล์ (เขียนไฟล์ชั่วคราวแล้วเปลี่ยนชื่อ) ใช้เป็นข้อมูลตอนเริ่ม process ถัดไป"""
+    data = {
+        "revision": snapshot.revision,
+        "header": snapshot.header,
+        "digests": [digest.hex() for digest in snapshot.digests],
+        "blocks": [[list(row) for row in block] for block in snapshot.blocks],
+    }
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def load_snapshot(path):
+    """snapshot ที่บันทึกไว้ (None ถ้าไม่มีหรืออ่านไม่ได้)"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        blocks = [[tuple(sys.intern(value) for value in row) for row in block] for block in data["blocks"]]
+        dataset, _ = build_dataset(blocks)
+        digests = [bytes.fromhex(digest) for digest in data["digests"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    messages = [("success", f"✅ โหลดข้อมูลจาก Google Sheets (ข้อมูลที่บันทึกไว้) สำเร็จ: {len(dataset)} คำถาม")]
+    return SheetSnapshot(data["revision"], data["header"], digests, blocks, dataset, messages)
+
+
+class SheetSync:
+    """thread เบื้องหลังที่ sync ชีตเข้ากับ snapshot ปัจจุบัน
+
+    snapshot() อ่านได้ทุกเมื่อโดยไม่ต้องรอ sync (สลับเป็นชุดใหม่เมื่อสร้างเสร็จ)
+    การ sync ครั้งแรกก็ทำใน thread เบื้องหลัง ระหว่างนั้นใช้ snapshot ที่บันทึกไว้ (cache_path)
+    """
+
+    def __init__(self, client, poll_seconds=DEFAULT_POLL_SECONDS, on_update=None, cache_path=None):
+        self.client = client
+        self.poll_seconds = poll_seconds
+        self.on_update = on_update
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.first_sync = threading.Event()
+        self.syncs = 0
+        self.patches = 0
+        self.last_error = None
+
+        cached = load_snapshot(cache_path) if cache_path else None
+        if cached is not None:
+            prepare_scorers(cached.dataset)
+            self.current = cached
+        else:
+            empty = CompactDataset([], (), ())
+            self.current = SheetSnapshot(None, [], [], [], empty, [("warning", "⏳ กำลังโหลดข้อมูลจาก Google Sheets...")])
+
+        self.thread = threading.Thread(target=self.run, name="sheet-sync", daemon=True)
+        self.thread.start()
+
+    def snapshot(self):
+        """(dataset, messages) ของ snapshot ปัจจุบัน"""
+        current = self.current
+        messages = list(current.messages)
+        if self.last_error and current.revision is not None:
+            messages.append(("warning", f"⚠️ sync Google Sheets ไม่สำเร็จ (ใช้ข้อมูลเดิม): {self.last_error}"))
+        return current.dataset, messages
+
+    def wait_ready(self, timeout=None):
+        """รอการ sync ครั้งแรก (สำเร็จหรือไม่ก็ตาม) คืนค่า True ถ้า sync ครั้งแรกจบแล้ว"""
+        return self.first_sync.wait(timeout)
+
+    def fetch(self, previous):
+        """อ่านบล็อกที่ต้องใช้ คืนค่า (หัวคอลัมน์, จำนวนบล็อก, {หมายเลขบล็อก: แถวดิบ})"""
+        header = [str(h).strip() for h in self.client.read_header()]
+        block_count = -(-self.client.row_count() // BLOCK_ROWS)
+        changed = None
+        if previous is not None and previous.header == header and previous.revision is not None:
+            changed = self.client.changed_blocks(previous.revision)
+        if changed is None:
+            numbers = range(block_count)
+        else:
+            # บล็อกที่เปลี่ยน + บล็อกที่ snapshot เดิมไม่มี (แถวที่เพิ่มท้ายชีต)
+            numbers = sorted({n for n in changed if 0 <= n < block_count} | set(range(len(previous.digests), block_count)))
+        return header, block_count, self.client.read_blocks(numbers, len(header))
+
+    def sync(self):
+        """อ่านชีตถ้า revision เปลี่ยน คืนค่า True ถ้าสลับเป็น snapshot ใหม่"""
+        with self.lock:
+            previous = self.current
+            try:
+                revision = self.client.revision()
+                if previous.revision is not None and revision == previous.revision:
+                    return False
+                header, block_count, fetched = self.fetch(previous)
+                snapshot, parsed, changed_rows = build_snapshot(revision, header, block_count, fetched, previous)
+                dataset = snapshot.dataset
+                reused = snapshot.header == previous.header and previous.revision is not None
+                patch = reused and len(changed_rows) <= max(1, PATCH_MAX_FRACTION * len(dataset))
+                if patch:
+                    patch_scorers(previous.dataset, dataset, changed_rows)
+                else:
+                    prepare_scorers(dataset)
+            except Exception as e:
+                self.last_error = str(e)
+                if previous.revision is None and previous.dataset.empty:
+                    empty = CompactDataset([], (), ())
+                    self.current = SheetSnapshot(None, [], [], [], empty, [("error", f"❌ Google Sheets: {e}")])
+                return False
+
+            self.last_error = None
+            self.current = snapshot
+            self.syncs += 1
+            self.patches += patch
+            print(f"🔄 Google Sheets revision {revision}: อ่าน {len(fetched)}/{block_count} บล็อก "
+                  f"แปลงใหม่ {parsed} บล็อก, แถวที่เปลี่ยน {len(changed_rows)} "
+                  f"({'patch index' if patch else 'สร้าง index ใหม่'}, {len(dataset)} คำถาม)")
+            if self.cache_path:
+                try:
+                    save_snapshot(self.cache_path, snapshot)
+                except OSError as e:
+                    print(f"⚠️ บันทึก snapshot ของชีตไม่สำเร็จ: {e}")
+        if self.on_update is not None:
+            self.on_update(snapshot.dataset)
+        return True
+
+    def run(self):
+        try:
+            self.sync()
+        finally:
+            self.first_sync.set()
+        while not self.stop_event.wait(self.poll_seconds):
+            self.sync()
+
+    def close(self):
+        self.stop_event.set()
+
+
+def get_sheet_spec():
+    """(spreadsheet key, ชื่อชีตหรือ None) จาก environment หรือ None ถ้าไม่ได้ตั้งค่า"""
+    spec = os.environ.get(SHEET_ENV, "").strip()
+    if not spec:
+        return None
+    key, _, worksheet = spec.partition(":")
+    return key.strip(), worksheet.strip() or None
+
+
+def get_cache_path(key):
+    """ไฟล์ snapshot ล่าสุดของชีต (ค่าเริ่มต้นอยู่ในโฟลเดอร์ชั่วคราว แยกตาม spreadsheet key)"""
+    default = os.path.join(tempfile.gettempdir(), f"embedbot_sheet_{hashlib.sha1(key.encode()).hexdigest()[:12]}.json")
+    return os.environ.get(CACHE_ENV) or default
+
+
+def get_poll_seconds():
+    try:
+        return max(1.0, float(os.environ.get(POLL_ENV, DEFAULT_POLL_SECONDS)))
+    except ValueError:
+        return DEFAULT_POLL_SECONDS
+
+
+_sync = None
+_sync_lock = threading.Lock()
+
+
+def get_sheet_sync(on_update=None):
+    """SheetSync ของ process (สร้างครั้งแรกที่ใช้) หรือ None ถ้าไม่ได้ตั้งค่าชีต"""
+    global _sync
+    spec = get_sheet_spec()
+    if spec is None:
+        return None
+    with _sync_lock:
+        if _sync is None:
+            key, worksheet = spec
+            credentials = os.environ.get(CREDENTIALS_ENV, DEFAULT_CREDENTIALS)
+            _sync = SheetSync(GspreadClient(key, worksheet, credentials), get_poll_seconds(), on_update,
+                              get_cache_path(f"{key}:{worksheet or ''}"))
+        return _sync
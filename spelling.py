@@ -0,0 +1,178 @@
+# spelling.py
+# แก้คำภาษาอังกฤษที่พิมพ์ผิด (เช่นชื่อฟังก์ชัน digitalwirte -> digitalwrite) ก่อนค้นหา
+#
+# ใช้พจนานุกรมแบบ SymSpell: ตอนโหลด dataset สร้างคำที่ได้จากการลบตัวอักษร
+# (deletion neighbourhood) ของทุกคำภาษาอังกฤษใน คำถาม และ คำพ้อง ไว้ล่วงหน้า
+# ตอนค้นหาลบตัวอักษรของคำผู้ใช้แบบเดียวกันแล้วเปิด dict ไม่กี่ครั้ง
+# เวลาจึงขึ้นกับความยาวคำ ไม่ขึ้นกับขนาด dataset
+#
+# แก้เฉพาะคำที่ไม่รู้จักจริง ๆ: คำที่อยู่ใน dataset, รูปพหูพจน์/กริยาของคำใน dataset
+# (sensors -> sensor) และคำที่เป็นส่วนต้นของคำใน dataset (digitalw) ไม่ถูกแก้
+import bisect
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+
+SPELLING_ENV = "EMBEDBOT_SPELLING"
+
+WORD_RE = re.compile(r"[a-z][a-z0-9_]*")
+
+# คำที่สั้นกว่านี้ไม่แก้ (เสี่ยงแก้ผิดเป็นคำอื่น)
+MIN_WORD_LENGTH = 4
+
+# คำยาวตั้งแต่ LONG_WORD_LENGTH ตัวอักษรยอมให้ผิดได้ 2 ตำแหน่ง คำสั้นกว่านั้น 1 ตำแหน่ง
+LONG_WORD_LENGTH = 6
+MAX_EDIT_DISTANCE = 2
+
+# คำลงท้ายของรูปพหูพจน์/กริยา -> ส่วนที่ใส่แทน (คำที่ตัดแล้วอยู่ใน dataset ถือว่ารู้จัก)
+INFLECTION_SUFFIXES = (
+    ("ies", "y"), ("ied", "y"), ("es", ""), ("s", ""), ("ed", ""), ("ed", "e"),
+    ("ing", ""), ("ing", "e"), ("ers", ""), ("er", ""), ("er", "e"),
+)
+
+# จำนวนคำที่จำผลการแก้ไว้
+CACHE_SIZE = 4096
+
+
+def spelling_enabled():
+    return os.environ.get(SPELLING_ENV, "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def max_distance(word):
+    return MAX_EDIT_DISTANCE if len(word) >= LONG_WORD_LENGTH else 1
+
+
+def deletes(word, distance):
+    """คำทั้งหมดที่ได้จากการลบตัวอักษรไม่เกิน distance ตัว"""
+    results = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        results |= frontier
+    return results
+
+
+def edit_distance(a, b, limit):
+    """Damerau-Levenshtein แบบ optimal string alignment (หยุดเมื่อเกิน limit)"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SpellingCorrector:
+    """พจนานุกรมคำภาษาอังกฤษของ dataset พร้อม deletion neighbourhood"""
+
+    def __init__(self, counts):
+        self.counts = counts
+        self.words = sorted(counts)
+        self.cache = {}
+        self.index = {}
+        for word in counts:
+            if len(word) < MIN_WORD_LENGTH:
+                continue
+            for deleted in deletes(word, max_distance(word)):
+                self.index.setdefault(deleted, []).append(word)
+
+    def known(self, word):
+        """คำนี้อยู่ใน dataset, เป็นรูปผันของคำใน dataset หรือเป็นส่วนต้นของคำใน dataset"""
+        if word in self.counts:
+            return True
+        for suffix, replacement in INFLECTION_SUFFIXES:
+            if word.endswith(suffix):
+                stem = word[:-len(suffix)] + replacement
+                if len(stem) >= MIN_WORD_LENGTH - 1 and stem in self.counts:
+                    return True
+        i = bisect.bisect_left(self.words, word)
+        return i < len(self.words) and self.words[i].startswith(word)
+
+    def correct_word(self, word):
+        """คำที่ใกล้ที่สุดใน dataset (คืนคำเดิมถ้ารู้จักอยู่แล้วหรือหาไม่พบ)"""
+        if len(word) < MIN_WORD_LENGTH or self.known(word):
+            return word
+
+        cached = self.cache.get(word)
+        if cached is not None:
+            return cached
+
+        limit = max_distance(word)
+        candidates = set()
+        for deleted in deletes(word, limit):
+            candidates.update(self.index.get(deleted, ()))
+
+        best = None
+        for candidate in candidates:
+            distance = edit_distance(word, candidate, limit)
+            if distance > limit:
+                continue
+            # ระยะน้อยก่อน แล้วคำที่พบบ่อยกว่า แล้วเรียงตามตัวอักษร
+            key = (distance, -self.counts[candidate], candidate)
+            if best is None or key < best:
+                best = key
+
+        corrected = best[2] if best else word
+        if len(self.cache) >= CACHE_SIZE:
+            self.cache.clear()
+        self.cache[word] = corrected
+        return corrected
+
+    def correct(self, text):
+        """แก้ทุกคำภาษาอังกฤษในข้อความ (คืนข้อความตัวพิมพ์เล็ก)"""
+        return WORD_RE.sub(lambda m: self.correct_word(m.group(0)), text.lower())
+
+
+def record_words(record):
+    """คำภาษาอังกฤษใน คำถาม คำพ้อง และ alias ของแถว"""
+    return WORD_RE.findall(" ".join((record.question, record.synonyms) + record.aliases).lower())
+
+
+def word_counts(dataset):
+    """จำนวนครั้งที่พบของคำภาษาอังกฤษแต่ละคำใน คำถาม คำพ้อง และ alias"""
+    counts = Counter()
+    for record in dataset.records:
+        counts.update(record_words(record))
+    return counts
+
+
+def patch_word_counts(previous, dataset, changed_rows):
+    """จำนวนคำของ dataset ใหม่ โดยนับใหม่เฉพาะแถวที่เปลี่ยน (เก็บไว้ใน dataset.spelling_counts)"""
+    counts = Counter(previous.spelling_counts if previous.spelling_counts is not None else word_counts(previous))
+    removed = set(changed_rows) | set(range(len(dataset), len(previous)))
+    for row in removed:
+        if row < len(previous):
+            counts.subtract(record_words(previous.records[row]))
+    for row in changed_rows:
+        if row < len(dataset):
+            counts.update(record_words(dataset.records[row]))
+    dataset.spelling_counts = +counts
+    return dataset.spelling_counts
+
+
+@lru_cache(maxsize=4)
+def get_corrector(dataset):
+    """พจนานุกรมของ dataset (สร้างครั้งเดียวต่อ dataset)
+
+    ถ้า dataset มีจำนวนคำที่นับไว้แล้ว (แนบจาก shared_store) ไม่ต้องอ่านทุกแถวใหม่
+    """
+    counts = dataset.spelling_counts
+    return SpellingCorrector(counts if counts is not None else word_counts(dataset))
+
+
+def correct_query(user_input, dataset):
+    """แก้คำพิมพ์ผิดในคำถาม (คืนข้อความเดิมถ้าปิดไว้หรือไม่มีอะไรต้องแก้)"""
+    if dataset.empty or not spelling_enabled():
+        return user_input
+    corrected = get_corrector(dataset).correct(user_input)
+    return corrected if corrected != user_input.lower() else user_input
@@ -0,0 +1,20 @@
+# conftest.py
+# fixture ที่ใช้ร่วมกันในชุดทดสอบ (รันด้วย python -m pytest -q จากโฟลเดอร์โปรเจกต์)
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def dataset():
+    """CompactDataset ที่สร้างจาก dataset.xlsx ของโปรเจกต์"""
+    from ingest import load_sources
+    from qa_store import build_compact_dataset
+
+    df, _ = load_sources([{"path": os.path.join(ROOT, "dataset.xlsx"), "sheets": None}])
+    return build_compact_dataset(df)
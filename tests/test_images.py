@@ -0,0 +1,75 @@
+import time
+
+import pytest
+import requests
+
+import images
+from images import FailureCache, HostBreaker, ImageUnavailable
+
+COOLDOWN = 0.05
+
+
+def open_breaker(host="img.example.com"):
+    breaker = HostBreaker(max_failures=2, cooldown=COOLDOWN)
+    breaker.failure(host)
+    breaker.failure(host)
+    return breaker
+
+
+def test_open_breaker_blocks_until_cooldown():
+    breaker = open_breaker()
+    assert not breaker.allow("img.example.com")
+    assert breaker.allow("other.example.com")
+    assert breaker.stats()["open_hosts"] == ["img.example.com"]
+
+
+def test_half_open_allows_a_single_trial():
+    breaker = open_breaker()
+    time.sleep(COOLDOWN * 2)
+    assert breaker.allow("img.example.com")
+    # คำขอทดลองยังไม่จบ คำขออื่นต้องรอ
+    assert not breaker.allow("img.example.com")
+
+
+def test_successful_trial_closes_breaker():
+    breaker = open_breaker()
+    time.sleep(COOLDOWN * 2)
+    assert breaker.allow("img.example.com")
+    breaker.success("img.example.com")
+    assert breaker.allow("img.example.com")
+    assert breaker.allow("img.example.com")
+
+
+def test_failed_trial_reopens_breaker():
+    breaker = open_breaker()
+    time.sleep(COOLDOWN * 2)
+    assert breaker.allow("img.example.com")
+    breaker.failure("img.example.com")
+    assert not breaker.allow("img.example.com")
+    time.sleep(COOLDOWN * 2)
+    assert breaker.allow("img.example.com")
+
+
+def test_trial_that_raises_is_recorded_as_failure(monkeypatch):
+    class FailingRequests:
+        RequestException = requests.RequestException
+        HTTPError = requests.HTTPError
+
+        @staticmethod
+        def get(url, timeout=None, stream=False):
+            raise requests.ConnectionError("connection refused")
+
+    breaker = open_breaker()
+    monkeypatch.setattr(images, "host_breaker", breaker)
+    monkeypatch.setattr(images, "failed_urls", FailureCache(0))
+    monkeypatch.setattr(images, "get_requests", lambda: FailingRequests)
+
+    with pytest.raises(ImageUnavailable):
+        images.request_image("http://img.example.com/a.png", timeout=1)
+    time.sleep(COOLDOWN * 2)
+    with pytest.raises(requests.ConnectionError):
+        images.request_image("http://img.example.com/a.png", timeout=1)
+    # คำขอทดลองล้มเหลว host ถูกตัดอีกรอบ ไม่ค้างอยู่ในสถานะทดลอง
+    assert not breaker.allow("img.example.com")
+    time.sleep(COOLDOWN * 2)
+    assert breaker.allow("img.example.com")
@@ -0,0 +1,49 @@
+import gzip
+import json
+import time
+
+import query_log
+from query_log import QueryLogWriter, read_entries, segment_paths
+
+
+def wait_for(writer, count, timeout=10):
+    deadline = time.monotonic() + timeout
+    while writer.stats()["written"] < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_rotation_writes_gzip_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_log, "FLUSH_SECONDS", 0)
+    path = str(tmp_path / "queries.jsonl")
+    writer = QueryLogWriter(path, max_bytes=200, max_seconds=0)
+    for i in range(20):
+        writer.submit({"time": time.time(), "query": f"คำถามที่ {i}"})
+        # เขียนทีละรายการ ให้ไฟล์เกินขนาดและหมุนระหว่างทาง
+        wait_for(writer, i + 1)
+    writer.close()
+
+    segments = segment_paths(path)
+    assert segments and writer.stats()["segments"] == len(segments)
+    for segment in segments:
+        assert segment.endswith(".jsonl.gz")
+        with gzip.open(segment, "rt", encoding="utf-8") as f:
+            assert all(json.loads(line)["query"] for line in f)
+
+    assert [e["query"] for e in read_entries(path)] == [f"คำถามที่ {i}" for i in range(20)]
+    assert len(read_entries(path, max_segments=0)) < 20
+
+
+def test_rotation_by_age(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_log, "FLUSH_SECONDS", 0)
+    path = str(tmp_path / "queries.jsonl")
+    writer = QueryLogWriter(path, max_bytes=0, max_seconds=3600)
+    writer.submit({"time": time.time(), "query": "เก่า"})
+    wait_for(writer, 1)
+    writer.opened_at -= 7200
+    writer.submit({"time": time.time(), "query": "ใหม่"})
+    wait_for(writer, 2)
+    writer.close()
+
+    assert len(segment_paths(path)) == 1
+    assert [e["query"] for e in read_entries(path, max_segments=0)] == ["ใหม่"]
+    assert [e["query"] for e in read_entries(path)] == ["เก่า", "ใหม่"]
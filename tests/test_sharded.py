@@ -0,0 +1,20 @@
+import random
+
+import vector_matcher
+from sharded import ShardedSearcher, replicate_dataset
+
+
+def test_sharded_search_equals_unsharded(dataset):
+    # ขยายให้แต่ละ shard มีหลายร้อยแถว และมีคำถามที่ได้คะแนนเท่ากันข้าม shard
+    big = replicate_dataset(dataset, 3)
+    rng = random.Random(7)
+    questions = [record.question for record in big.records]
+    queries = rng.sample(questions, 60)
+    queries += [" ".join(rng.sample(q.split(), len(q.split()))) for q in rng.sample(questions, 60)]
+    queries += ["arduino", "หุ้นขึ้นไหม", "pinMode", "led"]
+    context = {"last_category": big.categories[0], "last_subcategory": big.subcategories[0]}
+    contexts = [{} if i % 2 else context for i in range(len(queries))]
+
+    expected = [vector_matcher.find_best_match(q, big, c) for q, c in zip(queries, contexts)]
+    with ShardedSearcher(big, workers=3) as searcher:
+        assert searcher.search_many(queries, contexts) == expected
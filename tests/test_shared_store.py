@@ -0,0 +1,49 @@
+import shared_store
+import vector_matcher
+from normalize import question_texts
+from spelling import word_counts
+
+FINGERPRINT = (("dataset.xlsx", "None", 1.0),)
+
+
+def record_fields(record):
+    return tuple(getattr(record, name) for name in record.__slots__)
+
+
+def test_attached_dataset_matches_fresh_build(dataset, tmp_path):
+    shared_store.publish(dataset, FINGERPRINT, [("success", "ok")], str(tmp_path))
+    attached, messages = shared_store.attach(FINGERPRINT, str(tmp_path))
+
+    assert messages == [("success", "ok")]
+    assert attached.version == dataset.version
+    assert attached.categories == dataset.categories
+    assert attached.subcategories == dataset.subcategories
+    assert attached.stats == dataset.stats
+    assert attached.quick_questions == dataset.quick_questions
+    assert [record_fields(r) for r in attached.records] == [record_fields(r) for r in dataset.records]
+    assert list(question_texts(attached)) == list(question_texts(dataset))
+    assert attached.spelling_counts == word_counts(dataset)
+
+    contexts = [{}, {"last_category": dataset.categories[0], "last_subcategory": dataset.subcategories[0]}]
+    queries = [record.question for record in dataset.records] + ["arduino", "หุ้นขึ้นไหม", "pinMode"]
+    for query in queries:
+        for context in contexts:
+            assert vector_matcher.best_match(query, attached, context) == vector_matcher.best_match(query, dataset, context)
+
+
+def test_attach_rejects_other_sources(dataset, tmp_path):
+    shared_store.publish(dataset, FINGERPRINT, (), str(tmp_path))
+    assert shared_store.attach((("other.xlsx", "None", 1.0),), str(tmp_path)) is None
+
+
+def test_attach_or_publish_builds_once(dataset, tmp_path):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return dataset, [("success", "ok")]
+
+    first, _ = shared_store.attach_or_publish(FINGERPRINT, build, str(tmp_path))
+    second, _ = shared_store.attach_or_publish(FINGERPRINT, build, str(tmp_path))
+    assert builds == [1]
+    assert first.version == second.version == dataset.version
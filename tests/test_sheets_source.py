@@ -0,0 +1,45 @@
+import os
+
+import pandas as pd
+
+import bm25
+import scorers
+import vector_matcher
+from conftest import ROOT
+from qa_store import CompactDataset
+from sheets_source import BLOCK_ROWS, LocalSheetClient, SheetSync
+
+
+def sheet_values():
+    df = pd.read_excel(os.path.join(ROOT, "dataset.xlsx")).fillna('')
+    return [list(df.columns)] + df.astype(str).values.tolist() * 3
+
+
+def test_edit_reads_one_block_and_patches_indexes(monkeypatch):
+    monkeypatch.setenv(scorers.SHADOW_ENV, "bm25")
+    client = LocalSheetClient(sheet_values())
+    sync = SheetSync(client, poll_seconds=3600)
+    assert sync.wait_ready(60)
+    sync.close()
+    before = sync.current.dataset
+    vector_matcher.get_index(before)
+    bm25.get_index(before)
+
+    client.rows_read = 0
+    client.update_cell(5, 3, "LED RGB ต่อกับ Arduino อย่างไร")
+    client.append_row(["หมวดใหม่", "หัวข้อใหม่", "Stepper motor คืออะไร", "มอเตอร์ที่หมุนทีละสเต็ป", ""])
+    assert sync.sync()
+
+    dataset = sync.current.dataset
+    assert sync.patches == 1
+    assert client.rows_read <= 2 * BLOCK_ROWS
+    assert len(dataset) == len(before) + 1
+    assert dataset.question_index is not None and dataset in bm25._patched
+
+    fresh = CompactDataset(list(dataset.records), dataset.categories, dataset.subcategories)
+    queries = [record.question for record in dataset.records[:60]] + [
+        "LED RGB ต่อกับ Arduino อย่างไร", "stepper motor", "ระบบฝังตัว นิยาม",
+    ]
+    for query in queries:
+        assert vector_matcher.best_match(query, dataset, {}) == vector_matcher.best_match(query, fresh, {})
+        assert bm25.best_match(query, dataset, {}) == bm25.best_match(query, fresh, {})
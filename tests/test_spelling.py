@@ -0,0 +1,14 @@
+from spelling import SpellingCorrector, word_counts
+
+
+def test_inflections_of_known_words_are_kept(dataset):
+    corrector = SpellingCorrector(word_counts(dataset))
+    for word in ("sensors", "motors", "timers", "leds", "pins", "digitalw"):
+        assert corrector.correct_word(word) == word
+
+
+def test_unknown_words_are_corrected(dataset):
+    corrector = SpellingCorrector(word_counts(dataset))
+    assert corrector.correct_word("digitalwirte") == "digitalwrite"
+    assert corrector.correct_word("senosr") == "sensor"
+    assert corrector.correct("sensors ต่อกับ digitalwirte") == "sensors ต่อกับ digitalwrite"
@@ -0,0 +1,34 @@
+import random
+
+import pytest
+
+import matcher
+import vector_matcher
+
+
+def sample_queries(dataset):
+    """คำถามของ dataset ทุกข้อ, คำแรกของแต่ละข้อ, คำถามที่สลับลำดับคำ และคำถามที่ไม่มีใน dataset"""
+    rng = random.Random(1)
+    questions = [record.question for record in dataset.records]
+    queries = list(questions)
+    queries += [q.split()[0] for q in questions if q.split()]
+    queries += [" ".join(rng.sample(q.split(), len(q.split()))) for q in questions]
+    queries += ["arduino", "digitalwrite คือ อะไร", "7 segment", "led rgb ทำงาน อย่างไร", "ไม่รู้", "pinMode"]
+    return queries
+
+
+def test_vector_agrees_with_legacy_scorer(dataset):
+    contexts = [
+        {},
+        {"last_category": dataset.categories[0], "last_subcategory": dataset.subcategories[0]},
+        {"last_category": dataset.categories[-1], "last_subcategory": "ไม่มีหัวข้อนี้"},
+    ]
+    compared = 0
+    for query in sample_queries(dataset):
+        for context in contexts:
+            row, score = vector_matcher.best_match(query, dataset, context)
+            expected_row, expected_score = matcher.best_match(query, dataset, context)
+            assert row == expected_row, (query, context)
+            assert score == pytest.approx(expected_score), (query, context)
+            compared += 1
+    assert compared > 1000
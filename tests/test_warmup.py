@@ -0,0 +1,34 @@
+import json
+import time
+
+import query_log
+import scorers
+import warmup
+
+
+def read_lines(path):
+    return path.read_text(encoding="utf-8").splitlines() if path.exists() else []
+
+
+def test_warm_up_skips_shadow_and_query_log(dataset, tmp_path, monkeypatch):
+    log_path = tmp_path / "shadow.jsonl"
+    monkeypatch.setenv(scorers.SHADOW_ENV, "bm25")
+    monkeypatch.setenv(scorers.SHADOW_LOG_ENV, str(log_path))
+    monkeypatch.setattr(scorers, "_shadow", None)
+    monkeypatch.setattr(warmup, "fetch_image", lambda url, timeout=None: None)
+    logged = []
+    monkeypatch.setattr(query_log, "log_query", lambda *args, **kwargs: logged.append(args))
+
+    entries = [{"query": record.question} for record in dataset.records[:20]]
+    stats = warmup.warm_up(dataset, entries, limit=20, budget=30)
+    assert stats["queries"] == 20
+
+    # คำถามของผู้ใช้ตามหลัง warm-up ในคิวเดียวกัน เมื่อถูกบันทึกแล้วคิวก่อนหน้าก็ถูกประมวลผลหมดแล้ว
+    scorers.search("ไมโครคอนโทรลเลอร์คืออะไร", dataset, {})
+    deadline = time.monotonic() + 10
+    while not read_lines(log_path) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    lines = read_lines(log_path)
+    assert [json.loads(line)["query"] for line in lines] == ["ไมโครคอนโทรลเลอร์คืออะไร"]
+    assert logged == []
@@ -0,0 +1,306 @@
+# vector_matcher.py
+# คำนวณ partial match และ keyword match ของทุกแถวพร้อมกันด้วย NumPy
+#
+# ให้ผลเหมือน matcher.find_best_match (น้ำหนักเดิม 0.5/0.2/0.2 สำหรับคำถามสั้น
+# และ 0.3/0.3/0.3 สำหรับคำถามยาว) แต่แปลงคำเป็นรหัสตัวเลขและเก็บคำถามเป็น
+# เมทริกซ์ token id แบบ padded ไว้ล่วงหน้า
+#
+# ให้คะแนนทุกแถวเสมอ (ไม่มี ANN shortlist แบบ lsa) ผลจึงตรงกับ matcher ทุกขนาด dataset
+from functools import lru_cache
+
+import numpy as np
+
+from matcher import similarity_score
+from normalize import STOPWORDS, normalize_query, question_texts
+
+# จำนวนคำที่เก็บน้ำหนัก partial match ไว้ต่อ index
+WORD_CACHE_SIZE = 4096
+
+
+class QuestionIndex:
+    """คำถามทุกข้อ (รวม alias) ในรูปเมทริกซ์ token id
+
+    แถวของเมทริกซ์คือคำถามหนึ่งข้อ owners บอกว่าเป็นของ record ไหน
+    ช่องที่ไม่มีคำใช้รหัส pad (= ขนาด vocabulary) ซึ่งมีน้ำหนักเป็น 0 เสมอ
+    """
+
+    def __init__(self, dataset):
+        texts = []
+        owners = []
+        category_codes = []
+        subcategory_codes = []
+        for record, questions in zip(dataset.records, question_texts(dataset)):
+            for question in questions:
+                texts.append(question)
+                owners.append(record.row_id)
+                category_codes.append(record.category_code)
+                subcategory_codes.append(record.subcategory_code)
+
+        vocab = {}
+        token_lists = [[vocab.setdefault(word, len(vocab)) for word in text.split()] for text in texts]
+        unique_lists = [sorted(set(ids)) for ids in token_lists]
+
+        self.texts = texts
+        self.vocab = list(vocab)
+        self.vocab_index = vocab
+        self.pad = len(vocab)
+        self.owners = np.array(owners, dtype=np.int32)
+        self.tokens = self.padded(token_lists)
+        self.unique_tokens = self.padded(unique_lists)
+        self.unique_counts = np.array([len(ids) for ids in unique_lists], dtype=np.int32)
+
+        self.category_codes = np.array(category_codes, dtype=np.int32)
+        self.subcategory_codes = np.array(subcategory_codes, dtype=np.int32)
+
+        # exact match: ข้อความคำถาม -> record แรกที่มีข้อความนี้ (ตามลำดับเดิม)
+        self.exact = {}
+        for text, owner in zip(texts, owners):
+            self.exact.setdefault(text, owner)
+
+        self._word_weights = {}
+
+    @classmethod
+    def from_arrays(cls, texts, vocab, exact, vocab_index, owners, tokens, unique_tokens,
+                    unique_counts, category_codes, subcategory_codes):
+        """สร้าง index จากข้อมูลที่เตรียมไว้แล้ว (เช่น array แบบ mmap จาก shared_store)"""
+        index = cls.__new__(cls)
+        index.texts = texts
+        index.vocab = vocab
+        index.vocab_index = vocab_index
+        index.exact = exact
+        index.pad = len(vocab)
+        index.owners = owners
+        index.tokens = tokens
+        index.unique_tokens = unique_tokens
+        index.unique_counts = unique_counts
+        index.category_codes = category_codes
+        index.subcategory_codes = subcategory_codes
+        index._word_weights = {}
+        return index
+
+    def patched(self, dataset, changed_rows):
+        """index ของ dataset ใหม่: ตัดคำถามของแถวที่เปลี่ยน/ถูกลบ แล้วต่อคำถามใหม่ท้ายเมทริกซ์
+
+        row_id ของแถวที่ไม่เปลี่ยนต้องเป็นแถวเดิม (เช่นแก้ค่าในชีตหรือเพิ่มแถวท้ายชีต)
+        vocabulary ต่อท้ายอย่างเดียว ผลการค้นหาเหมือนสร้าง index ใหม่ทั้งชุด
+        """
+        changed = sorted(row for row in set(changed_rows) if row < len(dataset))
+        keep = (self.owners < len(dataset)) & ~np.isin(self.owners, changed)
+        texts = question_texts(dataset)
+
+        new_texts = []
+        owners = []
+        category_codes = []
+        subcategory_codes = []
+        for row in changed:
+            record = dataset.records[row]
+            for question in texts[row]:
+                new_texts.append(question)
+                owners.append(row)
+                category_codes.append(record.category_code)
+                subcategory_codes.append(record.subcategory_code)
+
+        vocab = dict(self.vocab_index)
+        token_lists = [[vocab.setdefault(word, len(vocab)) for word in text.split()] for text in new_texts]
+        unique_lists = [sorted(set(ids)) for ids in token_lists]
+
+        index = QuestionIndex.__new__(QuestionIndex)
+        index.texts = [text for text, kept in zip(self.texts, keep) if kept] + new_texts
+        index.vocab = list(vocab)
+        index.vocab_index = vocab
+        index.pad = len(vocab)
+        index.tokens = index.stacked(self.tokens[keep], self.pad, index.padded(token_lists))
+        index.unique_tokens = index.stacked(self.unique_tokens[keep], self.pad, index.padded(unique_lists))
+        index.unique_counts = np.concatenate([self.unique_counts[keep], np.array([len(ids) for ids in unique_lists], dtype=np.int32)])
+        index.owners = np.concatenate([self.owners[keep], np.array(owners, dtype=np.int32)])
+        index.category_codes = np.concatenate([self.category_codes[keep], np.array(category_codes, dtype=np.int32)])
+        index.subcategory_codes = np.concatenate([self.subcategory_codes[keep], np.array(subcategory_codes, dtype=np.int32)])
+
+        # exact match: ข้อความคำถาม -> record แรกที่มีข้อความนี้ (ตามลำดับ row_id เหมือนเดิม)
+        index.exact = {}
+        for row, questions in enumerate(texts):
+            for question in questions:
+                index.exact.setdefault(question, row)
+        index._word_weights = {}
+        return index
+
+    def stacked(self, old, old_pad, new):
+        """ต่อเมทริกซ์เดิม (pad เดิม) กับเมทริกซ์ใหม่ ขยายความกว้างให้เท่ากันด้วย pad ปัจจุบัน"""
+        width = max(old.shape[1], new.shape[1] if len(new) else 0)
+        matrix = np.full((len(old) + len(new), width), self.pad, dtype=np.int32)
+        matrix[:len(old), :old.shape[1]] = np.where(old == old_pad, self.pad, old)
+        matrix[len(old):, :new.shape[1]] = new
+        return matrix
+
+    def padded(self, lists):
+        width = max((len(ids) for ids in lists), default=0) or 1
+        matrix = np.full((len(lists), width), self.pad, dtype=np.int32)
+        for i, ids in enumerate(lists):
+            matrix[i, :len(ids)] = ids
+        return matrix
+
+    def __len__(self):
+        return len(self.texts)
+
+    def word_weights(self, word):
+        """น้ำหนัก partial match ของคำผู้ใช้หนึ่งคำต่อทุกคำใน vocabulary
+
+        คืนค่า (ids, weights): 1.0 ถ้าตรงทั้งคำ, 0.8 ถ้าเป็นส่วนหนึ่งของกันและกัน
+        (คำต้องยาวอย่างน้อย 3 ตัวอักษร) ตามกติกาเดิมของ matcher
+        """
+        cached = self._word_weights.get(word)
+        if cached is not None:
+            return cached
+
+        ids = []
+        weights = []
+        for token_id, token in enumerate(self.vocab):
+            if token == word:
+                ids.append(token_id)
+                weights.append(1.0)
+            elif len(word) >= 3 and (word in token or token in word):
+                ids.append(token_id)
+                weights.append(0.8)
+
+        cached = (np.array(ids, dtype=np.int32), np.array(weights))
+        if len(self._word_weights) >= WORD_CACHE_SIZE:
+            self._word_weights.clear()
+        self._word_weights[word] = cached
+        return cached
+
+    def partial_scores(self, user_words):
+        """partial match ของทุกคำถาม (หารด้วยจำนวนคำของผู้ใช้แล้ว)"""
+        if not user_words:
+            return np.zeros(len(self))
+        weights = np.zeros(self.pad + 1)
+        for user_word in user_words:
+            # ข้ามคำทั่วไป
+            if user_word in STOPWORDS:
+                continue
+            ids, values = self.word_weights(user_word)
+            np.add.at(weights, ids, values)
+        return weights[self.tokens].sum(axis=1) / len(user_words)
+
+    def keyword_scores(self, user_words):
+        """จำนวนคำที่ตรงกัน / จำนวนคำ (ชุดที่ใหญ่กว่า) ของทุกคำถาม"""
+        user_word_set = set(user_words)
+        if not user_word_set:
+            return np.zeros(len(self))
+        present = np.zeros(self.pad + 1)
+        ids = [self.vocab_index[w] for w in user_word_set if w in self.vocab_index]
+        present[ids] = 1.0
+        common = present[self.unique_tokens].sum(axis=1)
+        return common / np.maximum(len(user_word_set), self.unique_counts)
+
+
+@lru_cache(maxsize=4)
+def build_index(dataset):
+    return QuestionIndex(dataset)
+
+
+def get_index(dataset):
+    """index ของ dataset (สร้างครั้งแรกที่ใช้ และเก็บไว้ตามอายุ process)
+
+    ถ้า dataset มี index ที่สร้างไว้แล้ว (แนบจาก shared_store) จะใช้อันนั้น
+    """
+    if dataset.question_index is not None:
+        return dataset.question_index
+    return build_index(dataset)
+
+
+def patch_index(previous, dataset, changed_rows):
+    """สร้าง index ของ dataset ใหม่จาก index ของ previous (ทำใหม่เฉพาะแถวที่เปลี่ยน)"""
+    dataset.question_index = get_index(previous).patched(dataset, changed_rows)
+    return dataset.question_index
+
+
+def top_matches(user_input, dataset, context, k=1, threshold=0.3):
+    """
+    คะแนนของแถวที่ดีที่สุด k แถว (ใช้ร่วมกันระหว่าง find_best_match และ sharded)
+
+    partial match, keyword match และ context bonus ของทุกคำถามคำนวณด้วย
+    NumPy ส่วน similarity (SequenceMatcher) คำนวณเฉพาะคำถามที่คะแนน
+    สูงสุดที่เป็นไปได้ยังติดอันดับได้ โดยไล่จากคำถามที่มีโอกาสสูงสุดก่อน
+
+    คืนค่า (แถวที่ตรงทุกตัวอักษร หรือ None, [(คะแนน, row_id), ...], threshold)
+    รายการเรียงคะแนนมากไปน้อย คะแนนเท่ากันให้แถวที่อยู่ก่อนขึ้นก่อน
+    """
+    if dataset.empty:
+        return None, [], threshold
+
+    index = get_index(dataset)
+    user_lower, user_words = normalize_query(user_input)
+
+    short = len(user_words) <= 3
+    if short:
+        threshold = 0.2
+        partial_weight, keyword_weight, sim_weight = 0.5, 0.2, 0.2
+    else:
+        partial_weight, keyword_weight, sim_weight = 0.3, 0.3, 0.3
+
+    # 1. Exact match
+    if user_lower in index.exact:
+        return index.exact[user_lower], [], threshold
+
+    # 2-3. Partial match และ keyword match ของทุกคำถามในครั้งเดียว
+    partial = index.partial_scores(user_words)
+    keyword = index.keyword_scores(user_words)
+    base = partial * partial_weight + keyword * keyword_weight
+
+    # 5. Context bonus
+    context_bonus = np.zeros(len(index))
+    if context:
+        context_bonus += (index.category_codes == dataset.category_code(context.get('last_category'))) * 0.1
+        context_bonus += (index.subcategory_codes == dataset.subcategory_code(context.get('last_subcategory'))) * 0.1
+
+    # โบนัสพิเศษสำหรับคำถามสั้นที่มี partial match สูง
+    bonus = (partial > 0.6) * 0.3 if short else np.zeros(len(index))
+
+    # 4. Similarity อยู่ระหว่าง 0-1 จึงรู้คะแนนสูงสุดที่เป็นไปได้ของแต่ละคำถาม
+    upper = base + sim_weight + context_bonus + bonus + 1e-9
+    order = np.argsort(-upper, kind="stable")
+
+    # แถว -> (คะแนนดีที่สุด, ตำแหน่งคำถาม) แถวที่มี alias ใช้คำถามที่คะแนนสูงสุด
+    best = {}
+    kth_score = None
+    for position in order:
+        bound = upper[position]
+        if bound < threshold or (kth_score is not None and bound < kth_score):
+            break
+
+        sim_score = similarity_score(user_lower, index.texts[position])
+        total_score = base[position] + sim_score * sim_weight + context_bonus[position] + bonus[position]
+        if total_score <= 0:
+            continue
+
+        # คะแนนเท่ากันให้คำถามที่อยู่ก่อนชนะ (เหมือนการวนตามลำดับเดิม)
+        owner = int(index.owners[position])
+        current = best.get(owner)
+        if current is None or total_score > current[0] or (total_score == current[0] and position < current[1]):
+            best[owner] = (total_score, position)
+            if len(best) >= k:
+                kth_score = sorted((score for score, _ in best.values()), reverse=True)[k - 1]
+
+    matches = sorted(((score, owner) for owner, (score, _) in best.items()), key=lambda m: (-m[0], m[1]))
+    return None, matches[:k], threshold
+
+
+def best_match(user_input, dataset, context, threshold=0.3):
+    """
+    ค้นหาคำถามที่ตรงที่สุดจาก dataset (ผลเหมือน matcher.best_match)
+    คืนค่า (row_id หรือ None, คะแนนสูงสุด) คะแนนเป็น None เมื่อตรงทุกตัวอักษร
+    """
+    exact, matches, threshold = top_matches(user_input, dataset, context, 1, threshold)
+    if exact is not None:
+        return exact, None
+
+    # คืนค่าถ้าคะแนนเกิน threshold
+    if matches and matches[0][0] >= threshold:
+        return matches[0][1], float(matches[0][0])
+
+    return None, float(matches[0][0]) if matches else 0.0
+
+
+def find_best_match(user_input, dataset, context, threshold=0.3):
+    """ค้นหาคำถามที่ตรงที่สุด คืนค่าลำดับแถว (row_id) หรือ None"""
+    return best_match(user_input, dataset, context, threshold)[0]
@@ -0,0 +1,174 @@
+# warmup.py
+# อุ่นแคชหลังเริ่มแอป/โหลด dataset ใหม่ จากคำถามที่ถูกถามบ่อยใน query log
+#
+# thread เบื้องหลังอ่าน log ย้อนหลัง นับคำถาม (ที่ normalize แล้ว) พร้อมบริบท
+# แล้วค้นหาคำถามที่บ่อยที่สุด N ข้อผ่าน scorers.search (เติม result cache),
+# render ข้อความคำตอบ และดาวน์โหลดรูปของแถวที่ตอบ (เติม image cache)
+# คำถามที่อุ่นไม่ถูกส่งให้ shadow scorer และไม่ถูกบันทึกลง query log (ไม่ทำให้สถิติเอียง)
+# ทำงานภายในเวลาที่กำหนดแล้วหยุด ไม่ถ่วงการ render หน้าแรก
+#
+# วิธีใช้:
+#   EMBEDBOT_WARMUP_TOP=200 EMBEDBOT_WARMUP_SECONDS=20 streamlit run app.py
+#   python warmup.py --top 50          # ดูว่าจะอุ่นคำถามไหนบ้างและใช้เวลาเท่าไร
+import argparse
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from answers import answer_message, message_payload
+from images import fetch_image, image_cache
+from normalize import normalize_query
+from query_log import get_log_path, read_entries
+from scorers import search
+
+TOP_ENV = "EMBEDBOT_WARMUP_TOP"
+SECONDS_ENV = "EMBEDBOT_WARMUP_SECONDS"
+
+# จำนวนคำถามที่อุ่น (0 = ไม่อุ่น) และเวลาสูงสุดที่ใช้ (วินาที)
+DEFAULT_TOP = 200
+DEFAULT_SECONDS = 20.0
+
+# อ่าน log ย้อนหลังกี่วัน และไม่เกินกี่ segment
+LOOKBACK_DAYS = 7
+MAX_SEGMENTS = 14
+
+# จำนวนรูปที่ดาวน์โหลดพร้อมกัน
+IMAGE_WORKERS = 4
+
+# dataset version ที่อุ่นไปแล้ว (ไม่อุ่นซ้ำเมื่อ rerun)
+_started = set()
+_lock = threading.Lock()
+
+
+def env_number(name, default, cast=float):
+    try:
+        return max(0, cast(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+def top_queries(entries, limit):
+    """คำถามที่ถูกถามบ่อยที่สุด คืนค่า [(คำถาม, บริบท, จำนวนครั้ง)]
+
+    คำถามที่ normalize แล้วเหมือนกันนับรวมกัน ใช้ข้อความล่าสุดเป็นตัวแทน
+    """
+    counts = Counter()
+    latest = {}
+    for entry in entries:
+        query = entry.get("query")
+        if not query:
+            continue
+        key = (normalize_query(query)[0], entry.get("category"), entry.get("subcategory"))
+        counts[key] += 1
+        latest[key] = entry
+
+    results = []
+    for key, count in counts.most_common(limit):
+        entry = latest[key]
+        context = {}
+        if entry.get("category") is not None:
+            context["last_category"] = entry["category"]
+        if entry.get("subcategory") is not None:
+            context["last_subcategory"] = entry["subcategory"]
+        results.append((entry["query"], context, count))
+    return results
+
+
+def warm_up(dataset, entries, limit=DEFAULT_TOP, budget=DEFAULT_SECONDS):
+    """อุ่น result cache, ข้อความคำตอบ และรูปของคำถามยอดนิยม ภายใน budget วินาที"""
+    deadline = time.monotonic() + budget
+    stats = {"queries": 0, "answers": 0, "images": 0, "image_errors": 0, "timed_out": False}
+    if dataset.empty or not limit:
+        return stats
+
+    image_urls = []
+    for query, context, _ in top_queries(entries, limit):
+        if time.monotonic() >= deadline:
+            stats["timed_out"] = True
+            break
+        result = search(query, dataset, context, shadow=False)
+        stats["queries"] += 1
+        if result["row"] is None:
+            continue
+        payload = message_payload(answer_message(dataset, result["row"]))
+        stats["answers"] += 1
+        url = payload["image_url"]
+        if url and url.startswith("http") and url not in image_cache and url not in image_urls:
+            image_urls.append(url)
+
+    remaining = deadline - time.monotonic()
+    if image_urls and remaining > 0:
+        executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="warmup-image")
+        futures = [executor.submit(fetch_image, url, min(10, remaining)) for url in image_urls]
+        done, not_done = wait(futures, timeout=remaining)
+        for future in done:
+            if future.exception() is None:
+                stats["images"] += 1
+            else:
+                stats["image_errors"] += 1
+        stats["timed_out"] = stats["timed_out"] or bool(not_done)
+        executor.shutdown(wait=False, cancel_futures=True)
+    elif image_urls:
+        stats["timed_out"] = True
+    return stats
+
+
+def start_warmup(dataset):
+    """เริ่มอุ่นแคชของ dataset ใน thread เบื้องหลัง (ครั้งเดียวต่อเวอร์ชัน)
+
+    คืนค่า thread ที่เริ่ม หรือ None ถ้าปิดไว้/อุ่นไปแล้ว/ไม่มี log
+    """
+    limit = env_number(TOP_ENV, DEFAULT_TOP, int)
+    budget = env_number(SECONDS_ENV, DEFAULT_SECONDS)
+    path = get_log_path()
+    if not limit or not budget or path is None or dataset.empty:
+        return None
+    with _lock:
+        if dataset.version in _started:
+            return None
+        _started.add(dataset.version)
+
+    def run():
+        start = time.perf_counter()
+        since = time.time() - LOOKBACK_DAYS * 86400
+        entries = read_entries(path, since=since, max_segments=MAX_SEGMENTS)
+        stats = warm_up(dataset, entries, limit, max(0.0, budget - (time.perf_counter() - start)))
+        print(f"🔥 warm-up: {stats['queries']} คำถาม, {stats['images']} รูป "
+              f"ใน {time.perf_counter() - start:.2f} s" + (" (หมดเวลา)" if stats["timed_out"] else ""))
+
+    thread = threading.Thread(target=run, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    from ingest import get_dataset_sources, load_sources
+    from qa_store import build_compact_dataset
+    from scorers import prepare_scorers, result_cache
+
+    parser = argparse.ArgumentParser(description="อุ่นแคชจาก query log แล้วแสดงคำถามยอดนิยมและเวลาที่ใช้")
+    parser.add_argument("--log", help="ไฟล์ query log (ค่าเริ่มต้นจาก EMBEDBOT_QUERY_LOG)")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP)
+    parser.add_argument("--seconds", type=float, default=DEFAULT_SECONDS)
+    parser.add_argument("--days", type=float, default=LOOKBACK_DAYS)
+    args = parser.parse_args()
+
+    path = args.log or get_log_path()
+    entries = read_entries(path, since=time.time() - args.days * 86400, max_segments=MAX_SEGMENTS)
+    print(f"📜 {len(entries)} รายการจาก {path}")
+    for query, context, count in top_queries(entries, min(args.top, 10)):
+        print(f"  • {count:5d} × {query} {context or ''}")
+
+    df, _ = load_sources(get_dataset_sources())
+    dataset = build_compact_dataset(df)
+    prepare_scorers(dataset)
+
+    start = time.perf_counter()
+    stats = warm_up(dataset, entries, args.top, args.seconds)
+    print(f"🔥 {stats} ใน {time.perf_counter() - start:.2f} s | result cache {result_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()